@@ -0,0 +1,50 @@
+import cProfile
+import sys
+from typing import Optional
+
+import click
+
+sys.path.extend(['.'])
+
+from src.agents.slot_manager_agent import SlotManagerAgent
+from src.allocation.stacking_policy import DepartureOrderPolicy, STACKING_POLICIES, create_stacking_policy
+from src.benchmark.replay import replay, DEFAULT_IDLE_TIMEOUT
+from src.utils.jid_utils import jid_localpart
+from src.utils.message_log import read_records
+
+
+@click.command()
+@click.argument('message_log', type=click.Path(exists=True, dir_okay=False))
+@click.option('--slot-jid', required=True, type=str, help='Slot manager whose received messages are replayed')
+@click.option('--max-slot-height', default=5, type=int, help='Max height of the slot')
+@click.option('--stacking-policy', default=DepartureOrderPolicy.name, type=click.Choice(list(STACKING_POLICIES)),
+              help='Placement scoring used by the slot manager')
+@click.option('--speed', default=0.0, type=float,
+              help='Replay speed relative to the recording, 0 replays the messages as fast as they are taken')
+@click.option('--idle-timeout', default=DEFAULT_IDLE_TIMEOUT, type=float,
+              help='Seconds without messages sent by the agent after which the replay ends')
+@click.option('--profile', default=None, type=str, help='File cProfile stats of the replay are written to')
+def main(message_log: str, slot_jid: str, max_slot_height: int, stacking_policy: str, speed: float,
+         idle_timeout: float, profile: Optional[str]):
+    records = [record for record in read_records(message_log) if record['a'] == slot_jid]
+    slot_id = jid_localpart(slot_jid).split('_', 1)[-1]
+    agent = SlotManagerAgent(slot_jid, 'slot_password', slot_id, max_slot_height,
+                             create_stacking_policy(stacking_policy))
+    profiler = cProfile.Profile() if profile is not None else None
+    if profiler is not None:
+        profiler.enable()
+    result = replay(agent, records, speed, idle_timeout)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile)
+    print(f'replayed {result.received} messages in {result.seconds:.3f}s '
+          f'({result.messages_per_second:.1f} messages/s)')
+    print(f'sent {result.sent} messages, {result.recorded_sent} in the recorded run')
+    if result.unmatched or result.orphaned:
+        print(f'replay diverged from the recording: {result.unmatched} messages matched no behaviour, '
+              f'{result.orphaned} replies answered requests the agent did not send')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import itertools
+import json
+import subprocess
+import sys
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+import click
+
+sys.path.extend(['.'])
+
+from src.allocation.stacking_policy import DepartureOrderPolicy, STACKING_POLICIES
+from src.benchmark.scenario import ScenarioConfig, run_scenario
+
+DEFAULT_XMPP_SERVER = '192.168.0.24'
+COMPARED_METRICS = ['allocations_per_second', 'allocation_latency_p50', 'allocation_latency_p99',
+                    'deallocation_latency_p50', 'deallocation_latency_p99', 'messages_per_allocation', 'total_moves']
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def scenario_key(result: Dict) -> Tuple[int, int, int, str]:
+    return result['slot_count'], result['max_slot_height'], result['container_count'], \
+        result.get('stacking_policy', DepartureOrderPolicy.name)
+
+
+def load_baseline(path: str) -> Dict[Tuple[int, int, int, str], Dict]:
+    baseline = {}
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                result = json.loads(line)
+                baseline[scenario_key(result)] = result
+    return baseline
+
+
+def print_comparison(result: Dict, baseline: Dict):
+    for metric in COMPARED_METRICS:
+        previous, current = baseline[metric], result[metric]
+        change = (current - previous) / previous * 100 if previous else 0.0
+        print(f'  {metric}: {previous:.4f} -> {current:.4f} ({change:+.1f}%)')
+
+
+@click.command()
+@click.option('--domain', default=DEFAULT_XMPP_SERVER, type=str, help='Domain address')
+@click.option('--slot-count', default=[4], multiple=True, type=int, help='Slots count (repeatable)')
+@click.option('--max-slot-height', default=[5], multiple=True, type=int, help='Max height of the slot (repeatable)')
+@click.option('--container-count', default=[16], multiple=True, type=int, help='Container count (repeatable)')
+@click.option('--stacking-policy', default=[DepartureOrderPolicy.name], multiple=True,
+              type=click.Choice(list(STACKING_POLICIES)), help='Stacking policy (repeatable)')
+@click.option('--max-containers-in-batch', default=1, type=int, help='Max containers arriving at once')
+@click.option('--timeout', default=600.0, type=float, help='Max seconds to wait for a scenario to finish')
+@click.option('--output', default='bench_output.jsonl', type=str, help='JSON lines file the results are appended to')
+@click.option('--baseline', default=None, type=str, help='JSON lines file with results to compare against')
+def main(domain: str, slot_count: Sequence[int], max_slot_height: Sequence[int], container_count: Sequence[int],
+         stacking_policy: Sequence[str], max_containers_in_batch: int, timeout: float, output: str,
+         baseline: Optional[str]):
+    baseline_results = load_baseline(baseline) if baseline is not None else {}
+    commit = current_commit()
+    with open(output, 'a') as file:
+        for slots, height, containers, policy in itertools.product(slot_count, max_slot_height, container_count,
+                                                                   stacking_policy):
+            config = ScenarioConfig(slots, height, containers, policy)
+            print(f'Running scenario {config}')
+            result = asdict(run_scenario(domain, config, max_containers_in_batch, timeout))
+            result['commit'] = commit
+            result['timestamp'] = datetime.now().isoformat()
+            file.write(json.dumps(result) + '\n')
+            file.flush()
+            print(json.dumps(result))
+            previous = baseline_results.get(scenario_key(result))
+            if previous is not None:
+                print_comparison(result, previous)
+
+
+if __name__ == "__main__":
+    main()
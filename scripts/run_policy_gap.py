@@ -0,0 +1,75 @@
+import random
+import sys
+from typing import Dict, Optional, Sequence
+
+import click
+
+sys.path.extend(['.'])
+
+from src.allocation.optimal_moves import DEFAULT_NODE_LIMIT
+from src.allocation.stacking_policy import STACKING_POLICIES, create_stacking_policy
+from src.utils.test_environment import TestEnvironment
+
+
+@click.command()
+@click.option('--slot-count', default=3, type=int, help='Slots count')
+@click.option('--max-slot-height', default=4, type=int, help='Max height of the slot')
+@click.option('--container-count', default=10, type=int, help='Container count')
+@click.option('--max-containers-in-batch', default=3, type=int, help='Max containers arriving at once')
+@click.option('--scenarios', default=50, type=int, help='Scenarios generated and compared')
+@click.option('--seed', default=0, type=int, help='Seed of the first scenario')
+@click.option('--stacking-policy', default=list(STACKING_POLICIES), multiple=True,
+              type=click.Choice(list(STACKING_POLICIES)), help='Stacking policy (repeatable, all by default)')
+@click.option('--node-limit', default=DEFAULT_NODE_LIMIT, type=int,
+              help='Search nodes per scenario, the lower bound is used for scenarios not solved within it')
+@click.option('--max-gap', default=None, type=float,
+              help='Fail when a policy makes this fraction more moves than the optimum or the bound in total')
+def main(slot_count: int, max_slot_height: int, container_count: int, max_containers_in_batch: int, scenarios: int,
+         seed: int, stacking_policy: Sequence[str], node_limit: int, max_gap: Optional[float]):
+    test_environment = TestEnvironment.instance()
+    test_environment.setup('localhost', max_slot_height, slot_count, container_count)
+    reference_moves = 0
+    solved = 0
+    compared = 0
+    policy_moves: Dict[str, int] = {name: 0 for name in stacking_policy}
+    stuck: Dict[str, int] = {name: 0 for name in stacking_policy}
+    for scenario in range(scenarios):
+        random.seed(seed + scenario)
+        containers_data = test_environment.prepare_test(max_containers_in_batch)
+        result = test_environment.get_min_moves(containers_data, node_limit)
+        if result.moves is None and result.nodes <= node_limit:
+            # the yard is too small for the scenario
+            continue
+        departures = [container_data.departure_time for container_data in containers_data]
+        moves: Dict[str, int] = {}
+        for name in stacking_policy:
+            try:
+                moves[name] = test_environment.get_moves_count_for_policy(
+                    containers_data, create_stacking_policy(name, departures))
+            except ValueError:
+                stuck[name] += 1
+        if len(moves) < len(stacking_policy):
+            continue
+        compared += 1
+        if result.optimal:
+            reference_moves += result.moves
+            solved += 1
+        else:
+            reference_moves += test_environment.get_moves_lower_bound(containers_data)
+        for name in stacking_policy:
+            policy_moves[name] += moves[name]
+
+    print(f'{compared} of {scenarios} scenarios compared, {solved} solved optimally, {reference_moves} moves at best')
+    failed = False
+    for name, moves_count in policy_moves.items():
+        gap = (moves_count - reference_moves) / reference_moves if reference_moves else 0.0
+        print(f'  {name}: {moves_count} moves ({gap:+.1%}), stuck with a full yard in {stuck[name]} scenarios')
+        if max_gap is not None and (gap > max_gap or stuck[name] > 0):
+            failed = True
+    if failed:
+        print(f'Gap above {max_gap:.1%} or scenarios a policy could not play')
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,12 @@
 import asyncio
+import itertools
+import logging
 import signal
 import sys
+from collections import defaultdict
 from datetime import datetime, timedelta
 from time import sleep
-from typing import Sequence
+from typing import Dict, List, Sequence, Optional
 
 import click
 
@@ -11,41 +14,48 @@ from src.agents.DFAgent import DFService, DFAgent
 
 from src.agents.port_manager_agent import PortManagerAgent
 from src.agents.truck_agent import TruckAgent
-from src.utils.test_environment import TestEnvironment
+from src.allocation.remarshalling import RemarshallingSettings
+from src.allocation.stacking_policy import StackingPolicy, DepartureOrderPolicy, STACKING_POLICIES, \
+    create_stacking_policy
+from src.utils.agent_logging import configure_logging
+from src.utils.agent_runner import AgentRunner, DEFAULT_MAX_PARALLEL
+from src.utils.message_log import MessageRecorder
+from src.utils.metrics import MetricsRegistry
+from src.utils.test_environment import TestEnvironment, TruckData
+from src.utils.tracing import Tracer
 
 sys.path.extend(['.'])
 
 from src.agents.container_agent import ContainerAgent
+from src.agents.container_allocator_agent import ContainerAllocatorAgent
+from src.agents.move_accounting_agent import MoveAccountingAgent
+from src.agents.yard_dashboard_agent import YardDashboardAgent
+from src.agents.yard_state_agent import YardStateAgent
 from src.agents.slot_manager_agent import SlotManagerAgent
 
 DEFAULT_XMPP_SERVER = '192.168.0.24'
 
 
-def run_slot_manager_agent(slot_id: str, domain: str, max_height: int):
-    slot_manager_agent = SlotManagerAgent(f'slot_{slot_id}@{domain}', 'slot_password', slot_id, max_height)
-    future = slot_manager_agent.start()
-    future.result()
-    return slot_manager_agent
+def create_slot_manager_agent(slot_id: str, domain: str, max_height: int, stacking_policy: StackingPolicy,
+                              move_accounting_jid: str, dashboard_jid: str, yard_state_jid: str,
+                              remarshalling: Optional[RemarshallingSettings], port_manager_jid: str):
+    return SlotManagerAgent(f'slot_{slot_id}@{domain}', 'slot_password', slot_id, max_height, stacking_policy,
+                            move_accounting_jid, dashboard_jid, yard_state_jid, remarshalling, port_manager_jid)
 
 
-def run_container_agent(container_jid: str, departure_time: datetime):
-    container_agent = ContainerAgent(container_jid, 'container_password', departure_time)
-    future = container_agent.start()
-    future.result()
-    return container_agent
+def create_container_agent(container_jid: str, departure_time: datetime, yard_state_jid: str):
+    return ContainerAgent(container_jid, 'container_password', departure_time, yard_state_jid)
 
 
-def run_truck_agent(truck_id: int, domain: str, arrival_time: datetime, containers_jids: Sequence[str],
-                    port_manager_agent_jid: str):
-    truck_agent = TruckAgent(f'truck_{truck_id}@{domain}', 'truck_password', containers_jids, arrival_time,
-                             port_manager_agent_jid)
-    future = truck_agent.start()
-    future.result()
+def create_truck_agent(truck_id: int, domain: str, arrival_time: datetime, containers_jids: Sequence[str],
+                       port_manager_agent_jid: str):
+    return TruckAgent(f'truck_{truck_id}@{domain}', 'truck_password', containers_jids, arrival_time,
+                      port_manager_agent_jid)
 
 
-def run_port_manager_agent(jid: str):
-    port_manager_agent = PortManagerAgent(jid, 'port_manager_password')
-    port_manager_agent.start()
+def create_container_allocator_agent(domain: str, stacking_policy: StackingPolicy, yard_state_jid: str):
+    return ContainerAllocatorAgent(f'container_allocator@{domain}', 'allocator_password', stacking_policy,
+                                   yard_state_jid)
 
 
 def initializer():
@@ -58,39 +68,102 @@ def initializer():
 @click.option('--max-slot-height', default=5, type=int, help='Max height of the slot')
 @click.option('--slot-count', default=4, type=int, help='Slots count')
 @click.option('--container-count', default=16, type=int, help='Container count')
-def main(domain: str, max_slot_height: int, slot_count: int, container_count: int):
-    agents = []
+@click.option('--lightweight-containers', is_flag=True, help='Keep containers as records of one allocator agent')
+@click.option('--max-containers-in-batch', default=1, type=int, help='Max containers arriving at once')
+@click.option('--max-containers-per-truck', default=1, type=int, help='Max containers picked up by one truck')
+@click.option('--batch-allocation', is_flag=True,
+              help='Allocate containers arriving at once in one negotiation (needs --lightweight-containers)')
+@click.option('--stacking-policy', default=DepartureOrderPolicy.name, type=click.Choice(list(STACKING_POLICIES)),
+              help='Placement scoring used by the slot managers')
+@click.option('--metrics', is_flag=True, help='Record message and latency metrics, served at /metrics')
+@click.option('--log-file', default=None, type=str, help='JSON lines file the agents log to (stdout by default)')
+@click.option('--log-level', default='INFO', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']),
+              help='Lowest level of the agent log records written')
+@click.option('--log-sample-rate', default=1.0, type=float, help='Fraction of the records below WARNING written')
+@click.option('--trace-file', default=None, type=str, help='OTLP JSON lines file conversation spans are written to')
+@click.option('--message-log', default=None, type=str,
+              help='JSON lines file the messages sent and received by the agents are appended to')
+@click.option('--remarshalling-horizon', default=None, type=float,
+              help='Relocate containers blocking departures due within this many seconds while slots are idle')
+@click.option('--remarshalling-budget', default=None, type=int, help='Max relocations per slot when remarshalling')
+@click.option('--max-parallel-starts', default=DEFAULT_MAX_PARALLEL, type=int,
+              help='Max agents starting or stopping at once')
+def main(domain: str, max_slot_height: int, slot_count: int, container_count: int, lightweight_containers: bool,
+         max_containers_in_batch: int, max_containers_per_truck: int, batch_allocation: bool, stacking_policy: str,
+         metrics: bool, log_file: Optional[str], log_level: str, log_sample_rate: float, trace_file: Optional[str],
+         message_log: Optional[str], remarshalling_horizon: Optional[float], remarshalling_budget: Optional[int],
+         max_parallel_starts: int):
+    runner = AgentRunner(max_parallel_starts)
+    remarshalling = None
+    if remarshalling_horizon is not None:
+        remarshalling = RemarshallingSettings(timedelta(seconds=remarshalling_horizon),
+                                              max_relocations=remarshalling_budget)
+    configure_logging(log_file, logging.getLevelName(log_level), log_sample_rate)
+    if trace_file is not None:
+        Tracer.instance().enable(trace_file)
+    if metrics:
+        MetricsRegistry.instance().enable()
+    if message_log is not None:
+        MessageRecorder.instance().enable(message_log)
     try:
-        df = DFAgent(domain, 'password1234')
-        future = df.start()
-        future.result()
+        df = runner.start(DFAgent(domain, 'password1234'))
+        runner.wait_ready()
         df.web.start(hostname="localhost", port="9999")
-        agents.append(df)
-
-        # Run port manager
-        port_manager_agent_jid = f'port_manager@{domain}'
-        run_port_manager_agent(port_manager_agent_jid)
-
-        # Run slot managers
-        for i in range(slot_count):
-            agents.append(run_slot_manager_agent(str(i), domain, max_slot_height))
-
-        # Run trucks managers and containers
 
         test_environment = TestEnvironment.instance()
         test_environment.setup(domain, max_slot_height, slot_count, container_count)
-        containers_data = test_environment.prepare_test(1)
+        containers_data = test_environment.prepare_test(max_containers_in_batch)
+        trucks_data = test_environment.prepare_trucks(containers_data, max_containers_per_truck)
+        arrivals = {container_data.jid: container_data.arrival_time for container_data in containers_data}
+        trucks_by_arrival: Dict[datetime, List[TruckData]] = defaultdict(list)
+        for truck_data in trucks_data:
+            trucks_by_arrival[max(arrivals[jid] for jid in truck_data.container_jids)].append(truck_data)
         naive_moves = test_environment.get_moves_count_for_naive_method(containers_data)
         print(f"moves for naive method: {naive_moves}")
-        truck_id = 0
-        for container_data in containers_data:
-            containers_jids = [container_data.jid]
-            run_truck_agent(truck_id, domain, container_data.departure_time, containers_jids, port_manager_agent_jid)
-            time_until_arrival = container_data.arrival_time - datetime.now()
+        policy = create_stacking_policy(stacking_policy, [c.departure_time for c in containers_data])
+
+        # Run port manager, yard agents and slot managers
+        container_allocator_jid = f'container_allocator@{domain}' if lightweight_containers else None
+        port_manager_agent_jid = f'port_manager@{domain}'
+        runner.start(PortManagerAgent(port_manager_agent_jid, 'port_manager_password', container_allocator_jid))
+        move_accounting_jid = f'move_accounting@{domain}'
+        runner.start(MoveAccountingAgent(move_accounting_jid, 'move_accounting_password', naive_moves))
+        dashboard_jid = f'yard_dashboard@{domain}'
+        runner.start(YardDashboardAgent(dashboard_jid, 'dashboard_password'))
+        yard_state_jid = f'yard_state@{domain}'
+        runner.start(YardStateAgent(yard_state_jid, 'yard_state_password'))
+        for i in range(slot_count):
+            runner.start(create_slot_manager_agent(str(i), domain, max_slot_height, policy, move_accounting_jid,
+                                                   dashboard_jid, yard_state_jid, remarshalling,
+                                                   port_manager_agent_jid))
+        # Slot managers have to be registered before anyone searches for them
+        runner.wait_ready()
+
+        container_allocator_agent = None
+        if lightweight_containers:
+            container_allocator_agent = runner.start(create_container_allocator_agent(domain, policy,
+                                                                                      yard_state_jid))
+        print(f"agents started in {runner.wait_ready():.2f}s")
+
+        # Run trucks managers and containers, a truck once its last container arrives
+        for arrival_time, arriving_containers in itertools.groupby(containers_data, key=lambda c: c.arrival_time):
+            arriving_containers = list(arriving_containers)
+            for truck_data in trucks_by_arrival[arrival_time]:
+                runner.start(create_truck_agent(truck_data.id, domain, truck_data.departure_time,
+                                                truck_data.container_jids, port_manager_agent_jid))
+            time_until_arrival = arrival_time - datetime.now()
             if time_until_arrival.seconds > 0:
                 asyncio.run(asyncio.sleep(time_until_arrival.seconds))
-            agents.append(run_container_agent(container_data.jid, container_data.departure_time))
-            truck_id += 1
+            if container_allocator_agent is not None and batch_allocation:
+                container_allocator_agent.allocate_batch([(container_data.jid, container_data.departure_time)
+                                                          for container_data in arriving_containers])
+            elif container_allocator_agent is not None:
+                for container_data in arriving_containers:
+                    container_allocator_agent.allocate(container_data.jid, container_data.departure_time)
+            else:
+                for container_data in arriving_containers:
+                    runner.start(create_container_agent(container_data.jid, container_data.departure_time,
+                                                        yard_state_jid))
 
         while True:
             sleep(1)
@@ -98,8 +171,7 @@ def main(domain: str, max_slot_height: int, slot_count: int, container_count: in
     except KeyboardInterrupt:
         print("Agent System terminated")
     finally:
-        for agent in agents:
-            agent.stop()
+        runner.stop_all()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import asyncio
 import multiprocessing
-import signal
 import sys
 from datetime import datetime, timedelta
 from time import sleep
@@ -12,47 +11,52 @@ from src.agents.DFAgent import DFService, DFAgent
 
 from src.agents.port_manager_agent import PortManagerAgent
 from src.agents.truck_agent import TruckAgent
+from src.allocation.stacking_policy import StackingPolicy, DepartureOrderPolicy, STACKING_POLICIES, \
+    create_stacking_policy
+from src.utils.agent_pool import ShardedAgentPool, AgentSpec
 from src.utils.test_environment import TestEnvironment
 
 sys.path.extend(['.'])
 
 from src.agents.container_agent import ContainerAgent
+from src.agents.move_accounting_agent import MoveAccountingAgent
+from src.agents.yard_dashboard_agent import YardDashboardAgent
+from src.agents.yard_state_agent import YardStateAgent
 from src.agents.slot_manager_agent import SlotManagerAgent
 
 DEFAULT_XMPP_SERVER = 'host.docker.internal'
 
 
-def run_slot_manager_agent(slot_id: str, domain: str, max_height: int):
-    slot_manager_agent = SlotManagerAgent(f'slot_{slot_id}@{domain}', 'slot_password', slot_id, max_height)
-    future = slot_manager_agent.start()
-    future.result()
-    return slot_manager_agent
+def create_slot_manager_agent(slot_id: str, domain: str, max_height: int, stacking_policy: StackingPolicy,
+                              move_accounting_jid: str, dashboard_jid: str, yard_state_jid: str,
+                              port_manager_jid: str) -> SlotManagerAgent:
+    return SlotManagerAgent(f'slot_{slot_id}@{domain}', 'slot_password', slot_id, max_height, stacking_policy,
+                            move_accounting_jid, dashboard_jid, yard_state_jid, port_manager_jid=port_manager_jid)
 
 
-def run_container_agent(container_jid: str, departure_time: datetime):
-    container_agent = ContainerAgent(container_jid, 'container_password', departure_time)
-    future = container_agent.start()
-    future.result()
-    return container_agent
+def create_container_agent(container_jid: str, departure_time: datetime, yard_state_jid: str) -> ContainerAgent:
+    return ContainerAgent(container_jid, 'container_password', departure_time, yard_state_jid)
 
 
-def run_truck_agent(truck_id: int, domain: str, arrival_time: datetime, containers_jids: Sequence[str],
-                    port_manager_agent_jid: str):
-    truck_agent = TruckAgent(f'truck_{truck_id}@{domain}', 'truck_password', containers_jids, arrival_time,
-                             port_manager_agent_jid)
-    future = truck_agent.start()
-    future.result()
+def create_truck_agent(truck_jid: str, arrival_time: datetime, containers_jids: Sequence[str],
+                       port_manager_agent_jid: str) -> TruckAgent:
+    return TruckAgent(truck_jid, 'truck_password', containers_jids, arrival_time, port_manager_agent_jid)
 
 
-def run_port_manager_agent(jid: str):
-    port_manager_agent = PortManagerAgent(jid, 'port_manager_password')
-    future = port_manager_agent.start()
-    future.result()
+def create_move_accounting_agent(jid: str, naive_moves: int) -> MoveAccountingAgent:
+    return MoveAccountingAgent(jid, 'move_accounting_password', naive_moves)
 
 
-def initializer():
-    """Ignore SIGINT in child workers."""
-    signal.signal(signal.SIGINT, signal.SIG_IGN)
+def create_yard_dashboard_agent(jid: str) -> YardDashboardAgent:
+    return YardDashboardAgent(jid, 'dashboard_password')
+
+
+def create_yard_state_agent(jid: str) -> YardStateAgent:
+    return YardStateAgent(jid, 'yard_state_password')
+
+
+def create_port_manager_agent(jid: str) -> PortManagerAgent:
+    return PortManagerAgent(jid, 'port_manager_password')
 
 
 @click.command()
@@ -60,38 +64,54 @@ def initializer():
 @click.option('--max-slot-height', default=5, type=int, help='Max height of the slot')
 @click.option('--slot-count', default=4, type=int, help='Slots count')
 @click.option('--container-count', default=16, type=int, help='Container count')
-def main(domain: str, max_slot_height: int, slot_count: int, container_count: int):
-    agents = []
-    pool = multiprocessing.Pool(slot_count + 2 * container_count, initializer=initializer)
+@click.option('--workers', default=multiprocessing.cpu_count(), type=int, help='Agent hosting processes count')
+@click.option('--stacking-policy', default=DepartureOrderPolicy.name, type=click.Choice(list(STACKING_POLICIES)),
+              help='Placement scoring used by the slot managers')
+def main(domain: str, max_slot_height: int, slot_count: int, container_count: int, workers: int,
+         stacking_policy: str):
+    pool = ShardedAgentPool(workers)
+    pool.start()
+    df = None
     try:
         df = DFAgent(domain, 'password1234')
         future = df.start()
         future.result()
         df.web.start(hostname="localhost", port="9999")
-        agents.append(df)
 
         # Run port manager
         port_manager_agent_jid = f'port_manager@{domain}'
-        run_port_manager_agent(port_manager_agent_jid)
-
-        # Run slot managers
-        for i in range(slot_count):
-            pool.apply_async(run_slot_manager_agent, args=(str(i), domain, max_slot_height))
+        pool.submit(AgentSpec(port_manager_agent_jid, create_port_manager_agent, (port_manager_agent_jid,)))
 
         test_environment = TestEnvironment.instance()
         test_environment.setup(domain, max_slot_height, slot_count, container_count)
         containers_data = test_environment.prepare_test(1)
         naive_moves = test_environment.get_moves_count_for_naive_method(containers_data)
         print(f"moves for naive method: {naive_moves}")
+        policy = create_stacking_policy(stacking_policy, [c.departure_time for c in containers_data])
+        move_accounting_jid = f'move_accounting@{domain}'
+        pool.submit(AgentSpec(move_accounting_jid, create_move_accounting_agent, (move_accounting_jid, naive_moves)))
+        dashboard_jid = f'yard_dashboard@{domain}'
+        pool.submit(AgentSpec(dashboard_jid, create_yard_dashboard_agent, (dashboard_jid,)))
+        yard_state_jid = f'yard_state@{domain}'
+        pool.submit(AgentSpec(yard_state_jid, create_yard_state_agent, (yard_state_jid,)))
+
+        # Run slot managers
+        for i in range(slot_count):
+            pool.submit(AgentSpec(f'slot_{i}@{domain}', create_slot_manager_agent,
+                                  (str(i), domain, max_slot_height, policy, move_accounting_jid, dashboard_jid,
+                                   yard_state_jid, port_manager_agent_jid)))
         truck_id = 0
         # Run truck managers and containers
         for container_data in containers_data:
             containers_jids = [container_data.jid]
-            pool.apply_async(run_truck_agent, args=(truck_id, domain, container_data.departure_time, containers_jids, port_manager_agent_jid))
+            truck_jid = f'truck_{truck_id}@{domain}'
+            pool.submit(AgentSpec(truck_jid, create_truck_agent,
+                                  (truck_jid, container_data.departure_time, containers_jids, port_manager_agent_jid)))
             time_until_arrival = container_data.arrival_time - datetime.now()
             if time_until_arrival.seconds > 0:
                 asyncio.run(asyncio.sleep(time_until_arrival.seconds))
-            pool.apply_async(run_container_agent, args=(container_data.jid, container_data.departure_time))
+            pool.submit(AgentSpec(container_data.jid, create_container_agent,
+                                  (container_data.jid, container_data.departure_time, yard_state_jid)))
             truck_id += 1
 
         while True:
@@ -100,8 +120,9 @@ def main(domain: str, max_slot_height: int, slot_count: int, container_count: in
     except KeyboardInterrupt:
         print("Agent System terminated")
     finally:
-        pool.terminate()
-        pool.join()
+        pool.shutdown()
+        if df is not None:
+            df.stop()
 
 
 if __name__ == "__main__":
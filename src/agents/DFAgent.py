@@ -1,6 +1,12 @@
+import asyncio
+import bisect
+import heapq
 import sys
+import time
+from collections.abc import Mapping
+from datetime import datetime, timedelta
 from enum import IntEnum
-from typing import Sequence, Optional
+from typing import Sequence, Optional, Tuple, List, AsyncIterator, Dict, Callable, Iterator
 
 from spade.behaviour import *
 
@@ -8,11 +14,16 @@ from src.agents.base_agent import BaseAgent
 from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
 from src.ontology.content_manager import ContentManager
 from src.ontology.directory_facilitator_ontology import DFAgentDescription, \
-    SearchServiceResponse, RegisterService, DeregisterService, DFOntology, SearchServiceRequest
+    SearchServiceResponse, RegisterService, DeregisterService, DFOntology, SearchServiceRequest, RenewLease, \
+    SubscribeExpirations, RegistrationExpired
 from src.ontology.ontology import Action
 from src.utils.acl_message import ACLMessage
-from src.utils.jid_utils import jid_to_str
 from src.utils.performative import Performative
+from src.utils.tracing import start_span, SpanKind
+
+DEFAULT_SEARCH_PAGE_SIZE = 100
+DEFAULT_LEASE_DURATION = 10
+LEASE_CHECK_PERIOD = 1.0
 
 
 class DFAgent(BaseAgent):
@@ -25,12 +36,14 @@ class DFAgent(BaseAgent):
             self.contentManager: ContentManager = contentManager
 
         async def run(self):
-            msg = await self.receive()
+            msg = await self.wait_for_message()
             if msg:
                 reply: ACLMessage = msg.make_reply()
                 try:
                     service: RegisterService = self.contentManager.extract_content(msg)
-                    self.registeredServices.append(service.request)
+                    self.agent.addRegistration(service.request)
+                    if service.leaseDuration is not None:
+                        self.agent.addLease(service.request.agentName, service.leaseDuration)
                     reply.set_metadata("performative", str(Performative.INFORM.value))
                 except Exception as ex:
                     sys.stderr.write(f'DF BaseAgent exception \n {ex} \n at ACLMessage \n {msg}')
@@ -45,14 +58,16 @@ class DFAgent(BaseAgent):
             self.contentManager: ContentManager = contentManager
 
         async def run(self):
-            msg = await self.receive()
+            msg = await self.wait_for_message()
             if msg:
                 reply: ACLMessage = msg.make_reply()
                 try:
                     request: SearchServiceRequest = self.contentManager.extract_content(msg)
                     template: DFAgentDescription = request.request
-                    dfAgentDescriptionList: Sequence[DFAgentDescription] = self.__search(template)
-                    searchServiceResponse: SearchServiceResponse = SearchServiceResponse(dfAgentDescriptionList)
+                    dfAgentDescriptionList, nextCursor = self.__search(template, request.cursor or 0,
+                                                                       request.maxResults)
+                    searchServiceResponse: SearchServiceResponse = SearchServiceResponse(dfAgentDescriptionList,
+                                                                                         nextCursor)
 
                     self.contentManager.fill_content(searchServiceResponse, reply)
                     reply.set_metadata("ontology", DFOntology.instance().name)
@@ -63,12 +78,24 @@ class DFAgent(BaseAgent):
                 finally:
                     await self.send(reply)
 
-        def __search(self, template: DFAgentDescription) -> Optional[Sequence[DFAgentDescription]]:
+        def __search(self, template: DFAgentDescription, cursor: int = 0, maxResults: Optional[int] = None) \
+                -> Tuple[Optional[Sequence[DFAgentDescription]], Optional[int]]:
+            """
+            Scans the registrations numbered from `cursor` on and returns at most `maxResults` matches together with
+            the number of the next match, None when there are no more. Registrations removed or added between pages
+            don't shift the cursor, so no match is skipped or repeated.
+            """
             result = []
-            for item in self.registeredServices:
+            for number, item in self.agent.registrationsFrom(cursor):
                 if DFAgent.SearchBehaviour.__compare(item, template):
+                    if maxResults is not None and len(result) >= maxResults:
+                        return result, number
                     result.append(item)
-            return result if not result == [] else None
+            return result if not result == [] else None, None
+
+        @staticmethod
+        def matches(item: DFAgentDescription, template: DFAgentDescription) -> bool:
+            return DFAgent.SearchBehaviour.__compare(item, template)
 
         @staticmethod
         def __compare(item: DFAgentDescription, template: DFAgentDescription) -> bool:
@@ -97,7 +124,7 @@ class DFAgent(BaseAgent):
             self.contentManager: ContentManager = contentManager
 
         async def run(self):
-            msg = await self.receive()
+            msg = await self.wait_for_message()
             if msg:
                 template = self.contentManager.extract_content(msg)
                 reply: ACLMessage = msg.make_reply()
@@ -111,9 +138,8 @@ class DFAgent(BaseAgent):
                     await self.send(reply)
 
         def __delete(self, template: DFAgentDescription):
-            toBeDeleted = [x for x in self.registeredServices if DFAgent.DeleteBehaviour.__compare(x, template)]
-            for item in toBeDeleted:
-                self.registeredServices.remove(item)
+            for item in self.agent.removeRegistrations(lambda x: DFAgent.DeleteBehaviour.__compare(x, template)):
+                self.agent.dropLease(item.agentName)
 
         @staticmethod
         def __compare(item: DFAgentDescription, template: DFAgentDescription) -> bool:
@@ -136,6 +162,69 @@ class DFAgent(BaseAgent):
             else:
                 return False
 
+    class RenewLeaseBehaviour(BaseCyclicBehaviour):
+        """
+        Extends leases silently, only a renewal of an unknown lease is answered with a failure
+        """
+
+        def __init__(self, contentManager: ContentManager):
+            super().__init__()
+            self.contentManager: ContentManager = contentManager
+
+        async def run(self):
+            msg = await self.wait_for_message()
+            if msg:
+                try:
+                    renewal: RenewLease = self.contentManager.extract_content(msg)
+                    if self.agent.renewLease(renewal.agentName):
+                        return
+                except Exception as ex:
+                    sys.stderr.write(f'DF BaseAgent exception \n {ex} \n at ACLMessage \n {msg}')
+                reply: ACLMessage = msg.make_reply()
+                reply.set_metadata("performative", str(Performative.FAILURE.value))
+                await self.send(reply)
+
+    class SubscribeBehaviour(BaseCyclicBehaviour):
+        def __init__(self, contentManager: ContentManager):
+            super().__init__()
+            self.contentManager: ContentManager = contentManager
+
+        async def run(self):
+            msg = await self.wait_for_message()
+            if msg:
+                reply: ACLMessage = msg.make_reply()
+                try:
+                    subscription: SubscribeExpirations = self.contentManager.extract_content(msg)
+                    self.agent.subscribers.append((str(msg.sender.bare()), subscription.request))
+                    reply.set_metadata("performative", str(Performative.INFORM.value))
+                except Exception as ex:
+                    sys.stderr.write(f'DF BaseAgent exception \n {ex} \n at ACLMessage \n {msg}')
+                    reply.set_metadata("performative", str(Performative.FAILURE.value))
+                finally:
+                    await self.send(reply)
+
+    class LeaseExpiryBehaviour(PeriodicBehaviour):
+        """
+        Removes the registrations whose lease ran out and tells the subscribers with a matching template
+        """
+
+        def __init__(self, contentManager: ContentManager, period: float = LEASE_CHECK_PERIOD):
+            super().__init__(period)
+            self.contentManager: ContentManager = contentManager
+
+        async def run(self):
+            for description in self.agent.expireLeases(time.monotonic()):
+                subscribers = [subscriber for subscriber, template in self.agent.subscribers
+                               if DFAgent.SearchBehaviour.matches(description, template)]
+                if not subscribers:
+                    continue
+                notification: ACLMessage = ACLMessage()
+                notification.performative = Performative.INFORM
+                notification.ontology = DFOntology.instance().name
+                for msg in self.contentManager.fill_content_many(RegistrationExpired(description), notification,
+                                                                 subscribers):
+                    await self.send(msg)
+
     """
     Directory Facilitator BaseAgent
     """
@@ -143,9 +232,14 @@ class DFAgent(BaseAgent):
     def __init__(self, domain: str, password: str):
         super().__init__(f'{DFAgent.__localname}@{domain}', password)
         self.registeredServices: Sequence[DFAgentDescription] = []
+        self.registrationNumbers: List[int] = []
+        self.nextRegistrationNumber: int = 0
         self.contentManager: ContentManager = ContentManager()
         self.dfOntology: DFOntology = DFOntology.instance()
         self.contentManager.register_ontology(self.dfOntology)
+        self.leases: Dict[str, Tuple[float, int]] = {}
+        self.leaseDeadlines: List[Tuple[float, str]] = []
+        self.subscribers: List[Tuple[str, DFAgentDescription]] = []
 
     async def setup(self):
         registerTemplate: Template = Template()
@@ -163,6 +257,75 @@ class DFAgent(BaseAgent):
         deregisterTemplate.set_metadata("action", DeregisterService.__key__)
         self.add_behaviour(self.DeleteBehaviour(self.registeredServices, self.contentManager), deregisterTemplate)
 
+        renewLeaseTemplate: Template = Template()
+        renewLeaseTemplate.set_metadata("ontology", self.dfOntology.name)
+        renewLeaseTemplate.set_metadata("action", RenewLease.__key__)
+        self.add_behaviour(self.RenewLeaseBehaviour(self.contentManager), renewLeaseTemplate)
+
+        subscribeTemplate: Template = Template()
+        subscribeTemplate.set_metadata("ontology", self.dfOntology.name)
+        subscribeTemplate.set_metadata("action", SubscribeExpirations.__key__)
+        self.add_behaviour(self.SubscribeBehaviour(self.contentManager), subscribeTemplate)
+        self.add_behaviour(self.LeaseExpiryBehaviour(self.contentManager))
+
+    def addRegistration(self, description: DFAgentDescription):
+        """
+        Registrations keep the order they were made in, each one numbered higher than the previous ones
+        """
+        self.registeredServices.append(description)
+        self.registrationNumbers.append(self.nextRegistrationNumber)
+        self.nextRegistrationNumber += 1
+
+    def removeRegistrations(self, removed: Callable[[DFAgentDescription], bool]) -> List[DFAgentDescription]:
+        result = []
+        keptNumbers = []
+        kept = []
+        for number, x in zip(self.registrationNumbers, self.registeredServices):
+            if removed(x):
+                result.append(x)
+            else:
+                keptNumbers.append(number)
+                kept.append(x)
+        self.registrationNumbers[:] = keptNumbers
+        self.registeredServices[:] = kept
+        return result
+
+    def registrationsFrom(self, number: int) -> Iterator[Tuple[int, DFAgentDescription]]:
+        start = bisect.bisect_left(self.registrationNumbers, number)
+        for index in range(start, len(self.registeredServices)):
+            yield self.registrationNumbers[index], self.registeredServices[index]
+
+    def addLease(self, agentName: str, leaseDuration: int):
+        """
+        (Re)starts the lease of the agent registrations. Deadlines are kept in a heap, a renewal pushes a new one and
+        the outdated deadline is skipped when it comes up.
+        """
+        deadline = time.monotonic() + leaseDuration
+        self.leases[agentName] = (deadline, leaseDuration)
+        heapq.heappush(self.leaseDeadlines, (deadline, agentName))
+
+    def renewLease(self, agentName: str) -> bool:
+        lease = self.leases.get(agentName)
+        if lease is None:
+            return False
+        self.addLease(agentName, lease[1])
+        return True
+
+    def dropLease(self, agentName: str):
+        self.leases.pop(agentName, None)
+
+    def expireLeases(self, now: float) -> List[DFAgentDescription]:
+        expiredNames = set()
+        while self.leaseDeadlines and self.leaseDeadlines[0][0] <= now:
+            deadline, agentName = heapq.heappop(self.leaseDeadlines)
+            lease = self.leases.get(agentName)
+            if lease is not None and lease[0] == deadline:
+                del self.leases[agentName]
+                expiredNames.add(agentName)
+        if not expiredNames:
+            return []
+        return self.removeRegistrations(lambda x: x.agentName in expiredNames)
+
 
 class HandlerBehaviour(BaseCyclicBehaviour):
     @abstractmethod
@@ -202,11 +365,41 @@ class HandlerBehaviour(BaseCyclicBehaviour):
         self.contentManager = contentManager
         self.__setState()
 
+    def isResponse(self, msg: ACLMessage) -> bool:
+        return msg.ontology == DFOntology.instance().name
+
+    async def sendRequestAndWait(self) -> Optional[ACLMessage]:
+        """
+        Sends the request and suspends until the DF response arrives, skipping unrelated messages
+        """
+        if self.state == HandlerBehaviour.CommunicationState.EMPTY_MESSAGE or \
+                self.state == HandlerBehaviour.CommunicationState.EMPTY or \
+                self.state == HandlerBehaviour.CommunicationState.EMPTY_CONTENT_MANAGER:
+            raise Exception(f"Empty {self.state}")
+        with start_span(type(self).__name__, self.agent.name, self.trace_parent, SpanKind.CLIENT,
+                        action=self.msg.action):
+            await self.send(self.msg)
+            self.state = HandlerBehaviour.CommunicationState.WAIT_FOR_RESPONSE
+            while True:
+                response: Optional[ACLMessage] = await self.wait_for_message()
+                if response is None:
+                    return None
+                if self.isResponse(response):
+                    self.state = HandlerBehaviour.CommunicationState.HANDLE
+                    return response
+
 
 class HandleSearchBehaviour(HandlerBehaviour):
+    """
+    Collects the result pages and hands the whole list to `handleResponse`. Each page is passed to `handlePage`
+    as soon as it arrives.
+    """
+
     def __init__(self):
         super().__init__()
         self.result: Optional[Sequence[DFAgentDescription]] = None
+        self.searchRequest: Optional[SearchServiceRequest] = None
+        self.response: Optional[ACLMessage] = None
 
     @abstractmethod
     async def handleResponse(self, result: Optional[Sequence[DFAgentDescription]]):
@@ -216,33 +409,70 @@ class HandleSearchBehaviour(HandlerBehaviour):
     async def handleFailure(self, msg: ACLMessage):
         pass
 
+    async def handlePage(self, page: Sequence[DFAgentDescription]):
+        pass
+
+    def isResponse(self, msg: ACLMessage) -> bool:
+        return super().isResponse(msg) and msg.action == SearchServiceResponse.__key__
+
+    async def pages(self) -> AsyncIterator[List[DFAgentDescription]]:
+        """
+        Yields the matches page by page, the next page is requested once the previous one is consumed
+        """
+        while not self.is_killed():
+            self.response = await self.sendRequestAndWait()
+            if self.response is None or self.response.performative != Performative.INFORM:
+                return
+            content: SearchServiceResponse = self.contentManager.extract_content(self.response)
+            yield HandleSearchBehaviour.__toDescriptions(content.list)
+            if content.nextCursor is None:
+                return
+            self.searchRequest.cursor = content.nextCursor
+            request: ACLMessage = self.msg.copy_to(str(self.msg.to))
+            self.contentManager.fill_content(self.searchRequest, request)
+            self.setMessage(request)
+
     async def run(self):
-        if self.state == HandlerBehaviour.CommunicationState.EMPTY_MESSAGE or \
-                self.state == HandlerBehaviour.CommunicationState.EMPTY or \
-                self.state == HandlerBehaviour.CommunicationState.EMPTY_CONTENT_MANAGER:
-            raise Exception(f"Empty {self.state}")
-        elif self.state == HandleSearchBehaviour.CommunicationState.SEND_REQUEST:
-            if self.msg is not None:
-                await self.send(self.msg)
-                self.state = HandleSearchBehaviour.CommunicationState.WAIT_FOR_RESPONSE
-        elif self.state == HandleSearchBehaviour.CommunicationState.WAIT_FOR_RESPONSE:
-            random: Optional[ACLMessage] = await self.receive()
-            if random is not None and random.ontology == DFOntology.instance().name and \
-                    random.action == SearchServiceResponse.__key__:
-                self.result: SearchServiceResponse = self.contentManager.extract_content(random)
-                newList = []
-                if isinstance(self.result.list, collections.Mapping):
-                    newList.append(DFAgentDescription(**self.result.list))
-                elif isinstance(self.result.list, collections.Sequence):
-                    for temp in self.result.list:
-                        newList.append(DFAgentDescription(**temp))
-                self.result.list = newList
-                if self.result:
-                    if random.performative == Performative.INFORM:
-                        await self.handleResponse(self.result.list)
-                    elif random.performative == Performative.FAILURE:
-                        await self.handleFailure(random)
-                    self.kill()
+        self.result = []
+        async for page in self.pages():
+            self.result.extend(page)
+            await self.handlePage(page)
+        if self.response is not None:
+            if self.response.performative == Performative.INFORM:
+                await self.handleResponse(self.result)
+            elif self.response.performative == Performative.FAILURE:
+                await self.handleFailure(self.response)
+        self.kill()
+
+    @staticmethod
+    def __toDescriptions(descriptions) -> List[DFAgentDescription]:
+        if isinstance(descriptions, Mapping):
+            return [DFAgentDescription(**descriptions)]
+        elif isinstance(descriptions, list):
+            return [DFAgentDescription(**description) for description in descriptions]
+        return []
+
+
+class SearchResultsBehaviour(HandleSearchBehaviour):
+    """
+    Passes the pages to `DFService.searchResults` through a queue, None marks the end of the search
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pagesQueue: asyncio.Queue = asyncio.Queue()
+
+    async def handlePage(self, page: Sequence[DFAgentDescription]):
+        self.pagesQueue.put_nowait(page)
+
+    async def handleResponse(self, result: Optional[Sequence[DFAgentDescription]]):
+        pass
+
+    async def handleFailure(self, msg: ACLMessage):
+        pass
+
+    async def on_end(self):
+        self.pagesQueue.put_nowait(None)
 
 
 class HandleRegisterRequestBehaviour(HandlerBehaviour):
@@ -259,24 +489,14 @@ class HandleRegisterRequestBehaviour(HandlerBehaviour):
         pass
 
     async def run(self):
-        if self.state == HandlerBehaviour.CommunicationState.EMPTY_MESSAGE or \
-                self.state == HandlerBehaviour.CommunicationState.EMPTY or \
-                self.state == HandlerBehaviour.CommunicationState.EMPTY_CONTENT_MANAGER:
-            raise Exception(f"Empty {self.state}")
-        elif self.state == HandlerBehaviour.CommunicationState.SEND_REQUEST:
-            if self.msg is not None:
-                await self.send(self.msg)
-                self.state = HandlerBehaviour.CommunicationState.WAIT_FOR_RESPONSE
-        elif self.state == HandlerBehaviour.CommunicationState.WAIT_FOR_RESPONSE:
-            random: Optional[ACLMessage] = await self.receive()
-            if random is not None and random.ontology == DFOntology.instance().name:
-                self.result = random
-                self.state = HandlerBehaviour.CommunicationState.HANDLE
-                if self.result.performative == Performative.INFORM:
-                    await self.handleAccept(self.result)
-                elif self.result.performative == Performative.FAILURE:
-                    await self.handleFailure(self.result)
-                self.kill()
+        response: Optional[ACLMessage] = await self.sendRequestAndWait()
+        if response is not None:
+            self.result = response
+            if self.result.performative == Performative.INFORM:
+                await self.handleAccept(self.result)
+            elif self.result.performative == Performative.FAILURE:
+                await self.handleFailure(self.result)
+        self.kill()
 
 
 class HandleDeregisterRequestBehaviour(HandlerBehaviour):
@@ -293,23 +513,64 @@ class HandleDeregisterRequestBehaviour(HandlerBehaviour):
         pass
 
     async def run(self):
-        if self.state == HandlerBehaviour.CommunicationState.EMPTY_MESSAGE or \
-                self.state == HandlerBehaviour.CommunicationState.EMPTY or \
-                self.state == HandlerBehaviour.CommunicationState.EMPTY_CONTENT_MANAGER:
-            raise Exception(f"Empty {self.state}")
-        elif self.state == HandlerBehaviour.CommunicationState.SEND_REQUEST:
-            if self.msg is not None:
-                await self.send(self.msg)
-                self.state = HandlerBehaviour.CommunicationState.WAIT_FOR_RESPONSE
-        elif self.state == HandlerBehaviour.CommunicationState.WAIT_FOR_RESPONSE:
-            random: Optional[ACLMessage] = await self.receive()
-            if random is not None and random.ontology == DFOntology.intance().name:
-                self.result = random
-                if self.result.performative == Performative.INFORM:
-                    await self.handleAccept(self.result)
-                elif self.result.performative == Performative.FAILURE:
-                    await self.handleFailure(self.result)
-                self.kill()
+        response: Optional[ACLMessage] = await self.sendRequestAndWait()
+        if response is not None:
+            self.result = response
+            if self.result.performative == Performative.INFORM:
+                await self.handleAccept(self.result)
+            elif self.result.performative == Performative.FAILURE:
+                await self.handleFailure(self.result)
+        self.kill()
+
+
+class LeaseRenewalBehaviour(PeriodicBehaviour):
+    """
+    Renews the DF lease every third of its duration. The DF answers only a renewal of a lease it doesn't know,
+    e.g. one which expired during a long pause, and then the registration is sent again.
+    """
+
+    def __init__(self, registration: ACLMessage, renewal: ACLMessage, leaseDuration: int):
+        period = leaseDuration / 3
+        super().__init__(period, start_at=datetime.now() + timedelta(seconds=period))
+        self.registration: ACLMessage = registration
+        self.renewal: ACLMessage = renewal
+
+    async def run(self):
+        expired = False
+        msg = await self.receive()
+        while msg is not None:
+            expired = expired or ACLMessage.from_message(msg).performative == Performative.FAILURE
+            msg = await self.receive()
+        if expired:
+            await self.send(self.registration.copy_to(str(self.registration.to)))
+        else:
+            await self.send(self.renewal.copy_to(str(self.renewal.to)))
+
+
+class HandleExpirationsBehaviour(BaseCyclicBehaviour):
+    """
+    Subscribes to the registrations matching the template given to `DFService.subscribe` and passes every one which
+    expired to `handleExpired`
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.subscription: Optional[ACLMessage] = None
+
+    @abstractmethod
+    async def handleExpired(self, description: DFAgentDescription):
+        pass
+
+    async def on_start(self):
+        await self.send(self.subscription)
+
+    async def run(self):
+        msg: Optional[ACLMessage] = await self.wait_for_message()
+        if msg is None or msg.performative != Performative.INFORM:
+            return
+        content = DFService.getContentManager().extract_content(msg)
+        if isinstance(content, RegistrationExpired):
+            await self.handleExpired(content.request)
 
 
 class DFService:
@@ -324,22 +585,71 @@ class DFService:
 
     @staticmethod
     async def register(agent: BaseAgent, dfd: DFAgentDescription,
-                       handleBehaviour: HandleRegisterRequestBehaviour, domain: str):
+                       handleBehaviour: HandleRegisterRequestBehaviour, domain: str,
+                       leaseDuration: Optional[int] = None):
+        """
+        Registers for good when `leaseDuration` is None, otherwise the DF drops the registration once it isn't
+        renewed for `leaseDuration` seconds and the agent renews it in the background
+        """
         if dfd is None:
             raise TypeError
-        request: ACLMessage = DFService.__createRequestMessage(agent, RegisterService(dfd), domain)
+        request: ACLMessage = DFService.__createRequestMessage(agent, RegisterService(dfd, leaseDuration), domain)
         request.set_metadata("action", RegisterService.__key__)
+        registration: ACLMessage = request.copy_to(str(request.to))
         await DFService.__doFipaRequestClient(agent, request, handleBehaviour)
+        if leaseDuration is not None:
+            renewal: ACLMessage = DFService.__createRequestMessage(agent, RenewLease(dfd.agentName), domain)
+            renewalTemplate: Template = Template()
+            renewalTemplate.set_metadata("ontology", DFOntology.instance().name)
+            renewalTemplate.set_metadata("action", RenewLease.__key__)
+            agent.add_behaviour(LeaseRenewalBehaviour(registration, renewal, leaseDuration), renewalTemplate)
+
+    @staticmethod
+    async def subscribe(agent: BaseAgent, dfd: DFAgentDescription,
+                        handleBehaviour: HandleExpirationsBehaviour, domain: str):
+        if dfd is None:
+            raise TypeError
+        handleBehaviour.subscription = DFService.__createRequestMessage(agent, SubscribeExpirations(dfd), domain)
+        expirationTemplate: Template = Template()
+        expirationTemplate.set_metadata("ontology", DFOntology.instance().name)
+        expirationTemplate.set_metadata("action", RegistrationExpired.__key__)
+        agent.add_behaviour(handleBehaviour, expirationTemplate)
 
     @staticmethod
     async def search(agent: BaseAgent, dfd: DFAgentDescription,
-                     handleBehaviour: HandleSearchBehaviour, domain: str):
+                     handleBehaviour: HandleSearchBehaviour, domain: str,
+                     maxResults: Optional[int] = None):
+        """
+        Searches in pages of `maxResults` descriptions, all matches in one response when None. Paging pays off for
+        handlers which use the matches of a page in `handlePage`.
+        """
         if dfd is None:
             raise TypeError
-        request: ACLMessage = DFService.__createRequestMessage(agent, SearchServiceRequest(dfd), domain)
+        searchRequest: SearchServiceRequest = SearchServiceRequest(dfd, maxResults)
+        request: ACLMessage = DFService.__createRequestMessage(agent, searchRequest, domain)
         request.set_metadata("action", SearchServiceRequest.__key__)
+        handleBehaviour.searchRequest = searchRequest
         await DFService.__doFipaRequestClient(agent, request, handleBehaviour)
 
+    @staticmethod
+    async def searchResults(agent: BaseAgent, dfd: DFAgentDescription, domain: str,
+                            maxResults: Optional[int] = DEFAULT_SEARCH_PAGE_SIZE) -> AsyncIterator[DFAgentDescription]:
+        """
+        Yields the matching descriptions as their pages arrive, so the first ones can be used before the search is
+        over. Has to be iterated on the agent loop, e.g. from a behaviour.
+        """
+        handleBehaviour = SearchResultsBehaviour()
+        await DFService.search(agent, dfd, handleBehaviour, domain, maxResults)
+        try:
+            while True:
+                page: Optional[Sequence[DFAgentDescription]] = await handleBehaviour.pagesQueue.get()
+                if page is None:
+                    return
+                for description in page:
+                    yield description
+        finally:
+            handleBehaviour.kill()
+
     @staticmethod
     async def deregister(agent: BaseAgent, dfd: DFAgentDescription,
                          handleBehaviour: HandleDeregisterRequestBehaviour, domain: str):
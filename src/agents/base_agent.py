@@ -1,20 +1,47 @@
+import asyncio
+import logging
+import threading
 from asyncio import Lock
-from typing import Optional
+from typing import Optional, List
 
+from aiohttp import web
 from spade.agent import Agent
 
 from src.ontology.content_manager import ContentManager
 from src.ontology.ontology import Ontology
+from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
+from src.utils.acl_message import ACLMessage
+from src.utils.agent_logging import get_logger
+from src.utils.message_log import MessageRecorder
+from src.utils.message_router import MessageRouter
+from src.utils.metrics import MetricsRegistry, Stopwatch
+from src.utils.priority import MessagePriorities, Priority, PriorityLock
+from src.utils.tracing import current_span_context
+
+logger = logging.getLogger("spade.Agent")
 
 
 class BaseAgent(Agent):
+    """
+    When `message_priorities` is set, the mailboxes of its BaseCyclicBehaviours serve messages by priority class
+    instead of in arrival order, and `acquire_lock` hands a PriorityLock to the waiter of the best class.
+
+    An agent is ready to serve once started, unless it sets `reports_readiness` and calls `set_ready` itself, e.g.
+    after registering with the DF.
+    """
+    message_priorities: Optional[MessagePriorities] = None
+    reports_readiness: bool = False
+
     def __init__(self, jid: str, password: str, ontology: Ontology = None):
+        self._router = MessageRouter()
         super().__init__(jid, password)
         self._content_manager = ContentManager()
         self._ontology = ontology
         self._lock: Optional[Lock] = None
+        self._ready = threading.Event()
         if ontology is not None:
             self._content_manager.register_ontology(ontology)
+        self.web.add_get('/metrics', self.metrics_controller, template=None, raw=True)
 
     @property
     def content_manager(self) -> ContentManager:
@@ -24,13 +51,79 @@ class BaseAgent(Agent):
     def ontology(self):
         return self._ontology
 
-    def log(self, text: str):
-        print(f'{self.name}: {text}')
+    def set_ready(self):
+        self._ready.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks the calling thread, not the agent loop, until the agent is ready or `timeout` seconds passed
+        """
+        if not self.reports_readiness:
+            return self._alive.wait(timeout)
+        return self._ready.wait(timeout)
+
+    def _message_received(self, msg):
+        return self.dispatch(ACLMessage.from_node(msg))
+
+    def add_behaviour(self, behaviour, template=None):
+        if isinstance(behaviour, BaseCyclicBehaviour):
+            behaviour.trace_parent = current_span_context()
+        self._router.add(behaviour, template)
+        super().add_behaviour(behaviour, template)
 
-    async def acquire_lock(self):
+    def remove_behaviour(self, behaviour):
+        super().remove_behaviour(behaviour)
+        self._router.remove(behaviour)
+
+    def _match_behaviours(self, msg: ACLMessage) -> List:
+        return self._router.match(msg)
+
+    def dispatch(self, msg):
+        """
+        Delivers the message to the behaviours found in the routing index. Messages arriving on the agent loop are
+        put straight into the mailboxes, others are scheduled on it.
+        """
+        msg = ACLMessage.from_message(msg)
+        MetricsRegistry.instance().message_received(msg)
+        MessageRecorder.instance().message_received(str(self.jid), msg)
+        behaviours = self._match_behaviours(msg)
+        if not behaviours:
+            logger.warning(f"No behaviour matched for message: {msg}")
+            self.traces.append(msg)
+            return []
+        try:
+            in_loop = asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            in_loop = False
+        futures = []
+        for behaviour in behaviours:
+            if in_loop:
+                behaviour.queue.put_nowait(msg)
+            else:
+                futures.append(self.submit(behaviour.enqueue(msg)))
+            self.traces.append(msg, category=str(behaviour))
+        return futures
+
+    def log(self, text: str, level: int = logging.INFO, **fields):
+        get_logger().log(level, text, extra={'agent': self.name, 'fields': fields})
+
+    def priority_of(self, msg: ACLMessage) -> int:
+        if self.message_priorities is None:
+            return Priority.ALLOCATION
+        return self.message_priorities.of(msg)
+
+    async def acquire_lock(self, priority: int = Priority.ALLOCATION):
         if self._lock:
-            await self._lock.acquire()
+            stopwatch = Stopwatch()
+            if isinstance(self._lock, PriorityLock):
+                await self._lock.acquire(priority)
+            else:
+                await self._lock.acquire()
+            stopwatch.observe(MetricsRegistry.instance().lock_wait, type(self).__name__)
 
     def release_lock(self):
         if self._lock:
             self._lock.release()
+
+    async def metrics_controller(self, request):
+        return web.Response(text=MetricsRegistry.instance().render(), content_type='text/plain')
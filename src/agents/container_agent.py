@@ -1,12 +1,16 @@
+import logging
 import math
-from asyncio import Lock
 from datetime import datetime
 from typing import Sequence, List, NamedTuple, Optional
+from uuid import uuid4
 
 from spade.template import Template
 
-from src.agents.DFAgent import DFService, HandleSearchBehaviour
+from src.agents.DFAgent import DFService, HandleSearchBehaviour, HandleExpirationsBehaviour, DEFAULT_SEARCH_PAGE_SIZE
 from src.agents.base_agent import BaseAgent
+from src.agents.yard_state_agent import CandidateSlotsInitiator
+from src.allocation.stacking_policy import StackingPolicy, DepartureOrderPolicy
+from src.benchmark.recorder import BenchmarkRecorder
 from src.behaviours.contract_net_initiator import ContractNetInitiator
 from src.behaviours.request_initiator import RequestInitiator
 from src.behaviours.request_responder import RequestResponder
@@ -14,11 +18,11 @@ from src.ontology.directory_facilitator_ontology import DFAgentDescription, Serv
 from src.ontology.ontology import ContentElement
 from src.ontology.port_terminal_ontology import PortTerminalOntology, ContainerData, AllocationProposal, \
     AllocationConfirmation, AllocationProposalAcceptance, SelfDeallocationRequest, AllocationRequest, \
-    ReallocationRequest, DeallocationRequest
+    ReallocationRequest, DeallocationRequest, CandidateSlotsRequest
 from src.utils.acl_message import ACLMessage
 from src.utils.content_language import ContentLanguage
 from src.utils.performative import Performative
-from src.utils.test_environment import TestEnvironment
+from src.utils.priority import PORT_TERMINAL_PRIORITIES, Priority, PriorityLock, set_priority
 
 
 class SlotJid(NamedTuple):
@@ -27,62 +31,144 @@ class SlotJid(NamedTuple):
 
 
 class AllocationInitiator(ContractNetInitiator):
-    def __init__(self, slot_manager_agents_jids: Sequence[str], is_first_allocation: bool = True):
+    """
+    Without `slot_manager_agents_jids` the CFPs go to the slots the container agent knows when they are sent. The
+    slots skipped for the yard state candidates are asked in the same `run()` when every candidate refuses, so joining
+    the behaviour waits for the container to be placed.
+    """
+
+    def __init__(self, slot_manager_agents_jids: Optional[Sequence[str]], is_first_allocation: bool = True,
+                 container=None, conversation_id: Optional[str] = None,
+                 stacking_policy: Optional[StackingPolicy] = None, yard_state_jid: Optional[str] = None):
         super().__init__()
         self._slot_manager_agents_jids = slot_manager_agents_jids
         self._is_first_allocation = is_first_allocation
+        self._container = container
+        self._conversation_id = conversation_id
+        self._stacking_policy: StackingPolicy = stacking_policy if stacking_policy is not None \
+            else DepartureOrderPolicy()
+        self._yard_state_jid = yard_state_jid
+        self._skipped_jids: Sequence[str] = []
+        self._retry_skipped = False
+
+    @property
+    def container(self):
+        return self._container if self._container is not None else self.agent
+
+    @property
+    def slot_manager_agents_jids(self) -> Sequence[str]:
+        if self._slot_manager_agents_jids is not None:
+            return self._slot_manager_agents_jids
+        return self.container.available_slots_jids
+
+    async def run(self):
+        await super().run()
+        if self._retry_skipped and not self.is_killed():
+            await super().run()
 
     async def prepare_cfps(self) -> Sequence[ACLMessage]:
+        if self._retry_skipped:
+            self._retry_skipped = False
+            skipped_jids, self._skipped_jids = self._skipped_jids, []
+            self._reset()
+            return self._create_cfps(skipped_jids)
         if self._is_first_allocation:
-            await self.agent.acquire_lock()
-        cfps = [self._create_cfp(jid) for jid in self._slot_manager_agents_jids]
-        return cfps
+            await self.container.acquire_lock()
+            BenchmarkRecorder.instance().allocation_started(self.container.container_id)
+        return self._create_cfps(await self._select_slots())
 
     def handle_all_responses(self, responses: Sequence[ACLMessage], acceptances: List[ACLMessage],
                              rejections: List[ACLMessage]):
         proposals = [msg for msg in responses if msg.performative == Performative.PROPOSE]
+        if not proposals and self._skipped_jids:
+            self.agent.log('Candidate slots refused, asking the remaining ones', logging.DEBUG,
+                           container_id=self.container.container_id)
+            self._retry_skipped = True
+            return
         self._create_proposals_replies(proposals, acceptances, rejections)
 
     def handle_inform(self, response: ACLMessage):
         content: ContentElement = self.agent.content_manager.extract_content(response)
         if isinstance(content, AllocationConfirmation):
-            self.agent.log(f'Container successfully allocated in slot no {content.slot_id}')
-            self.agent.slot_id = content.slot_id
+            self.agent.log(f'Container {self.container.container_id} successfully allocated in slot no '
+                           f'{content.slot_id}', container_id=self.container.container_id, slot_id=content.slot_id)
+            self.container.slot_id = content.slot_id
             if self._is_first_allocation:
-                self.agent.release_lock()
+                self.container.release_lock()
             self.agent.log("Container moved")
-            #TestEnvironment.instance().increment_moves_counter()
+            BenchmarkRecorder.instance().record_move()
         else:
-            self.agent.log('Allocation failed')
-            self.agent.kill()
+            self._handle_allocation_failure()
 
     def handle_failure(self, response: ACLMessage):
-        self.agent.log('Allocation failed')
-        self.agent.kill()
+        self._handle_allocation_failure()
+
+    def handle_all_result_notifications(self, result_notifications: Sequence[ACLMessage]):
+        if self._retry_skipped:
+            return
+        if self._is_first_allocation:
+            BenchmarkRecorder.instance().allocation_finished(self.container.container_id, self.messages_count)
+        else:
+            BenchmarkRecorder.instance().reallocation_finished(self.messages_count)
+
+    async def _select_slots(self) -> Sequence[str]:
+        """
+        Slots the yard state agent advertises as having room, all of them when there's no such agent or it doesn't
+        know any. The other slots are asked only if every candidate refuses.
+        """
+        slot_manager_agents_jids = self.slot_manager_agents_jids
+        if self._yard_state_jid is None:
+            return slot_manager_agents_jids
+        conversation_id = f'{self.container.container_id}-{uuid4().hex}'
+        candidate_slots_mt = Template()
+        candidate_slots_mt.thread = conversation_id
+        candidate_slots_mt.set_metadata('protocol', 'Request')
+        candidate_slots_mt.set_metadata('action', CandidateSlotsRequest.__key__)
+        candidate_slots_behaviour = CandidateSlotsInitiator(self._yard_state_jid, self.container.departure_time,
+                                                            conversation_id)
+        self.agent.add_behaviour(candidate_slots_behaviour, candidate_slots_mt)
+        await candidate_slots_behaviour.join()
+        self._previous_messages_count += candidate_slots_behaviour.messages_count
+
+        candidates = set(candidate_slots_behaviour.candidates or [])
+        selected_jids = [jid for jid in slot_manager_agents_jids if jid in candidates]
+        if not selected_jids:
+            return slot_manager_agents_jids
+        self._skipped_jids = [jid for jid in slot_manager_agents_jids if jid not in candidates]
+        return selected_jids
+
+    def _handle_allocation_failure(self):
+        self.agent.log(f'Allocation of container {self.container.container_id} failed', logging.WARNING)
+        if self._container is None:
+            self.agent.kill()
+        elif self._is_first_allocation:
+            self.container.release_lock()
 
-    def _create_cfp(self, jid: str):
-        cfp: ACLMessage = ACLMessage(to=jid)
+    def _create_cfps(self, jids: Sequence[str]) -> List[ACLMessage]:
+        cfp: ACLMessage = ACLMessage()
+        cfp.thread = self._conversation_id
         cfp.performative = Performative.CFP
         cfp.ontology = self.agent.ontology.name
         cfp.protocol = 'ContractNet'
         cfp.action = AllocationRequest.__key__
-        container_data: ContentElement = ContainerData(self.agent.jid.localpart, self.agent.departure_time)
+        if not self._is_first_allocation:
+            set_priority(cfp, Priority.REALLOCATION)
+        container_data: ContentElement = ContainerData(self.container.container_id, self.container.departure_time)
         content: ContentElement = AllocationRequest(container_data)
-        self.agent.content_manager.fill_content(content, cfp)
-        return cfp
+        return self.agent.content_manager.fill_content_many(content, cfp, jids)
 
     def _create_proposals_replies(self, proposals: Sequence[ACLMessage], acceptances: List[ACLMessage],
                                   rejections: List[ACLMessage]):
         def fetch_allocation_eval(proposal: ACLMessage) -> float:
             content: ContentElement = self.agent.content_manager.extract_content(proposal)
             if isinstance(content, AllocationProposal):
-                return content.seconds_from_forced_reallocation_to_departure
+                return self._stacking_policy.rank_proposal(content)
             return math.inf
 
         best_proposal: ACLMessage = min(proposals, key=fetch_allocation_eval)
         acceptance = best_proposal.create_reply(Performative.ACCEPT_PROPOSAL)
         acceptance_content: ContentElement = AllocationProposalAcceptance(
-            ContainerData(self.agent.jid.localpart, str(self.agent.departure_time)))
+            ContainerData(self.container.container_id, str(self.container.departure_time)))
         self.agent.content_manager.fill_content(acceptance_content, acceptance)
         acceptances.append(acceptance)
         for msg in proposals:
@@ -91,35 +177,47 @@ class AllocationInitiator(ContractNetInitiator):
 
 
 class SelfDeallocationInitiator(RequestInitiator):
+    def __init__(self, container=None, slot_jid: Optional[str] = None, conversation_id: Optional[str] = None):
+        super().__init__()
+        self._container = container
+        self._slot_jid = slot_jid
+        self._conversation_id = conversation_id
+
+    @property
+    def container(self):
+        return self._container if self._container is not None else self.agent
 
     async def prepare_requests(self) -> Sequence[ACLMessage]:
-        if self.agent.slot_id is None:
+        if self.container.slot_id is None:
             raise Exception('Container is not allocated')
-        request = ACLMessage(to=self.agent.slot_jid)
+        request = ACLMessage(to=self._slot_jid if self._slot_jid is not None else self.agent.slot_jid)
+        request.thread = self._conversation_id
         request.protocol = 'Request'
         request.ontology = self.agent.ontology.name
         request.performative = Performative.REQUEST
-        self.agent.content_manager.fill_content(SelfDeallocationRequest(self.agent.jid.localpart), request)
+        self.agent.content_manager.fill_content(SelfDeallocationRequest(self.container.container_id), request)
         return [request]
 
     def handle_refuse(self, response: ACLMessage):
         self.agent.log('Deallocation refused')
 
     def handle_inform(self, response: ACLMessage):
-        self.agent.slot_id = None
-        self.agent.log(f'Deallocation succeeded. Delay: {str(datetime.now() - self.agent.departure_time)}')
+        self.container.slot_id = None
+        delay = datetime.now() - self.container.departure_time
+        self.agent.log(f'Deallocation succeeded. Delay: {str(delay)}', delay_seconds=delay.total_seconds())
         self.agent.log("Container moved")
-        #TestEnvironment.instance().increment_moves_counter()
+        BenchmarkRecorder.instance().record_move()
 
     def handle_failure(self, response: ACLMessage):
-        self.agent.log('Deallocation failed')
+        self.agent.log('Deallocation failed', logging.WARNING)
 
 
 class DeallocationResponder(RequestResponder):
     async def prepare_response(self, request: ACLMessage) -> ACLMessage:
         content: ContentElement = self.agent.content_manager.extract_content(request)
         if isinstance(content, DeallocationRequest):
-            await self.agent.acquire_lock()
+            BenchmarkRecorder.instance().deallocation_started(self.agent.jid.localpart)
+            await self.agent.acquire_lock(self.agent.priority_of(request))
             return request.create_reply(Performative.AGREE)
         return request.create_reply(Performative.NOT_UNDERSTOOD)
 
@@ -130,14 +228,20 @@ class DeallocationResponder(RequestResponder):
         self_deallocation_behaviour = SelfDeallocationInitiator()
         self.agent.add_behaviour(self_deallocation_behaviour)
 
-        await self_deallocation_behaviour.join()
+        try:
+            await self_deallocation_behaviour.join()
+        except Exception as e:
+            self.agent.log(f'Deallocation failed: {e}', logging.WARNING)
+            return request.create_reply(Performative.FAILURE)
+        finally:
+            self.agent.release_lock()
+            BenchmarkRecorder.instance().deallocation_finished(self.agent.jid.localpart)
 
         response = ACLMessage(to=str(request.sender))
         response.performative = Performative.INFORM
         response.action = DeallocationRequest.__key__
         response.protocol = 'Request'
         response.ontology = self.agent.ontology.name
-        self.agent.release_lock()
         return response
 
 
@@ -145,7 +249,7 @@ class ReallocationResponder(RequestResponder):
     async def prepare_response(self, request: ACLMessage) -> ACLMessage:
         content: ContentElement = self.agent.content_manager.extract_content(request)
         if isinstance(content, ReallocationRequest):
-            await self.agent.acquire_lock()
+            await self.agent.acquire_lock(self.agent.priority_of(request))
             return request.create_reply(Performative.AGREE)
         return request.create_reply(Performative.NOT_UNDERSTOOD)
 
@@ -155,10 +259,16 @@ class ReallocationResponder(RequestResponder):
             allocation_mt = Template()
             allocation_mt.set_metadata('protocol', 'ContractNet')
             allocation_mt.set_metadata('action', AllocationRequest.__key__)
-            allocation_behaviour = AllocationInitiator(self.agent.available_slots_jids, False)
+            allocation_behaviour = AllocationInitiator(self.agent.available_slots_jids, False,
+                                                       yard_state_jid=self.agent.yard_state_jid)
 
             self.agent.add_behaviour(allocation_behaviour, allocation_mt)
-            await allocation_behaviour.join()
+            try:
+                await allocation_behaviour.join()
+            except Exception as e:
+                self.agent.log(f'Reallocation failed: {e}', logging.WARNING)
+                self.agent.release_lock()
+                return request.create_reply(Performative.FAILURE)
 
         response = ACLMessage(to=str(request.sender))
         response.performative = Performative.INFORM
@@ -170,10 +280,25 @@ class ReallocationResponder(RequestResponder):
 
 
 class SearchSlotManagersHandlerBehaviour(HandleSearchBehaviour):
+    """
+    Starts the container behaviours once the first page of slot managers arrives, the allocation sends its CFPs to
+    the slot managers found until then
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._started = False
+
+    async def handlePage(self, page: Sequence[DFAgentDescription]):
+        self.agent.add_slot_managers([SlotJid(x.service.properties['slot_id'], x.agentName) for x in page])
+        if not self._started:
+            self._started = True
+            self._start_behaviours()
+
     async def handleResponse(self, result: Optional[Sequence[DFAgentDescription]]):
-        self.agent._slot_manager_agents_jids = [SlotJid(x.service.properties['slot_id'], x.agentName)
-                                                for x in result]
+        self.agent.log(f'Found slot managers')
 
+    def _start_behaviours(self):
         allocation_mt = Template()
         allocation_mt.set_metadata('protocol', 'ContractNet')
         allocation_mt.set_metadata('action', AllocationRequest.__key__)
@@ -186,21 +311,28 @@ class SearchSlotManagersHandlerBehaviour(HandleSearchBehaviour):
         deallocation_mt.set_metadata('protocol', 'Request')
         deallocation_mt.set_metadata('action', DeallocationRequest.__key__)
 
-        self.agent.log(f'Found slot managers')
         self.agent.add_behaviour(DeallocationResponder(), deallocation_mt)
-        self.agent.add_behaviour(AllocationInitiator(self.agent.available_slots_jids), allocation_mt)
+        self.agent.add_behaviour(AllocationInitiator(None, yard_state_jid=self.agent.yard_state_jid), allocation_mt)
         self.agent.add_behaviour(ReallocationResponder(), reallocation_mt)
 
     async def handleFailure(self, msg: ACLMessage):
         raise Exception('Can\'t find any slot managers')
 
 
+class SlotManagersExpirationsBehaviour(HandleExpirationsBehaviour):
+    async def handleExpired(self, description: DFAgentDescription):
+        self.agent.remove_slot_manager(description.agentName)
+
+
 class ContainerAgent(BaseAgent):
-    def __init__(self, jid: str, password: str, departure_time: datetime):
+    message_priorities = PORT_TERMINAL_PRIORITIES
+
+    def __init__(self, jid: str, password: str, departure_time: datetime, yard_state_jid: Optional[str] = None):
         super().__init__(jid, password, PortTerminalOntology.instance())
         self._slot_manager_agents_jids: Sequence[SlotJid] = []
         self._departure_time: datetime = departure_time
         self._slot_id = None
+        self._yard_state_jid = yard_state_jid
 
     async def setup(self):
         service_description: ServiceDescription = ServiceDescription({})
@@ -208,13 +340,31 @@ class ContainerAgent(BaseAgent):
                                                      ContentLanguage.XML, service_description)
 
         self.log(f'Container agent for {self.name} started.')
-        await DFService.search(self, dfd, SearchSlotManagersHandlerBehaviour(), self.jid.domain)
-        self._lock = Lock()
+        await DFService.search(self, dfd, SearchSlotManagersHandlerBehaviour(), self.jid.domain,
+                               DEFAULT_SEARCH_PAGE_SIZE)
+        await DFService.subscribe(self, dfd, SlotManagersExpirationsBehaviour(), self.jid.domain)
+        self._lock = PriorityLock()
+
+    def add_slot_managers(self, slot_manager_agents_jids: Sequence[SlotJid]):
+        self._slot_manager_agents_jids = [*self._slot_manager_agents_jids, *slot_manager_agents_jids]
+
+    def remove_slot_manager(self, jid: str):
+        self._slot_manager_agents_jids = [slot_jid for slot_jid in self._slot_manager_agents_jids
+                                          if slot_jid.jid != jid]
+        self.log(f'Slot manager {jid} stopped renewing its registration', logging.WARNING, slot_jid=jid)
+
+    @property
+    def container_id(self) -> str:
+        return self.jid.localpart
 
     @property
     def departure_time(self) -> datetime:
         return self._departure_time
 
+    @property
+    def yard_state_jid(self) -> Optional[str]:
+        return self._yard_state_jid
+
     @property
     def slot_id(self) -> str:
         return self._slot_id
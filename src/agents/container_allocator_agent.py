@@ -0,0 +1,293 @@
+import logging
+from asyncio import Lock
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
+
+from spade.behaviour import OneShotBehaviour
+from spade.template import Template
+
+from src.agents.DFAgent import DFService, HandleSearchBehaviour, HandleExpirationsBehaviour
+from src.agents.base_agent import BaseAgent
+from src.agents.container_agent import AllocationInitiator, SelfDeallocationInitiator, SlotJid
+from src.allocation.batch_assignment import SlotOffer, assign_batch
+from src.allocation.stacking_policy import StackingPolicy, DepartureOrderPolicy
+from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
+from src.behaviours.contract_net_initiator import ContractNetInitiator
+from src.ontology.directory_facilitator_ontology import DFAgentDescription, ServiceDescription
+from src.ontology.ontology import ContentElement
+from src.ontology.port_terminal_ontology import PortTerminalOntology, ReallocationRequest, DeallocationRequest, \
+    AllocationRequest, BatchAllocationRequest, BatchAllocationProposal, BatchAllocationAcceptance, \
+    BatchAllocationConfirmation, ContainerData
+from src.utils.acl_message import ACLMessage
+from src.utils.content_language import ContentLanguage
+from src.utils.jid_utils import jid_localpart
+from src.utils.performative import Performative
+
+
+class ContainerRecord:
+    __slots__ = ('container_id', 'departure_time', 'slot_id', '_lock')
+
+    def __init__(self, container_id: str, departure_time: datetime):
+        self.container_id: str = container_id
+        self.departure_time: datetime = departure_time
+        self.slot_id: Optional[str] = None
+        self._lock: Optional[Lock] = None
+
+    async def acquire_lock(self):
+        if self._lock is None:
+            self._lock = Lock()
+        await self._lock.acquire()
+
+    def release_lock(self):
+        if self._lock is not None:
+            self._lock.release()
+
+
+class RecordAllocationBehaviour(OneShotBehaviour):
+    def __init__(self, record: ContainerRecord):
+        super().__init__()
+        self._record = record
+
+    async def run(self):
+        await self.agent.run_allocation(self._record, True)
+
+
+class BatchAllocationInitiator(ContractNetInitiator):
+    def __init__(self, records: Sequence[ContainerRecord], slot_manager_agents_jids: Sequence[str],
+                 conversation_id: str):
+        super().__init__()
+        self._records: Dict[str, ContainerRecord] = {record.container_id: record for record in records}
+        self._slot_manager_agents_jids = slot_manager_agents_jids
+        self._conversation_id = conversation_id
+
+    async def prepare_cfps(self) -> Sequence[ACLMessage]:
+        for record in self._records.values():
+            await record.acquire_lock()
+        containers = [ContainerData(record.container_id, str(record.departure_time))
+                      for record in self._records.values()]
+        cfp: ACLMessage = ACLMessage(thread=self._conversation_id)
+        cfp.performative = Performative.CFP
+        cfp.ontology = self.agent.ontology.name
+        cfp.protocol = 'ContractNet'
+        return self.agent.content_manager.fill_content_many(BatchAllocationRequest(containers), cfp,
+                                                            self._slot_manager_agents_jids)
+
+    def handle_all_responses(self, responses: Sequence[ACLMessage], acceptances: List[ACLMessage],
+                             rejections: List[ACLMessage]):
+        proposals: Dict[str, ACLMessage] = {}
+        offers: List[SlotOffer] = []
+        for msg in responses:
+            if msg.performative != Performative.PROPOSE:
+                continue
+            content: ContentElement = self.agent.content_manager.extract_content(msg)
+            if isinstance(content, BatchAllocationProposal):
+                proposals[content.slot_id] = msg
+                stack = [datetime.fromisoformat(departure_time) for departure_time in content.departure_times]
+                offers.append(SlotOffer(content.slot_id, content.free_height, stack, {
+                    proposal.container_id: proposal.seconds_from_forced_reallocation_to_departure
+                    for proposal in content.proposals
+                }))
+        containers = [ContainerData(record.container_id, str(record.departure_time))
+                      for record in self._records.values()]
+        assignment = assign_batch(containers, offers, self.agent.stacking_policy)
+        for slot_id, msg in proposals.items():
+            if slot_id in assignment:
+                acceptance = msg.create_reply(Performative.ACCEPT_PROPOSAL)
+                self.agent.content_manager.fill_content(BatchAllocationAcceptance(assignment[slot_id]), acceptance)
+                acceptances.append(acceptance)
+            else:
+                rejections.append(msg.create_reply(Performative.REJECT_PROPOSAL))
+
+    def handle_inform(self, response: ACLMessage):
+        content: ContentElement = self.agent.content_manager.extract_content(response)
+        if isinstance(content, BatchAllocationConfirmation):
+            for container_id in content.containers_ids:
+                self._records[container_id].slot_id = content.slot_id
+            self.agent.log(f'{len(content.containers_ids)} containers allocated in slot no {content.slot_id}')
+
+    def handle_all_result_notifications(self, result_notifications: Sequence[ACLMessage]):
+        unallocated = [record for record in self._records.values() if record.slot_id is None]
+        for record in self._records.values():
+            record.release_lock()
+        if len(unallocated) > 0:
+            self.agent.log(f'{len(unallocated)} containers left out of the batch, allocating them one by one')
+        for record in unallocated:
+            self.agent.add_behaviour(RecordAllocationBehaviour(record))
+
+
+class RecordBatchAllocationBehaviour(OneShotBehaviour):
+    def __init__(self, records: Sequence[ContainerRecord]):
+        super().__init__()
+        self._records = records
+
+    async def run(self):
+        await self.agent.run_batch_allocation(self._records)
+
+
+class RecordRequestHandler(OneShotBehaviour):
+    def __init__(self, record: ContainerRecord, request: ACLMessage, content: ContentElement):
+        super().__init__()
+        self._record = record
+        self._request = request
+        self._content = content
+
+    async def run(self):
+        await self._record.acquire_lock()
+        performative = Performative.INFORM
+        try:
+            if isinstance(self._content, ReallocationRequest):
+                if self._content.slot_id == self._record.slot_id:
+                    await self.agent.run_allocation(self._record, False)
+            elif isinstance(self._content, DeallocationRequest):
+                await self.agent.run_self_deallocation(self._record)
+        except Exception as e:
+            self.agent.log(f'Request for container {self._record.container_id} failed: {e}', logging.WARNING)
+            performative = Performative.FAILURE
+        finally:
+            self._record.release_lock()
+        response = ACLMessage(to=str(self._request.sender), thread=self._request.thread)
+        response.performative = performative
+        response.action = self._content.__key__
+        response.protocol = 'Request'
+        response.ontology = self.agent.ontology.name
+        await self.send(response)
+
+
+class RecordRequestsResponder(BaseCyclicBehaviour):
+    async def run(self):
+        request: Optional[ACLMessage] = await self.wait_for_message()
+        if request is None:
+            return
+        content: ContentElement = self.agent.content_manager.extract_content(request)
+        record: Optional[ContainerRecord] = None
+        if isinstance(content, ReallocationRequest) and content.container_id is not None:
+            record = self.agent.get_record(content.container_id)
+        elif isinstance(content, DeallocationRequest):
+            record = self.agent.get_record(jid_localpart(content.container_id))
+        if record is None:
+            await self.send(request.create_reply(Performative.REFUSE))
+            return
+        await self.send(request.create_reply(Performative.AGREE))
+        self.agent.add_behaviour(RecordRequestHandler(record, request, content))
+
+
+class SearchSlotManagersForRecordsBehaviour(HandleSearchBehaviour):
+    async def handleResponse(self, result: Optional[Sequence[DFAgentDescription]]):
+        self.agent.set_slot_managers([SlotJid(x.service.properties['slot_id'], x.agentName) for x in result])
+
+    async def handleFailure(self, msg: ACLMessage):
+        raise Exception('Can\'t find any slot managers')
+
+
+class SlotManagersExpirationsBehaviour(HandleExpirationsBehaviour):
+    async def handleExpired(self, description: DFAgentDescription):
+        self.agent.remove_slot_manager(description.agentName)
+
+
+class ContainerAllocatorAgent(BaseAgent):
+    """
+    Negotiates placement of many containers kept as compact records instead of one ContainerAgent each
+    """
+
+    def __init__(self, jid: str, password: str, stacking_policy: Optional[StackingPolicy] = None,
+                 yard_state_jid: Optional[str] = None):
+        super().__init__(jid, password, PortTerminalOntology.instance())
+        self._stacking_policy: StackingPolicy = stacking_policy if stacking_policy is not None \
+            else DepartureOrderPolicy()
+        self._yard_state_jid = yard_state_jid
+        self._records: Dict[str, ContainerRecord] = {}
+        self._pending_batches: List[Sequence[ContainerRecord]] = []
+        self._slot_manager_agents_jids: Sequence[SlotJid] = []
+
+    async def setup(self):
+        for action in [ReallocationRequest.__key__, DeallocationRequest.__key__]:
+            request_mt = Template()
+            request_mt.set_metadata('protocol', 'Request')
+            request_mt.set_metadata('action', action)
+            self.add_behaviour(RecordRequestsResponder(), request_mt)
+
+        service_description: ServiceDescription = ServiceDescription({})
+        dfd: DFAgentDescription = DFAgentDescription('', '', 'port_terminal_ontology',
+                                                     ContentLanguage.XML, service_description)
+        await DFService.search(self, dfd, SearchSlotManagersForRecordsBehaviour(), self.jid.domain)
+        await DFService.subscribe(self, dfd, SlotManagersExpirationsBehaviour(), self.jid.domain)
+        self.log('Container allocator agent started')
+
+    def allocate(self, container_jid: str, departure_time: datetime):
+        return self.submit(self._add_records([ContainerRecord(jid_localpart(container_jid), departure_time)]))
+
+    def allocate_batch(self, containers: Sequence[Tuple[str, datetime]]):
+        return self.submit(self._add_records([ContainerRecord(jid_localpart(container_jid), departure_time)
+                                              for container_jid, departure_time in containers]))
+
+    async def _add_records(self, records: Sequence[ContainerRecord]):
+        for record in records:
+            self._records[record.container_id] = record
+        if len(self._slot_manager_agents_jids) == 0:
+            self._pending_batches.append(records)
+        else:
+            self._start_allocation(records)
+
+    def _start_allocation(self, records: Sequence[ContainerRecord]):
+        if len(records) == 1:
+            self.add_behaviour(RecordAllocationBehaviour(records[0]))
+        else:
+            self.add_behaviour(RecordBatchAllocationBehaviour(records))
+
+    def set_slot_managers(self, slot_manager_agents_jids: Sequence[SlotJid]):
+        self._slot_manager_agents_jids = slot_manager_agents_jids
+        self.log('Found slot managers')
+        for records in self._pending_batches:
+            self._start_allocation(records)
+        self._pending_batches = []
+
+    def remove_slot_manager(self, jid: str):
+        self._slot_manager_agents_jids = [slot_jid for slot_jid in self._slot_manager_agents_jids
+                                          if slot_jid.jid != jid]
+        self.log(f'Slot manager {jid} stopped renewing its registration', logging.WARNING, slot_jid=jid)
+
+    @property
+    def stacking_policy(self) -> StackingPolicy:
+        return self._stacking_policy
+
+    def get_record(self, container_id: str) -> Optional[ContainerRecord]:
+        return self._records.get(container_id)
+
+    def available_slots_jids(self, record: ContainerRecord) -> Sequence[str]:
+        return [slot_jid.jid for slot_jid in self._slot_manager_agents_jids if slot_jid.slot_id != record.slot_id]
+
+    def slot_jid(self, record: ContainerRecord) -> str:
+        return next(slot_jid.jid for slot_jid in self._slot_manager_agents_jids if slot_jid.slot_id == record.slot_id)
+
+    async def run_allocation(self, record: ContainerRecord, is_first_allocation: bool):
+        conversation_id = f'{record.container_id}-{uuid4().hex}'
+        allocation_mt = Template()
+        allocation_mt.thread = conversation_id
+        allocation_mt.set_metadata('protocol', 'ContractNet')
+        allocation_mt.set_metadata('action', AllocationRequest.__key__)
+        allocation_behaviour = AllocationInitiator(self.available_slots_jids(record), is_first_allocation,
+                                                   record, conversation_id, self._stacking_policy,
+                                                   self._yard_state_jid)
+        self.add_behaviour(allocation_behaviour, allocation_mt)
+        await allocation_behaviour.join()
+
+    async def run_batch_allocation(self, records: Sequence[ContainerRecord]):
+        conversation_id = f'batch-{uuid4().hex}'
+        batch_allocation_mt = Template()
+        batch_allocation_mt.thread = conversation_id
+        batch_allocation_mt.set_metadata('protocol', 'ContractNet')
+        batch_allocation_mt.set_metadata('action', BatchAllocationRequest.__key__)
+        batch_allocation_behaviour = BatchAllocationInitiator(
+            records, [slot_jid.jid for slot_jid in self._slot_manager_agents_jids], conversation_id)
+        self.add_behaviour(batch_allocation_behaviour, batch_allocation_mt)
+        await batch_allocation_behaviour.join()
+
+    async def run_self_deallocation(self, record: ContainerRecord):
+        conversation_id = f'{record.container_id}-{uuid4().hex}'
+        self_deallocation_mt = Template()
+        self_deallocation_mt.thread = conversation_id
+        self_deallocation_behaviour = SelfDeallocationInitiator(record, self.slot_jid(record), conversation_id)
+        self.add_behaviour(self_deallocation_behaviour, self_deallocation_mt)
+        await self_deallocation_behaviour.join()
+        del self._records[record.container_id]
@@ -0,0 +1,123 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from spade.behaviour import PeriodicBehaviour
+from spade.template import Template
+
+from src.agents.base_agent import BaseAgent
+from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
+from src.ontology.ontology import ContentElement
+from src.ontology.port_terminal_ontology import PortTerminalOntology, MoveReport
+from src.utils.acl_message import ACLMessage
+from src.utils.performative import Performative
+
+DEFAULT_REPORT_PERIOD = 1.0
+DEFAULT_MOVE_ACCOUNTING_PORT = 7002
+
+
+@dataclass
+class MoveCounts:
+    """
+    Crane moves of a slot: a placement puts a container on the slot (arrival or reshuffle), a reshuffle takes a
+    blocking container off to place it elsewhere and a departure hands a container over to its truck
+    """
+    placements: int = 0
+    reshuffles: int = 0
+    departures: int = 0
+
+    @property
+    def moves(self) -> int:
+        return self.placements + self.departures
+
+    @property
+    def allocations(self) -> int:
+        return self.placements - self.reshuffles
+
+    def add(self, report: MoveReport):
+        self.placements += report.placements
+        self.reshuffles += report.reshuffles
+        self.departures += report.departures
+
+    def __bool__(self):
+        return self.placements > 0 or self.reshuffles > 0 or self.departures > 0
+
+
+class MoveReportBehaviour(PeriodicBehaviour):
+    """
+    Sends the moves an agent counted since the previous report. The agent provides `slot_id` and
+    `take_unreported_moves()`.
+    """
+
+    def __init__(self, move_accounting_jid: str, period: float = DEFAULT_REPORT_PERIOD):
+        super().__init__(period)
+        self._move_accounting_jid = move_accounting_jid
+
+    async def run(self):
+        counts: MoveCounts = self.agent.take_unreported_moves()
+        if not counts:
+            return
+        report = ACLMessage(to=self._move_accounting_jid)
+        report.performative = Performative.INFORM
+        report.ontology = self.agent.ontology.name
+        report.action = MoveReport.__key__
+        self.agent.content_manager.fill_content(
+            MoveReport(self.agent.slot_id, counts.placements, counts.reshuffles, counts.departures), report)
+        await self.send(report)
+
+
+class MoveReportsResponder(BaseCyclicBehaviour):
+    async def run(self):
+        msg: Optional[ACLMessage] = await self.wait_for_message()
+        if msg is None:
+            return
+        content: ContentElement = self.agent.content_manager.extract_content(msg)
+        if isinstance(content, MoveReport):
+            self.agent.add_report(content)
+
+
+class MoveAccountingAgent(BaseAgent):
+    """
+    Aggregates the move reports of slot managers, which may run in other processes, and compares the running total
+    with the moves of the naive method, served at /moves
+    """
+
+    def __init__(self, jid: str, password: str, naive_moves: Optional[int] = None,
+                 port: int = DEFAULT_MOVE_ACCOUNTING_PORT):
+        super().__init__(jid, password, PortTerminalOntology.instance())
+        self._naive_moves = naive_moves
+        self._port = port
+        self._slots_moves: Dict[str, MoveCounts] = {}
+        self._total = MoveCounts()
+
+    async def setup(self):
+        move_report_mt = Template()
+        move_report_mt.set_metadata('action', MoveReport.__key__)
+        self.add_behaviour(MoveReportsResponder(), move_report_mt)
+        self.web.add_get('/moves', self.moves_controller, template=None)
+        self.web.start(port=self._port)
+        self.log(f'Move accounting agent started on port {self._port}')
+
+    @property
+    def total(self) -> MoveCounts:
+        return self._total
+
+    @property
+    def slots_moves(self) -> Dict[str, MoveCounts]:
+        return self._slots_moves
+
+    def add_report(self, report: MoveReport):
+        self._slots_moves.setdefault(report.slot_id, MoveCounts()).add(report)
+        self._total.add(report)
+        self.log(f'Moves: {self._total.moves} (naive method: {self._naive_moves})', moves=self._total.moves,
+                 naive_moves=self._naive_moves, allocations=self._total.allocations,
+                 reshuffles=self._total.reshuffles, departures=self._total.departures)
+
+    async def moves_controller(self, request):
+        return {
+            'moves': self._total.moves,
+            'naive_moves': self._naive_moves,
+            'allocations': self._total.allocations,
+            'reshuffles': self._total.reshuffles,
+            'departures': self._total.departures,
+            'slots': {slot_id: vars(counts) for slot_id, counts in self._slots_moves.items()}
+        }
@@ -1,13 +1,17 @@
-from typing import Sequence
+from typing import Dict, List, Sequence, Optional
 
 from spade.template import Template
 
 from src.agents.base_agent import BaseAgent
+from src.agents.yard_dashboard_agent import SlotStateChangesResponder
+from src.allocation.retrieval import count_reshuffles, next_retrieval, plan_retrieval
 from src.behaviours.request_initiator import RequestInitiator
 from src.behaviours.request_responder import RequestResponder
 from src.ontology.ontology import ContentElement
-from src.ontology.port_terminal_ontology import ContainersDeallocationRequest, DeallocationRequest, PortTerminalOntology
+from src.ontology.port_terminal_ontology import ContainersDeallocationRequest, DeallocationRequest, \
+    PortTerminalOntology, SlotStateChange
 from src.utils.acl_message import ACLMessage
+from src.utils.jid_utils import jid_localpart, jid_to_str
 from src.utils.performative import Performative
 
 
@@ -17,7 +21,7 @@ class DeallocationInitiator(RequestInitiator):
         self._container_jid = container_jid
 
     async def prepare_requests(self) -> Sequence[ACLMessage]:
-        request = ACLMessage(to=self._container_jid)
+        request = ACLMessage(to=self.agent.container_allocator_jid or self._container_jid)
         request.performative = Performative.REQUEST
         request.protocol = 'Request'
         request.ontology = self.agent.ontology.name
@@ -27,6 +31,12 @@ class DeallocationInitiator(RequestInitiator):
 
 
 class ContainersDeallocationResponder(RequestResponder):
+    """
+    Retrieves the truck's containers one at a time, always the one with the fewest containers above it in the
+    current yard view, so a container is not reshuffled to dig out another one of the same truck. Reports the
+    reshuffles saved against retrieving them in the requested order.
+    """
+
     async def prepare_response(self, request: ACLMessage) -> ACLMessage:
         content: ContentElement = self.agent.content_manager.extract_content(request)
         if isinstance(content, ContainersDeallocationRequest):
@@ -40,12 +50,22 @@ class ContainersDeallocationResponder(RequestResponder):
         deallocation_mt.set_metadata('protocol', 'Request')
         deallocation_mt.set_metadata('action', DeallocationRequest.__key__)
 
-        for container_jid in content.containers_jids:
-            deallocation_behaviour = DeallocationInitiator(container_jid)
+        containers_jids = {jid_localpart(container_jid): container_jid for container_jid in content.containers_jids}
+        requested_order = list(containers_jids)
+        stacks = self.agent.stacks
+        moves_saved = count_reshuffles(requested_order, stacks) - \
+            count_reshuffles(plan_retrieval(requested_order, stacks), stacks)
+
+        remaining = requested_order
+        while remaining:
+            container_id = next_retrieval(remaining, self.agent.stacks)
+            remaining.remove(container_id)
+            deallocation_behaviour = DeallocationInitiator(containers_jids[container_id])
             self.agent.add_behaviour(deallocation_behaviour, deallocation_mt)
             await deallocation_behaviour.join()
 
-        self.agent.log('Containers deallocated by Port Manager')
+        self.agent.log('Containers deallocated by Port Manager', truck=jid_to_str(request.sender),
+                       containers=len(containers_jids), moves_saved=moves_saved)
         response = ACLMessage(to=str(request.sender))
         response.performative = Performative.INFORM
         response.protocol = 'Request'
@@ -55,11 +75,40 @@ class ContainersDeallocationResponder(RequestResponder):
 
 
 class PortManagerAgent(BaseAgent):
-    def __init__(self, jid: str, password: str):
+    """
+    Serves the trucks. Slot managers given its jid report their state changes, which make up the yard view used to
+    plan the retrievals.
+    """
+
+    def __init__(self, jid: str, password: str, container_allocator_jid: Optional[str] = None):
         super().__init__(jid, password, PortTerminalOntology.instance())
+        self._container_allocator_jid = container_allocator_jid
+        self._stacks: Dict[str, List[str]] = {}
+        self._versions: Dict[str, int] = {}
 
     async def setup(self):
         containers_deallocation_mt = Template()
         containers_deallocation_mt.set_metadata('protocol', 'Request')
         containers_deallocation_mt.set_metadata('action', ContainersDeallocationRequest.__key__)
+        slot_state_change_mt = Template()
+        slot_state_change_mt.set_metadata('action', SlotStateChange.__key__)
         self.add_behaviour(ContainersDeallocationResponder(), containers_deallocation_mt)
+        self.add_behaviour(SlotStateChangesResponder(), slot_state_change_mt)
+
+    def apply_change(self, change: SlotStateChange):
+        slot_id = str(change.slot_id)
+        if change.version <= self._versions.get(slot_id, 0):
+            return
+        self._versions[slot_id] = change.version
+        self._stacks[slot_id] = [container_id for container_id in change.containers if container_id is not None]
+
+    @property
+    def stacks(self) -> Dict[str, List[str]]:
+        """
+        Container ids of every slot from bottom to top, as last reported
+        """
+        return {slot_id: list(stack) for slot_id, stack in self._stacks.items()}
+
+    @property
+    def container_allocator_jid(self) -> Optional[str]:
+        return self._container_allocator_jid
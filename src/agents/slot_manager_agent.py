@@ -1,25 +1,37 @@
-from asyncio import Lock
+import asyncio
+import json
+import logging
+import time
 from datetime import datetime
-from typing import List, NamedTuple, Sequence
+from typing import List, NamedTuple, Sequence, Optional, Set
+from uuid import uuid4
 
 import aiohttp
 from aiohttp import web
+from spade.behaviour import PeriodicBehaviour
 from spade.template import Template
 
-from src.agents.DFAgent import DFService, HandleRegisterRequestBehaviour
+from src.agents.DFAgent import DFService, HandleRegisterRequestBehaviour, DEFAULT_LEASE_DURATION
 from src.agents.base_agent import BaseAgent
+from src.agents.move_accounting_agent import MoveCounts, MoveReportBehaviour
+from src.agents.yard_dashboard_agent import SlotStatePublisher
+from src.agents.yard_state_agent import CapacityAdvertisementBehaviour, CandidateSlotsInitiator
+from src.allocation.remarshalling import RemarshallingSettings, plan_remarshalling
+from src.allocation.stacking_policy import StackingPolicy, DepartureOrderPolicy
 from src.behaviours.contract_net_responder import ContractNetResponder
 from src.behaviours.request_initiator import RequestInitiator
 from src.behaviours.request_responder import RequestResponder
 from src.ontology.directory_facilitator_ontology import DFAgentDescription, ServiceDescription
 from src.ontology.port_terminal_ontology import AllocationProposal, \
     PortTerminalOntology, AllocationProposalAcceptance, AllocationConfirmation, SelfDeallocationRequest, \
-    AllocationRequest, ReallocationRequest
+    AllocationRequest, ReallocationRequest, BatchAllocationRequest, BatchAllocationProposal, ContainerProposal, \
+    BatchAllocationAcceptance, BatchAllocationConfirmation, SlotStateChange, SlotCapacity, CandidateSlotsRequest
 from src.utils.acl_message import ACLMessage
 from src.utils.content_language import ContentLanguage
 from src.utils.interaction_protocol import InteractionProtocol
 from src.utils.jid_utils import jid_to_str
 from src.utils.performative import Performative
+from src.utils.priority import PORT_TERMINAL_PRIORITIES, Priority, PriorityLock
 
 
 class SlotItem(NamedTuple):
@@ -31,7 +43,7 @@ class SlotItem(NamedTuple):
 class AllocationResponder(ContractNetResponder):
 
     async def handle_cfp(self, cfp: ACLMessage) -> ACLMessage:
-        await self.agent.acquire_lock()
+        await self.agent.acquire_lock(self.agent.priority_of(cfp))
         if self.agent.is_full:
             self.agent.release_lock()
             return cfp.create_reply(Performative.REFUSE)
@@ -41,8 +53,7 @@ class AllocationResponder(ContractNetResponder):
                 self.agent.release_lock()
                 return cfp.create_reply(Performative.REFUSE)
             try:
-                td: float = self.agent.get_timedelta_from_forced_reallocation_to_departure(
-                    content.container_data.departure_time)
+                td: float = self.agent.score_placement(content.container_data.departure_time)
                 response: ACLMessage = cfp.create_reply(Performative.PROPOSE)
                 allocation_proposal = AllocationProposal(self.agent.slot_id, int(td))
                 self.agent.content_manager.fill_content(allocation_proposal, response)
@@ -54,7 +65,7 @@ class AllocationResponder(ContractNetResponder):
         return cfp.create_reply(Performative.NOT_UNDERSTOOD)
 
     async def handle_accept_proposal(self, accept: ACLMessage) -> ACLMessage:
-        await self.agent.acquire_lock()
+        await self.agent.acquire_lock(self.agent.priority_of(accept))
         if self.agent.is_full:
             self.agent.release_lock()
             return accept.create_reply(Performative.FAILURE)
@@ -79,13 +90,68 @@ class AllocationResponder(ContractNetResponder):
         pass
 
 
+class BatchAllocationResponder(ContractNetResponder):
+
+    async def handle_cfp(self, cfp: ACLMessage) -> ACLMessage:
+        await self.agent.acquire_lock(self.agent.priority_of(cfp))
+        if self.agent.is_full:
+            self.agent.release_lock()
+            return cfp.create_reply(Performative.REFUSE)
+        content = self.agent.content_manager.extract_content(cfp)
+        if isinstance(content, BatchAllocationRequest):
+            try:
+                proposals = [
+                    ContainerProposal(container_data.id, int(self.agent.score_placement(container_data.departure_time)))
+                    for container_data in content.containers if not self.agent.has_container(container_data.id)
+                ]
+                response: ACLMessage = cfp.create_reply(Performative.PROPOSE)
+                batch_allocation_proposal = BatchAllocationProposal(
+                    self.agent.slot_id,
+                    self.agent.free_height,
+                    [departure_time.isoformat() for departure_time in self.agent.departure_times],
+                    proposals
+                )
+                self.agent.content_manager.fill_content(batch_allocation_proposal, response)
+                self.agent.release_lock()
+                return response
+            except ValueError:
+                pass
+        self.agent.release_lock()
+        return cfp.create_reply(Performative.NOT_UNDERSTOOD)
+
+    async def handle_accept_proposal(self, accept: ACLMessage) -> ACLMessage:
+        await self.agent.acquire_lock(self.agent.priority_of(accept))
+        content = self.agent.content_manager.extract_content(accept)
+        if isinstance(content, BatchAllocationAcceptance):
+            try:
+                allocated_ids: List[str] = []
+                for container_data in content.containers:
+                    if self.agent.is_full:
+                        break
+                    await self.agent.add_container(container_data.id, container_data.departure_time,
+                                                   str(accept.sender))
+                    allocated_ids.append(container_data.id)
+                self.agent.release_lock()
+                response = accept.create_reply(Performative.INFORM)
+                self.agent.content_manager.fill_content(
+                    BatchAllocationConfirmation(self.agent.slot_id, allocated_ids), response)
+                return response
+            except ValueError:
+                pass
+        self.agent.release_lock()
+        return accept.create_reply(Performative.NOT_UNDERSTOOD)
+
+    async def handle_reject_proposal(self, reject: ACLMessage):
+        pass
+
+
 class SelfDeallocationResponder(RequestResponder):
 
     async def prepare_response(self, request: ACLMessage) -> ACLMessage:
         content = self.agent.content_manager.extract_content(request)
         if isinstance(content, SelfDeallocationRequest):
-            await self.agent.acquire_lock()
-            if self.agent.has_container(content.container_id):
+            await self.agent.acquire_lock(self.agent.priority_of(request))
+            if self.agent.has_container(content.container_id) or self.agent.is_in_transit(content.container_id):
                 return request.create_reply(Performative.AGREE)
             else:
                 self.agent.release_lock()
@@ -94,15 +160,20 @@ class SelfDeallocationResponder(RequestResponder):
 
     async def prepare_result_notification(self, request: ACLMessage) -> ACLMessage:
         content: SelfDeallocationRequest = self.agent.content_manager.extract_content(request)
-        blocking_containers = self.agent.get_blocking_containers(content.container_id)
-        for container_id, _, container_agent_jid in blocking_containers:
-            await self.agent.remove_container(container_id)
-            await self._reallocate_container(container_agent_jid)
+        if self.agent.end_transit(content.container_id):
+            self.agent.log(f'Container {content.container_id} left during its relocation',
+                           container_id=content.container_id)
+        else:
+            blocking_containers = self.agent.get_blocking_containers(content.container_id)
+            for container_id, _, container_agent_jid in blocking_containers:
+                await self.agent.remove_container(container_id, reshuffle=True)
+                await self.agent.reallocate_container(container_agent_jid, container_id)
         await self.agent.remove_container(content.container_id)
         self.agent.release_lock()
         response = ACLMessage(
             to=str(request.sender),
-            sender=str(self.agent.jid)
+            sender=str(self.agent.jid),
+            thread=request.thread
         )
         response.protocol = 'Request'
         response.ontology = self.agent.ontology.name
@@ -110,27 +181,59 @@ class SelfDeallocationResponder(RequestResponder):
         response.action = SelfDeallocationRequest.__key__
         return response
 
-    async def _reallocate_container(self, container_jid: str):
-        reallocate_behaviour = ReallocationInitiator(container_jid)
-        reallocation_mt = Template()
-        reallocation_mt.set_metadata('protocol', 'Request')
-        reallocation_mt.set_metadata('action', ReallocationRequest.__key__)
 
-        self.agent.add_behaviour(reallocate_behaviour, reallocation_mt)
-        await reallocate_behaviour.join()
+class RemarshallingBehaviour(PeriodicBehaviour):
+    """
+    Relocates the containers blocking a departure due soon while the slot is idle, so the truck doesn't wait for them.
+    The containers are taken off under the slot lock, which is released before they are placed elsewhere, so slots
+    remarshalling at the same time don't wait for each other. Until placed they stay in transit: a container asked to
+    leave meanwhile departs from there and its relocation is dropped. Only as many are taken off as other slots
+    advertise room for to the yard state agent, keeping `min_free_slots` of them free; without a yard state agent the
+    slot isn't remarshalled.
+    """
+
+    def __init__(self, settings: RemarshallingSettings):
+        super().__init__(settings.period)
+        self._settings = settings
+        self._relocations = 0
+
+    async def run(self):
+        budget = self._settings.relocations_per_run
+        if self._settings.max_relocations is not None:
+            budget = min(budget, self._settings.max_relocations - self._relocations)
+        if budget <= 0 or not self.agent.is_idle(self._settings.idle_time):
+            return
+        budget = min(budget, await self.agent.count_other_slots_with_room() - self._settings.min_free_slots)
+        if budget <= 0:
+            return
+        await self.agent.acquire_lock(Priority.BACKGROUND)
+        count = plan_remarshalling(self.agent.departure_times, datetime.now(), self._settings.horizon, budget)
+        blocking_containers = self.agent.take_top_containers(count)
+        for container_id, _, _ in blocking_containers:
+            await self.agent.remove_container(container_id, reshuffle=True)
+            self.agent.start_transit(container_id)
+        self.agent.release_lock()
+        for container_id, _, container_agent_jid in blocking_containers:
+            if not self.agent.is_in_transit(container_id):
+                continue
+            self.agent.log(f'Remarshalling container {container_id}', container_id=container_id)
+            await self.agent.reallocate_container(container_agent_jid, container_id)
+            self.agent.end_transit(container_id)
+        self._relocations += len(blocking_containers)
 
 
 class ReallocationInitiator(RequestInitiator):
-    def __init__(self, container_jid: str):
+    def __init__(self, container_jid: str, container_id: str):
         super().__init__()
         self._container_jid = container_jid
+        self._container_id = container_id
 
     async def prepare_requests(self) -> Sequence[ACLMessage]:
         request = ACLMessage(to=self._container_jid)
         request.performative = Performative.REQUEST
         request.protocol = 'Request'
         request.ontology = self.agent.ontology.name
-        self.agent.content_manager.fill_content(ReallocationRequest(self.agent.slot_id), request)
+        self.agent.content_manager.fill_content(ReallocationRequest(self.agent.slot_id, self._container_id), request)
         return [request]
 
     def handle_refuse(self, response: ACLMessage):
@@ -145,37 +248,68 @@ class HandleRegistrationBehaviour(HandleRegisterRequestBehaviour):
         super(HandleRegistrationBehaviour, self).__init__()
 
     async def handleFailure(self, result: ACLMessage):
-        self.agent.log('Registration problem')
+        self.agent.log('Registration problem', logging.ERROR)
         raise Exception('Registration problem')
 
     async def handleAccept(self, result: ACLMessage):
         self.agent.log('Registered')
+        self.agent.set_ready()
 
 
 class SlotManagerAgent(BaseAgent):
-    def __init__(self, jid: str, password: str, slot_id: str, max_height: int):
+    message_priorities = PORT_TERMINAL_PRIORITIES
+    reports_readiness = True
+
+    def __init__(self, jid: str, password: str, slot_id: str, max_height: int,
+                 stacking_policy: Optional[StackingPolicy] = None, move_accounting_jid: Optional[str] = None,
+                 dashboard_jid: Optional[str] = None, yard_state_jid: Optional[str] = None,
+                 remarshalling: Optional[RemarshallingSettings] = None, port_manager_jid: Optional[str] = None):
         super().__init__(jid, password, PortTerminalOntology.instance())
         self._slot_id: str = slot_id
         self._max_height: int = max_height
+        self._stacking_policy: StackingPolicy = stacking_policy if stacking_policy is not None \
+            else DepartureOrderPolicy()
         self._containers: List[SlotItem] = []
-        self._ws = web.WebSocketResponse()
-        self._prepared = False
+        self._in_transit: Set[str] = set()
+        self._move_accounting_jid = move_accounting_jid
+        self._yard_state_jid = yard_state_jid
+        self._remarshalling = remarshalling
+        self._state_changed_at = time.monotonic()
+        self._unreported_moves = MoveCounts()
+        self._state_version = 0
+        self._state_publisher = SlotStatePublisher([jid for jid in (dashboard_jid, port_manager_jid)
+                                                    if jid is not None])
+        self._state_publisher.add_listener(self._send_to_viewers)
+        self._viewers: Set[web.WebSocketResponse] = set()
 
     async def setup(self):
         self.web.add_get("/slot", self.slot_controller, "slot.html")
+        self.web.add_get("/slot/snapshot", self.snapshot_controller, template=None)
         self.web.add_get("/ws", self.ws_controller, template=None, raw=True)
         self.web.start(port=8000 + int(self._slot_id), templates_path="../src/templates")
         allocation_mt = Template()
         allocation_mt.set_metadata('protocol', 'ContractNet')
         allocation_mt.set_metadata('action', AllocationRequest.__key__)
 
+        batch_allocation_mt = Template()
+        batch_allocation_mt.set_metadata('protocol', 'ContractNet')
+        batch_allocation_mt.set_metadata('action', BatchAllocationRequest.__key__)
+
         self_deallocation_mt = Template()
         self_deallocation_mt.set_metadata('protocol', 'Request')
         self_deallocation_mt.set_metadata('action', SelfDeallocationRequest.__key__)
         await self.register_service()
-        self._lock = Lock()
+        self._lock = PriorityLock()
         self.add_behaviour(AllocationResponder(), allocation_mt)
+        self.add_behaviour(BatchAllocationResponder(), batch_allocation_mt)
         self.add_behaviour(SelfDeallocationResponder(), self_deallocation_mt)
+        if self._move_accounting_jid is not None:
+            self.add_behaviour(MoveReportBehaviour(self._move_accounting_jid))
+        if self._yard_state_jid is not None:
+            self.add_behaviour(CapacityAdvertisementBehaviour(self._yard_state_jid))
+        if self._remarshalling is not None:
+            self.add_behaviour(RemarshallingBehaviour(self._remarshalling))
+        self.add_behaviour(self._state_publisher)
         self.log(f'Slot manager agent for slot no {self.slot_id} started')
 
     @property
@@ -186,30 +320,97 @@ class SlotManagerAgent(BaseAgent):
     def is_full(self):
         return len(self._containers) >= self._max_height
 
-    def get_timedelta_from_forced_reallocation_to_departure(self, departure_time: str) -> float:
+    @property
+    def free_height(self) -> int:
+        return max(self._max_height - len(self._containers), 0)
+
+    @property
+    def earliest_departure_time(self) -> Optional[datetime]:
         if len(self._containers) == 0:
-            return 0
-        parsed_departure_time = datetime.fromisoformat(departure_time)
-        return max(
-            max(
-                [(parsed_departure_time - departure_time) for _, departure_time, _ in self._containers]
-            ).total_seconds(),
-            0
-        )
+            return None
+        return min(departure_time for _, departure_time, _ in self._containers)
+
+    @property
+    def capacity(self) -> SlotCapacity:
+        earliest_departure_time = self.earliest_departure_time
+        return SlotCapacity(self._slot_id, self.free_height, self._state_version,
+                            earliest_departure_time.isoformat() if earliest_departure_time is not None else None)
+
+    @property
+    def departure_times(self) -> List[datetime]:
+        return [departure_time for _, departure_time, _ in self._containers]
+
+    def score_placement(self, departure_time: str) -> float:
+        return self._stacking_policy.score(self.departure_times, datetime.fromisoformat(departure_time),
+                                           self._max_height)
 
     async def add_container(self, container_id: str, departure_time: str, container_agent_jid: str):
         parsed_departure_time = datetime.fromisoformat(departure_time)
         self._containers.append(SlotItem(container_id, parsed_departure_time, container_agent_jid))
-        if self._prepared:
-            await self._ws.send_json({"containers": self.containers})
+        self._unreported_moves.placements += 1
+        self._publish_state()
 
     def has_container(self, search_id: str) -> bool:
         return search_id in [container_id for container_id, _, _ in self._containers]
 
-    async def remove_container(self, container_id: str):
+    async def remove_container(self, container_id: str, reshuffle: bool = False):
         self._containers = [slot_item for slot_item in self._containers if slot_item.container_id != container_id]
-        if self._prepared:
-            await self._ws.send_json({"containers": self.containers})
+        if reshuffle:
+            self._unreported_moves.reshuffles += 1
+        else:
+            self._unreported_moves.departures += 1
+        self._publish_state()
+
+    def start_transit(self, container_id: str):
+        self._in_transit.add(container_id)
+
+    def is_in_transit(self, container_id: str) -> bool:
+        """
+        Whether the container was taken off the slot and is not placed in another one yet
+        """
+        return container_id in self._in_transit
+
+    def end_transit(self, container_id: str) -> bool:
+        if container_id not in self._in_transit:
+            return False
+        self._in_transit.remove(container_id)
+        return True
+
+    def is_idle(self, idle_time: float) -> bool:
+        return not self._lock.locked() and time.monotonic() - self._state_changed_at >= idle_time
+
+    async def count_other_slots_with_room(self) -> int:
+        """
+        Other slots the yard state agent knows to have room for at least one container, none without such an agent
+        """
+        if self._yard_state_jid is None:
+            return 0
+        conversation_id = f'{self.slot_id}-{uuid4().hex}'
+        candidate_slots_mt = Template()
+        candidate_slots_mt.thread = conversation_id
+        candidate_slots_mt.set_metadata('protocol', 'Request')
+        candidate_slots_mt.set_metadata('action', CandidateSlotsRequest.__key__)
+        candidate_slots_behaviour = CandidateSlotsInitiator(self._yard_state_jid, datetime.now(), conversation_id)
+        self.add_behaviour(candidate_slots_behaviour, candidate_slots_mt)
+        await candidate_slots_behaviour.join()
+        own_jid = str(self.jid.bare())
+        return len([jid for jid in candidate_slots_behaviour.candidates or [] if jid != own_jid])
+
+    def take_top_containers(self, count: int) -> Sequence[SlotItem]:
+        return list(reversed(self._containers[len(self._containers) - count:])) if count > 0 else []
+
+    async def reallocate_container(self, container_jid: str, container_id: str):
+        reallocate_behaviour = ReallocationInitiator(container_jid, container_id)
+        reallocation_mt = Template()
+        reallocation_mt.set_metadata('protocol', 'Request')
+        reallocation_mt.set_metadata('action', ReallocationRequest.__key__)
+
+        self.add_behaviour(reallocate_behaviour, reallocation_mt)
+        try:
+            await reallocate_behaviour.join()
+        except Exception as e:
+            self.log(f'Reallocation of container {container_id} failed: {e}', logging.WARNING,
+                     container_id=container_id)
 
     def get_blocking_containers(self, container_id) -> Sequence[SlotItem]:
         blocking_containers: List[SlotItem] = []
@@ -220,6 +421,21 @@ class SlotManagerAgent(BaseAgent):
             blocking_containers.append(cur_container)
         return blocking_containers
 
+    def _publish_state(self):
+        self._state_changed_at = time.monotonic()
+        self._state_version += 1
+        self._state_publisher.publish(SlotStateChange(self._slot_id, self._state_version, self.containers))
+
+    async def _send_to_viewers(self, change: SlotStateChange):
+        if not self._viewers:
+            return
+        payload = json.dumps({"containers": change.containers, "version": change.version})
+        await asyncio.gather(*[ws.send_str(payload) for ws in self._viewers], return_exceptions=True)
+
+    def take_unreported_moves(self) -> MoveCounts:
+        moves, self._unreported_moves = self._unreported_moves, MoveCounts()
+        return moves
+
     @property
     def containers(self):
         return [container_id for container_id, _, _ in self._containers]
@@ -227,23 +443,29 @@ class SlotManagerAgent(BaseAgent):
     async def slot_controller(self, request):
         return {"containers": self.containers, "containerHeight": int(100 / self._max_height)}
 
-    async def ws_controller(self, request):
-        await self._ws.prepare(request)
-        self._prepared = True
+    async def snapshot_controller(self, request):
+        return {"slot_id": self._slot_id, "version": self._state_version, "containers": self.containers}
 
-        async for msg in self._ws:
-            if msg.type == aiohttp.WSMsgType.TEXT:
-                if msg.data == 'close':
-                    await self._ws.close()
-                else:
-                    await self._ws.send_str(msg.data + '/answer')
-            elif msg.type == aiohttp.WSMsgType.ERROR:
-                print('ws connection closed with exception %s' %
-                      self._ws.exception())
-
-        print('websocket connection closed')
-
-        return self._ws
+    async def ws_controller(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"containers": self.containers, "version": self._state_version})
+        self._viewers.add(ws)
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    if msg.data == 'close':
+                        await ws.close()
+                    else:
+                        await ws.send_str(msg.data + '/answer')
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    self.log(f'ws connection closed with exception {ws.exception()}', logging.WARNING)
+        finally:
+            self._viewers.discard(ws)
+
+        self.log('websocket connection closed')
+
+        return ws
 
     async def register_service(self):
         self.log('start registration')
@@ -252,4 +474,4 @@ class SlotManagerAgent(BaseAgent):
         })
         dfd: DFAgentDescription = DFAgentDescription(jid_to_str(self.jid), '', 'port_terminal_ontology',
                                                      ContentLanguage.XML, serviceDescription)
-        await DFService.register(self, dfd, HandleRegistrationBehaviour(), self.jid.domain)
+        await DFService.register(self, dfd, HandleRegistrationBehaviour(), self.jid.domain, DEFAULT_LEASE_DURATION)
@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Sequence
+from typing import Optional, Sequence
 
 from spade.behaviour import TimeoutBehaviour
 
@@ -7,11 +7,17 @@ from src.agents.base_agent import BaseAgent
 from src.behaviours.request_initiator import RequestInitiator
 from src.ontology.port_terminal_ontology import PortTerminalOntology, ContainersDeallocationRequest
 from src.utils.acl_message import ACLMessage
+from src.utils.metrics import MetricsRegistry, Stopwatch
 from src.utils.performative import Performative
 
 
 class ContainersDeallocationInititiator(RequestInitiator):
+    def __init__(self):
+        super().__init__()
+        self._stopwatch: Optional[Stopwatch] = None
+
     async def prepare_requests(self) -> Sequence[ACLMessage]:
+        self._stopwatch = Stopwatch()
         request = ACLMessage(to=self.agent.port_manager_agent_jid)
         request.protocol = 'Request'
         request.ontology = self.agent.ontology.name
@@ -20,6 +26,7 @@ class ContainersDeallocationInititiator(RequestInitiator):
         return [request]
 
     def handle_all_result_notifications(self, result_notifications: Sequence[ACLMessage]):
+        self._stopwatch.observe(MetricsRegistry.instance().truck_service)
         self.agent.log('Containers successfully deallocated')
 
 
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Set, Callable, Awaitable
+
+import aiohttp
+from aiohttp import web
+from spade.behaviour import PeriodicBehaviour
+from spade.template import Template
+
+from src.agents.base_agent import BaseAgent
+from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour, KILL_CHECK_INTERVAL
+from src.ontology.ontology import ContentElement
+from src.ontology.port_terminal_ontology import PortTerminalOntology, SlotStateChange
+from src.utils.acl_message import ACLMessage
+from src.utils.change_queue import ChangeQueue
+from src.utils.performative import Performative
+
+DEFAULT_DASHBOARD_PORT = 7000
+DEFAULT_FRAME_RATE = 10.0
+DEFAULT_MAX_PENDING_CHANGES = 64
+TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+
+YardDiff = Dict[str, List[str]]
+
+
+class SlotStatePublisher(BaseCyclicBehaviour):
+    """
+    Delivers the slot state changes queued by `publish` to the yard views (the dashboard, the port manager) and the
+    listeners from its own task, off the caller's critical path. Changes carry the whole slot state, so when the
+    consumer falls behind the oldest pending ones are dropped.
+    """
+
+    def __init__(self, recipients_jids: Sequence[str] = (), max_pending_changes: int = DEFAULT_MAX_PENDING_CHANGES):
+        super().__init__()
+        self._recipients_jids = recipients_jids
+        self._changes: ChangeQueue[SlotStateChange] = ChangeQueue(max_pending_changes)
+        self._listeners: List[Callable[[SlotStateChange], Awaitable]] = []
+
+    @property
+    def dropped_changes(self) -> int:
+        return self._changes.dropped
+
+    def add_listener(self, listener: Callable[[SlotStateChange], Awaitable]):
+        self._listeners.append(listener)
+
+    def publish(self, change: SlotStateChange):
+        self._changes.put_nowait(change)
+
+    async def run(self):
+        change: Optional[SlotStateChange] = await self._changes.get(KILL_CHECK_INTERVAL)
+        if change is None:
+            return
+        if self._recipients_jids:
+            msg = ACLMessage()
+            msg.performative = Performative.INFORM
+            msg.ontology = self.agent.ontology.name
+            msg.action = SlotStateChange.__key__
+            for copy in self.agent.content_manager.fill_content_many(change, msg, self._recipients_jids):
+                await self.send(copy)
+        for listener in self._listeners:
+            await listener(change)
+
+
+class DashboardClient:
+    """
+    A websocket viewer. Frames are sent by the client's own task, frames produced while it is still sending are
+    merged into one, so a slow viewer only delays itself.
+    """
+
+    def __init__(self, ws: web.WebSocketResponse):
+        self.ws = ws
+        self._diff: YardDiff = {}
+        self._payload: Optional[str] = None
+        self._ready = asyncio.Event()
+
+    def push(self, diff: YardDiff, payload: str):
+        if self._diff:
+            self._diff.update(diff)
+            self._payload = None
+        else:
+            self._diff = dict(diff)
+            self._payload = payload
+        self._ready.set()
+
+    async def run(self):
+        while not self.ws.closed:
+            await self._ready.wait()
+            self._ready.clear()
+            diff, payload = self._diff, self._payload
+            self._diff, self._payload = {}, None
+            try:
+                await self.ws.send_str(payload if payload is not None else json.dumps({'slots': diff}))
+            except (ConnectionResetError, RuntimeError):
+                return
+
+
+class SlotStateChangesResponder(BaseCyclicBehaviour):
+    async def run(self):
+        msg: Optional[ACLMessage] = await self.wait_for_message()
+        if msg is None:
+            return
+        content: ContentElement = self.agent.content_manager.extract_content(msg)
+        if isinstance(content, SlotStateChange):
+            self.agent.apply_change(content)
+
+
+class FrameBehaviour(PeriodicBehaviour):
+    async def run(self):
+        self.agent.broadcast_frame()
+
+
+class YardDashboardAgent(BaseAgent):
+    """
+    Keeps the containers of every slot and serves them at /yard. Changes reported by slot managers are coalesced and
+    pushed to the websocket viewers at most `frame_rate` times per second.
+    """
+
+    def __init__(self, jid: str, password: str, port: int = DEFAULT_DASHBOARD_PORT,
+                 frame_rate: float = DEFAULT_FRAME_RATE):
+        super().__init__(jid, password, PortTerminalOntology.instance())
+        self._port = port
+        self._frame_rate = frame_rate
+        self._slots: Dict[str, List[str]] = {}
+        self._versions: Dict[str, int] = {}
+        self._frame: YardDiff = {}
+        self._clients: Set[DashboardClient] = set()
+
+    async def setup(self):
+        slot_state_change_mt = Template()
+        slot_state_change_mt.set_metadata('action', SlotStateChange.__key__)
+        self.add_behaviour(SlotStateChangesResponder(), slot_state_change_mt)
+        self.add_behaviour(FrameBehaviour(1 / self._frame_rate))
+        self.web.add_get('/yard', self.yard_controller, 'yard.html')
+        self.web.add_get('/yard/snapshot', self.snapshot_controller, template=None)
+        self.web.add_get('/yard/ws', self.ws_controller, template=None, raw=True)
+        self.web.start(port=self._port, templates_path=TEMPLATES_PATH)
+        self.log(f'Yard dashboard started on port {self._port}')
+
+    def apply_change(self, change: SlotStateChange):
+        if change.version <= self._versions.get(change.slot_id, 0):
+            return
+        self._versions[change.slot_id] = change.version
+        self._slots[change.slot_id] = change.containers
+        self._frame[change.slot_id] = change.containers
+
+    def broadcast_frame(self):
+        if not self._frame:
+            return
+        frame, self._frame = self._frame, {}
+        if not self._clients:
+            return
+        payload = json.dumps({'slots': frame})
+        for client in self._clients:
+            client.push(frame, payload)
+
+    @property
+    def snapshot(self) -> Dict:
+        return {'slots': {slot_id: self._slots[slot_id] for slot_id in sorted(self._slots)}}
+
+    async def yard_controller(self, request):
+        return self.snapshot
+
+    async def snapshot_controller(self, request):
+        return self.snapshot
+
+    async def ws_controller(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        client = DashboardClient(ws)
+        snapshot = self.snapshot
+        client.push(snapshot['slots'], json.dumps(snapshot))
+        self._clients.add(client)
+        sender = asyncio.ensure_future(client.run())
+        try:
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT and msg.data == 'close':
+                    await ws.close()
+        finally:
+            self._clients.discard(client)
+            sender.cancel()
+        return ws
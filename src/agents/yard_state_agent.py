@@ -0,0 +1,165 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+from spade.behaviour import PeriodicBehaviour
+from spade.template import Template
+
+from src.agents.DFAgent import DFService, HandleExpirationsBehaviour
+from src.agents.base_agent import BaseAgent
+from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
+from src.behaviours.request_initiator import RequestInitiator
+from src.behaviours.request_responder import RequestResponder
+from src.ontology.directory_facilitator_ontology import DFAgentDescription, ServiceDescription
+from src.ontology.ontology import ContentElement
+from src.ontology.port_terminal_ontology import PortTerminalOntology, SlotCapacity, CandidateSlotsRequest, \
+    CandidateSlots
+from src.utils.acl_message import ACLMessage
+from src.utils.content_language import ContentLanguage
+from src.utils.performative import Performative
+
+DEFAULT_ADVERTISEMENT_PERIOD = 0.2
+DEFAULT_QUERY_TIMEOUT = 1.0
+DEFAULT_YARD_STATE_PORT = 7001
+
+
+class CapacityAdvertisementBehaviour(PeriodicBehaviour):
+    """
+    Sends the slot capacity to the yard state agent whenever it changed since the previous advertisement. The agent
+    provides `capacity`.
+    """
+
+    def __init__(self, yard_state_jid: str, period: float = DEFAULT_ADVERTISEMENT_PERIOD):
+        super().__init__(period)
+        self._yard_state_jid = yard_state_jid
+        self._advertised_version: Optional[int] = None
+
+    async def run(self):
+        capacity: SlotCapacity = self.agent.capacity
+        if capacity.version == self._advertised_version:
+            return
+        advertisement = ACLMessage(to=self._yard_state_jid)
+        advertisement.performative = Performative.INFORM
+        advertisement.ontology = self.agent.ontology.name
+        advertisement.action = SlotCapacity.__key__
+        self.agent.content_manager.fill_content(capacity, advertisement)
+        await self.send(advertisement)
+        self._advertised_version = capacity.version
+
+
+class CandidateSlotsInitiator(RequestInitiator):
+    """
+    Asks the yard state agent which slots may take a container. `candidates` stays None when the agent refuses or
+    doesn't answer in time.
+    """
+
+    def __init__(self, yard_state_jid: str, departure_time: datetime, conversation_id: str,
+                 reply_timeout: Optional[float] = DEFAULT_QUERY_TIMEOUT):
+        super().__init__(reply_timeout)
+        self._yard_state_jid = yard_state_jid
+        self._departure_time = departure_time
+        self._conversation_id = conversation_id
+        self.candidates: Optional[List[str]] = None
+
+    async def prepare_requests(self) -> Sequence[ACLMessage]:
+        request = ACLMessage(to=self._yard_state_jid, thread=self._conversation_id)
+        request.performative = Performative.REQUEST
+        request.protocol = 'Request'
+        request.ontology = self.agent.ontology.name
+        self.agent.content_manager.fill_content(CandidateSlotsRequest(str(self._departure_time)), request)
+        return [request]
+
+    def handle_inform(self, response: ACLMessage):
+        content: ContentElement = self.agent.content_manager.extract_content(response)
+        if isinstance(content, CandidateSlots):
+            self.candidates = content.slots_jids
+
+
+class CapacityAdvertisementsResponder(BaseCyclicBehaviour):
+    async def run(self):
+        msg: Optional[ACLMessage] = await self.wait_for_message()
+        if msg is None:
+            return
+        content: ContentElement = self.agent.content_manager.extract_content(msg)
+        if isinstance(content, SlotCapacity):
+            self.agent.update_capacity(str(msg.sender.bare()), content)
+
+
+class CandidateSlotsResponder(RequestResponder):
+    """
+    Answers with the candidates right away instead of agreeing first
+    """
+
+    async def prepare_response(self, request: ACLMessage) -> ACLMessage:
+        content: ContentElement = self.agent.content_manager.extract_content(request)
+        if not isinstance(content, CandidateSlotsRequest):
+            return request.create_reply(Performative.NOT_UNDERSTOOD)
+        candidates = self.agent.candidate_slots(datetime.fromisoformat(content.departure_time))
+        if not candidates:
+            return request.create_reply(Performative.REFUSE)
+        response = request.create_reply(Performative.INFORM)
+        self.agent.content_manager.fill_content(CandidateSlots(candidates), response)
+        return response
+
+    async def prepare_result_notification(self, request: ACLMessage) -> ACLMessage:
+        pass
+
+
+class SlotManagersExpirationsBehaviour(HandleExpirationsBehaviour):
+    async def handleExpired(self, description: DFAgentDescription):
+        self.agent.remove_capacity(description.agentName)
+
+
+class YardStateAgent(BaseAgent):
+    """
+    Keeps the latest capacity advertised by every slot manager and tells containers which slots to send their CFPs
+    to. Advertisements lag behind the slots, a slot which filled up in the meantime just refuses the CFP. The
+    capacities are served at /capacity.
+    """
+
+    def __init__(self, jid: str, password: str, max_candidates: Optional[int] = None,
+                 port: int = DEFAULT_YARD_STATE_PORT):
+        super().__init__(jid, password, PortTerminalOntology.instance())
+        self._max_candidates = max_candidates
+        self._port = port
+        self._capacities: Dict[str, SlotCapacity] = {}
+
+    async def setup(self):
+        capacity_mt = Template()
+        capacity_mt.set_metadata('action', SlotCapacity.__key__)
+        candidate_slots_mt = Template()
+        candidate_slots_mt.set_metadata('protocol', 'Request')
+        candidate_slots_mt.set_metadata('action', CandidateSlotsRequest.__key__)
+        self.add_behaviour(CapacityAdvertisementsResponder(), capacity_mt)
+        self.add_behaviour(CandidateSlotsResponder(), candidate_slots_mt)
+        self.web.add_get('/capacity', self.capacity_controller, template=None)
+        self.web.start(port=self._port)
+        dfd: DFAgentDescription = DFAgentDescription('', '', 'port_terminal_ontology', ContentLanguage.XML,
+                                                     ServiceDescription({}))
+        await DFService.subscribe(self, dfd, SlotManagersExpirationsBehaviour(), self.jid.domain)
+        self.log(f'Yard state agent started on port {self._port}')
+
+    def update_capacity(self, slot_jid: str, capacity: SlotCapacity):
+        known: Optional[SlotCapacity] = self._capacities.get(slot_jid)
+        if known is None or capacity.version > known.version:
+            self._capacities[slot_jid] = capacity
+
+    def remove_capacity(self, slot_jid: str):
+        self._capacities.pop(slot_jid, None)
+
+    def candidate_slots(self, departure_time: datetime) -> List[str]:
+        """
+        Slots with free room, those where the container wouldn't block an earlier departure first. When
+        `max_candidates` is set only that many are returned.
+        """
+
+        def blocks_departure(capacity: SlotCapacity) -> bool:
+            return capacity.earliest_departure_time is not None and \
+                datetime.fromisoformat(capacity.earliest_departure_time) < departure_time
+
+        candidates = [(slot_jid, capacity) for slot_jid, capacity in self._capacities.items()
+                      if capacity.free_height > 0]
+        candidates.sort(key=lambda candidate: (blocks_departure(candidate[1]), -candidate[1].free_height))
+        return [slot_jid for slot_jid, _ in candidates[:self._max_candidates]]
+
+    async def capacity_controller(self, request):
+        return {slot_jid: vars(capacity) for slot_jid, capacity in self._capacities.items()}
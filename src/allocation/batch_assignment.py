@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Sequence
+
+from src.allocation.stacking_policy import StackingPolicy, DepartureOrderPolicy
+from src.ontology.port_terminal_ontology import ContainerData
+
+
+class SlotOffer(NamedTuple):
+    slot_id: str
+    free_height: int
+    stack: List[datetime]
+    proposals: Dict[str, float]
+
+
+def assign_batch(containers: Sequence[ContainerData], offers: Sequence[SlotOffer],
+                 stacking_policy: StackingPolicy = DepartureOrderPolicy()) -> Dict[str, List[ContainerData]]:
+    """
+    Greedy assignment of a batch to the offered slots. Containers leaving last are placed first, so the ones
+    leaving earlier end up on top of them. Each container goes to the slot with the best stacking policy
+    score, ties going to the slot with the least free height. A slot's own proposal is used until the batch
+    changes its stack, then the planned stack is scored.
+    Returns containers per slot id in stacking order; containers that do not fit are left out.
+    """
+    free_heights: Dict[str, int] = {offer.slot_id: offer.free_height for offer in offers}
+    max_heights: Dict[str, int] = {offer.slot_id: offer.free_height + len(offer.stack) for offer in offers}
+    stacks: Dict[str, List[datetime]] = {offer.slot_id: list(offer.stack) for offer in offers}
+    proposals: Dict[str, Dict[str, float]] = {offer.slot_id: offer.proposals for offer in offers}
+    assignment: Dict[str, List[ContainerData]] = {}
+
+    def cost(slot_id: str, container_id: str, departure_time: datetime):
+        if slot_id not in assignment:
+            return proposals[slot_id][container_id]
+        return stacking_policy.score(stacks[slot_id], departure_time, max_heights[slot_id])
+
+    for container in sorted(containers, key=lambda c: datetime.fromisoformat(c.departure_time), reverse=True):
+        departure_time = datetime.fromisoformat(container.departure_time)
+        candidates = [slot_id for slot_id, free_height in free_heights.items()
+                      if free_height > 0 and container.id in proposals[slot_id]]
+        if len(candidates) == 0:
+            continue
+        slot_id = min(candidates, key=lambda s: (cost(s, container.id, departure_time), free_heights[s]))
+        assignment.setdefault(slot_id, []).append(container)
+        free_heights[slot_id] -= 1
+        stacks[slot_id].append(departure_time)
+    return assignment
@@ -0,0 +1,201 @@
+import bisect
+import math
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_NODE_LIMIT = 1000000
+
+Stacks = List[List[int]]
+
+
+class Event(NamedTuple):
+    arrival: bool
+    rank: int
+
+
+class Scenario(NamedTuple):
+    """
+    Containers given by departure rank, events in the order they happen. `groups` maps a rank to its departure time
+    index, containers of one group leave at the same time in any order.
+    """
+    events: List[Event]
+    groups: List[int]
+    departures: List[datetime]
+
+
+class SolverResult(NamedTuple):
+    moves: Optional[int]
+    optimal: bool
+    nodes: int
+
+
+def prepare_scenario(arrivals: Sequence[datetime], departures: Sequence[datetime]) -> Scenario:
+    """
+    A departure comes before an arrival at the same time. Of containers leaving together the latest arrived gets the
+    lowest rank.
+    """
+    count = len(arrivals)
+    arrival_order = sorted(range(count), key=lambda container: arrivals[container])
+    arrival_positions = {container: position for position, container in enumerate(arrival_order)}
+    departure_order = sorted(range(count), key=lambda container: (departures[container],
+                                                                  -arrival_positions[container]))
+    ranks = {container: rank for rank, container in enumerate(departure_order)}
+    group_times = sorted(set(departures))
+    groups = [bisect.bisect_left(group_times, departures[container]) for container in departure_order]
+
+    events = []
+    arrived = departed = 0
+    while arrived < count or departed < count:
+        if arrived < count and arrivals[arrival_order[arrived]] < departures[departure_order[departed]]:
+            events.append(Event(True, ranks[arrival_order[arrived]]))
+            arrived += 1
+        else:
+            events.append(Event(False, departed))
+            departed += 1
+    return Scenario(events, groups, [departures[container] for container in departure_order])
+
+
+def blocking_count(stacks: Stacks, groups: Sequence[int]) -> int:
+    """
+    Containers above one leaving before them, each of them has to be relocated at least once
+    """
+    count = 0
+    for stack in stacks:
+        lowest = math.inf
+        for rank in stack:
+            if groups[rank] > lowest:
+                count += 1
+            lowest = min(lowest, groups[rank])
+    return count
+
+
+class _BranchAndBound:
+    def __init__(self, scenario: Scenario, max_height: int, node_limit: int):
+        self._events = scenario.events
+        self._groups = scenario.groups
+        self._max_height = max_height
+        self._node_limit = node_limit
+        self._seen: Dict[Tuple, int] = {}
+        self.best = math.inf
+        self.nodes = 0
+        self.exhausted = False
+
+    def search(self, index: int, stacks: Stacks, relocations: int):
+        if not self._visit(stacks, relocations):
+            return
+        if index == len(self._events):
+            self.best = relocations
+            return
+        key = (index, tuple(sorted(tuple(stack) for stack in stacks)))
+        if self._seen.get(key, math.inf) <= relocations:
+            return
+        self._seen[key] = relocations
+        event = self._events[index]
+        if event.arrival:
+            for target in self._targets(stacks, event.rank):
+                stacks[target].append(event.rank)
+                self.search(index + 1, stacks, relocations)
+                stacks[target].pop()
+            return
+        present = [rank for stack in stacks for rank in stack]
+        earliest_group = min(self._groups[rank] for rank in present)
+        departing = [rank for rank in present if self._groups[rank] == earliest_group]
+        departing.sort(key=lambda rank: self._depth(stacks, rank))
+        for rank in departing:
+            self._retrieve(index, stacks, rank, relocations)
+
+    def _retrieve(self, index: int, stacks: Stacks, rank: int, relocations: int):
+        if not self._visit(stacks, relocations):
+            return
+        source = next(position for position, stack in enumerate(stacks) if rank in stack)
+        if stacks[source][-1] == rank:
+            stacks[source].pop()
+            self.search(index + 1, stacks, relocations)
+            stacks[source].append(rank)
+            return
+        blocker = stacks[source].pop()
+        for target in self._targets(stacks, blocker, source):
+            stacks[target].append(blocker)
+            self._retrieve(index, stacks, rank, relocations + 1)
+            stacks[target].pop()
+        stacks[source].append(blocker)
+
+    def _visit(self, stacks: Stacks, relocations: int) -> bool:
+        self.nodes += 1
+        if self.nodes > self._node_limit:
+            self.exhausted = True
+        return not self.exhausted and relocations + blocking_count(stacks, self._groups) < self.best
+
+    def _targets(self, stacks: Stacks, rank: int, source: Optional[int] = None) -> List[int]:
+        """
+        Stacks with room for the container, one of identical ones, those it doesn't block first and the tightest fit
+        first among them
+        """
+        candidates: Dict[Tuple[int, ...], int] = {}
+        for position, stack in enumerate(stacks):
+            if position != source and len(stack) < self._max_height:
+                candidates.setdefault(tuple(stack), position)
+
+        def key(position: int):
+            lowest = min((self._groups[other] for other in stacks[position]), default=math.inf)
+            return (0, lowest) if lowest >= self._groups[rank] else (1, -lowest)
+
+        return sorted(candidates.values(), key=key)
+
+    @staticmethod
+    def _depth(stacks: Stacks, rank: int) -> int:
+        for stack in stacks:
+            if rank in stack:
+                return len(stack) - 1 - stack.index(rank)
+        return 0
+
+
+def solve_min_moves(arrivals: Sequence[datetime], departures: Sequence[datetime], slot_count: int, max_height: int,
+                    node_limit: int = DEFAULT_NODE_LIMIT) -> SolverResult:
+    """
+    Fewest moves the scenario can be played with, counted like TestEnvironment.get_moves_count_for_naive_method:
+    one per placement, departure and relocation of a blocking container. Branch and bound over the stack every
+    arriving and relocated container goes to, pruned with `blocking_count` and by states already reached with
+    fewer relocations. Gives up after `node_limit` nodes with the best solution found, if any, and `optimal` False.
+    """
+    search = _BranchAndBound(prepare_scenario(arrivals, departures), max_height, node_limit)
+    search.search(0, [[] for _ in range(slot_count)], 0)
+    moves = 2 * len(arrivals) + search.best if search.best < math.inf else None
+    return SolverResult(moves, not search.exhausted and moves is not None, search.nodes)
+
+
+def _decreasing_cover(ranks: Sequence[int], count: int) -> int:
+    """
+    Most elements `count` decreasing subsequences of `ranks` can hold: the sizes of the first `count` columns of the
+    RSK tableau (Greene's theorem)
+    """
+    rows: List[List[int]] = []
+    for rank in ranks:
+        for row in rows:
+            position = bisect.bisect_right(row, rank)
+            if position == len(row):
+                row.append(rank)
+                break
+            row[position], rank = rank, row[position]
+        else:
+            rows.append([rank])
+    return sum(min(len(row), count) for row in rows)
+
+
+def moves_lower_bound(arrivals: Sequence[datetime], departures: Sequence[datetime], slot_count: int) -> int:
+    """
+    A bound on the fewest moves quick enough for large scenarios. A container neither relocated yet nor blocking
+    another one sits on containers which arrived before it and leave after it, so in every stack those containers
+    depart in reverse arrival order. Whenever more containers are in the yard than `slot_count` such sequences
+    can hold, each one left over has been or will be relocated.
+    """
+    scenario = prepare_scenario(arrivals, departures)
+    present: List[int] = []
+    relocations = 0
+    for event in scenario.events:
+        if event.arrival:
+            present.append(event.rank)
+            continue
+        relocations = max(relocations, len(present) - _decreasing_cover(present, slot_count))
+        present.remove(event.rank)
+    return 2 * len(arrivals) + relocations
@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Sequence
+
+DEFAULT_REMARSHALLING_PERIOD = 5.0
+DEFAULT_IDLE_TIME = 5.0
+DEFAULT_MIN_FREE_SLOTS = 1
+
+
+@dataclass
+class RemarshallingSettings:
+    """
+    Relocating containers ahead of departures within `horizon`, at most `relocations_per_run` at a time and
+    `max_relocations` in total (no limit when None). A slot is remarshalled only after `idle_time` seconds without
+    changes and only while more than `min_free_slots` other slots have room for the relocated containers.
+    """
+    horizon: timedelta
+    relocations_per_run: int = 1
+    max_relocations: Optional[int] = None
+    period: float = DEFAULT_REMARSHALLING_PERIOD
+    idle_time: float = DEFAULT_IDLE_TIME
+    min_free_slots: int = DEFAULT_MIN_FREE_SLOTS
+
+
+def plan_remarshalling(stack: Sequence[datetime], now: datetime, horizon: timedelta, budget: int) -> int:
+    """
+    Returns how many containers to take off the top of the stack, given as departure times from bottom to top.
+    Everything above the container leaving first leaves after it, so when that container leaves within `horizon`
+    all of them block it; at most `budget` are taken off. Of containers leaving together the topmost counts.
+    """
+    if len(stack) == 0 or budget <= 0:
+        return 0
+    first_index = min(range(len(stack)), key=lambda index: (stack[index], -index))
+    if stack[first_index] > now + horizon:
+        return 0
+    return min(len(stack) - 1 - first_index, budget)
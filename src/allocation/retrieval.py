@@ -0,0 +1,60 @@
+from typing import Dict, List, Mapping, Sequence, Tuple
+
+Stacks = Mapping[str, Sequence[str]]
+
+
+def _locate(stacks: Stacks) -> Dict[str, Tuple[str, int]]:
+    return {container_id: (slot_id, index) for slot_id, stack in stacks.items()
+            for index, container_id in enumerate(stack)}
+
+
+def next_retrieval(containers_ids: Sequence[str], stacks: Stacks) -> str:
+    """
+    The container to retrieve first: the one with the fewest containers above it, so within a slot containers
+    leave from the top down and none of them is reshuffled to dig out another one. Containers missing from the stacks
+    come last, ties keep the requested order.
+    """
+    positions = _locate(stacks)
+
+    def key(container_id: str):
+        position = positions.get(container_id)
+        if position is None:
+            return 1, 0
+        slot_id, index = position
+        return 0, len(stacks[slot_id]) - 1 - index
+
+    return min(containers_ids, key=key)
+
+
+def count_reshuffles(order: Sequence[str], stacks: Stacks) -> int:
+    """
+    Containers moved aside when retrieving `order` one by one. Moved containers are assumed to leave the stacks,
+    as they are reallocated to other slots.
+    """
+    remaining: Dict[str, List[str]] = {slot_id: list(stack) for slot_id, stack in stacks.items()}
+    positions = _locate(stacks)
+    reshuffles = 0
+    for container_id in order:
+        position = positions.get(container_id)
+        if position is None:
+            continue
+        stack = remaining[position[0]]
+        if container_id not in stack:
+            continue
+        index = stack.index(container_id)
+        reshuffles += len(stack) - 1 - index
+        del stack[index:]
+    return reshuffles
+
+
+def plan_retrieval(containers_ids: Sequence[str], stacks: Stacks) -> List[str]:
+    """
+    Retrieval order of the containers for the given stacks, see `next_retrieval`
+    """
+    remaining = list(containers_ids)
+    order = []
+    while remaining:
+        container_id = next_retrieval(remaining, stacks)
+        remaining.remove(container_id)
+        order.append(container_id)
+    return order
@@ -0,0 +1,91 @@
+import bisect
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Type
+
+from src.ontology.port_terminal_ontology import AllocationProposal
+
+RELOCATION_PENALTY_SECONDS = 3600
+
+
+class StackingPolicy(ABC):
+    """
+    Scores putting a container on top of a stack given as departure times from bottom to top.
+    Lower is better; scores are expressed in seconds so they fit AllocationProposal.
+    """
+    name: str = ''
+
+    @abstractmethod
+    def score(self, stack: Sequence[datetime], departure_time: datetime, max_height: int) -> float:
+        pass
+
+    def rank_proposal(self, proposal: AllocationProposal) -> float:
+        return proposal.seconds_from_forced_reallocation_to_departure
+
+
+class DepartureOrderPolicy(StackingPolicy):
+    """Minimises the time the container waits between a forced reallocation and its departure."""
+    name = 'departure-order'
+
+    def score(self, stack: Sequence[datetime], departure_time: datetime, max_height: int) -> float:
+        if len(stack) == 0:
+            return 0
+        return max((departure_time - min(stack)).total_seconds(), 0)
+
+
+class HeightBalancedPolicy(DepartureOrderPolicy):
+    """Departure order with a penalty growing with stack height, so stacks fill evenly."""
+    name = 'height-balanced'
+
+    def __init__(self, height_penalty_seconds: float = 60):
+        self._height_penalty_seconds = height_penalty_seconds
+
+    def score(self, stack: Sequence[datetime], departure_time: datetime, max_height: int) -> float:
+        return super().score(stack, departure_time, max_height) + \
+            self._height_penalty_seconds * len(stack) / max_height
+
+
+class LookaheadPolicy(StackingPolicy):
+    """
+    Penalises every placement that will force a reallocation, then prefers the tightest fit: the stack whose
+    earliest departure leaves the fewest known upcoming departures that could still be stacked on it cleanly.
+    Without known departures the slack is measured in seconds.
+    """
+    name = 'lookahead'
+
+    def __init__(self, upcoming_departures: Optional[Sequence[datetime]] = None,
+                 relocation_penalty_seconds: float = RELOCATION_PENALTY_SECONDS):
+        self._upcoming_departures = sorted(upcoming_departures) if upcoming_departures is not None else None
+        self._relocation_penalty_seconds = relocation_penalty_seconds
+
+    def score(self, stack: Sequence[datetime], departure_time: datetime, max_height: int) -> float:
+        blocked_count = sum(1 for stacked_departure in stack if stacked_departure < departure_time)
+        if blocked_count > 0:
+            return self._relocation_penalty_seconds * (1 + blocked_count / max_height)
+        return self._slack(departure_time, min(stack) if len(stack) > 0 else None)
+
+    def _slack(self, departure_time: datetime, earliest_departure: Optional[datetime]) -> float:
+        if self._upcoming_departures is None:
+            if earliest_departure is None:
+                return self._relocation_penalty_seconds - 1
+            return min((earliest_departure - departure_time).total_seconds(), self._relocation_penalty_seconds - 1)
+        lower = bisect.bisect_right(self._upcoming_departures, departure_time)
+        upper = len(self._upcoming_departures) if earliest_departure is None else \
+            bisect.bisect_left(self._upcoming_departures, earliest_departure)
+        share = (upper - lower) / max(len(self._upcoming_departures), 1)
+        return share * (self._relocation_penalty_seconds - 1)
+
+
+STACKING_POLICIES: Dict[str, Type[StackingPolicy]] = {
+    DepartureOrderPolicy.name: DepartureOrderPolicy,
+    HeightBalancedPolicy.name: HeightBalancedPolicy,
+    LookaheadPolicy.name: LookaheadPolicy
+}
+
+
+def create_stacking_policy(name: str, upcoming_departures: Optional[Sequence[datetime]] = None) -> StackingPolicy:
+    if name not in STACKING_POLICIES:
+        raise ValueError(f'Unknown stacking policy {name}, available: {", ".join(STACKING_POLICIES)}')
+    if STACKING_POLICIES[name] is LookaheadPolicy:
+        return LookaheadPolicy(upcoming_departures)
+    return STACKING_POLICIES[name]()
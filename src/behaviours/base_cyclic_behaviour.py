@@ -1,14 +1,119 @@
+import asyncio
 from abc import ABC
-from typing import Optional
+from typing import Any, Optional, List, AsyncIterator
 
 from spade.behaviour import CyclicBehaviour
 
 from src.utils.acl_message import ACLMessage
+from src.utils.message_log import MessageRecorder
+from src.utils.metrics import MetricsRegistry
+from src.utils.priority import MessagePriorities, PriorityMailbox
+from src.utils.tracing import SpanContext, inject
+
+KILL_CHECK_INTERVAL = 1.0
 
 
 class BaseCyclicBehaviour(CyclicBehaviour, ABC):
+    def __init__(self):
+        super().__init__()
+        self._finished = False
+        self._join_waiters: List[asyncio.Future] = []
+        self._killed: Optional[asyncio.Future] = None
+        self.trace_parent: Optional[SpanContext] = None
+
+    def set_agent(self, agent):
+        super().set_agent(agent)
+        priorities: Optional[MessagePriorities] = getattr(agent, 'message_priorities', None)
+        if priorities is not None:
+            self.queue = PriorityMailbox(priorities, loop=agent.loop)
+
+    async def send(self, msg: ACLMessage):
+        inject(msg)
+        MetricsRegistry.instance().message_sent(msg)
+        await super().send(msg)
+        MessageRecorder.instance().message_sent(str(self.agent.jid), msg)
+
     async def receive(self, timeout: float = None) -> Optional[ACLMessage]:
         result = await super().receive(timeout)
         if result is not None:
-            result.__class__ = ACLMessage
+            return ACLMessage.from_message(result)
         return result
+
+    async def wait_for_message(self, timeout: Optional[float] = None) -> Optional[ACLMessage]:
+        """
+        Suspends until a message arrives. Returns None after `timeout` seconds or as soon as the behaviour is killed.
+        """
+        if not self.queue.empty():
+            return ACLMessage.from_message(self.queue.get_nowait())
+        if self._killed is None:
+            self._killed = asyncio.get_event_loop().create_future()
+        if self.is_killed():
+            return None
+        get = asyncio.ensure_future(self.queue.get())
+        try:
+            await asyncio.wait([get, self._killed], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not get.done():
+                get.cancel()
+        if get.done() and not get.cancelled():
+            return ACLMessage.from_message(get.result())
+        return None
+
+    def kill(self, exit_code: Any = None):
+        super().kill(exit_code)
+        if self._killed is not None:
+            self.agent.loop.call_soon_threadsafe(self._wake_killed)
+
+    def _wake_killed(self):
+        if not self._killed.done():
+            self._killed.set_result(None)
+
+    async def receive_replies(self, count: int, timeout: Optional[float] = None) -> AsyncIterator[ACLMessage]:
+        loop = asyncio.get_event_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        for _ in range(count):
+            msg = await self.wait_for_message(None if deadline is None else max(deadline - loop.time(), 0))
+            if msg is None:
+                return
+            yield msg
+
+    async def _step(self):
+        self._finished = False
+        try:
+            await super()._step()
+        finally:
+            if self._done() or self.is_killed():
+                self._resolve_joins()
+
+    def _resolve_joins(self):
+        """
+        Wakes the behaviours joining this one, re-raising in them the exception that killed it
+        """
+        self._finished = True
+        error = self._exit_code if isinstance(self._exit_code, Exception) else None
+        for waiter in self._join_waiters:
+            if waiter.done():
+                continue
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+        self._join_waiters.clear()
+
+    def join(self, timeout=None):
+        try:
+            in_coroutine = asyncio.get_event_loop() == self.agent.loop
+        except RuntimeError:
+            in_coroutine = False
+        if not in_coroutine:
+            return super().join(timeout)
+        return self._wait_finished(timeout)
+
+    async def _wait_finished(self, timeout: Optional[float]):
+        if self._finished:
+            if isinstance(self._exit_code, Exception):
+                raise self._exit_code
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        self._join_waiters.append(waiter)
+        await asyncio.wait_for(waiter, timeout)
@@ -1,10 +1,14 @@
 import asyncio
 from abc import abstractmethod
 from enum import IntEnum
-from typing import Sequence, List
+from typing import Sequence, List, Optional
 
 from src.behaviours.initiator import Initiator
 from src.utils.acl_message import ACLMessage
+from src.utils.metrics import MetricsRegistry, Stopwatch
+from src.utils.tracing import start_span, SpanKind, Span
+
+DEFAULT_RESPONSE_TIMEOUT = 30.0
 
 
 class ContractNetInitiatorState(IntEnum):
@@ -17,60 +21,94 @@ class ContractNetInitiatorState(IntEnum):
 
 
 class ContractNetInitiator(Initiator):
-    def __init__(self):
+    """
+    Runs the whole protocol in a single `run()`, suspending until the awaited replies arrive. Responders that do not
+    answer within `response_timeout` seconds are treated as silent, result notifications are awaited for
+    `result_notification_timeout` seconds (forever when None).
+    """
+
+    def __init__(self, response_timeout: Optional[float] = DEFAULT_RESPONSE_TIMEOUT,
+                 result_notification_timeout: Optional[float] = None):
         super().__init__()
+        self._response_timeout = response_timeout
+        self._result_notification_timeout = result_notification_timeout
         self._state = ContractNetInitiatorState.PREPARE_CFPS
+        self._previous_messages_count = 0
         self._cfps_count = 0
         self._responses_count = 0
         self._responses = []
+        self._replies_count = 0
         self._expected_result_notifications_count = 0
         self._result_notifications_count = 0
         self._result_notifications = []
 
     async def run(self):
-        if self._state == ContractNetInitiatorState.PREPARE_CFPS:
-            cfps: Sequence[ACLMessage] = await self.prepare_cfps()
-            self._cfps_count = len(cfps)
-            await asyncio.wait([self.send(msg) for msg in cfps])
-            self._state = ContractNetInitiatorState.WAITING_FOR_RESPONSES
-            return
+        with start_span(type(self).__name__, self.agent.name, self.trace_parent, SpanKind.CLIENT,
+                        protocol='ContractNet') as span:
+            await self._negotiate(span)
 
-        if self._state == ContractNetInitiatorState.WAITING_FOR_RESPONSES:
-            response: ACLMessage = await self.receive()
-            if response is not None:
-                self._handle_single_message(response)
-                self._responses.append(response)
-                self._responses_count += 1
-            if self._responses_count >= self._cfps_count:
-                self._state = ContractNetInitiatorState.ALL_RESPONSES_RECEIVED
-            return
+    async def _negotiate(self, span: Optional[Span]):
+        cfps: Sequence[ACLMessage] = await self.prepare_cfps()
+        self._cfps_count = len(cfps)
+        if span is not None and cfps:
+            span.set_attribute('action', cfps[0].action)
+            span.set_attribute('cfps', self._cfps_count)
+        stopwatch = Stopwatch()
+        await asyncio.gather(*[self.send(msg) for msg in cfps])
 
-        if self._state == ContractNetInitiatorState.ALL_RESPONSES_RECEIVED:
-            acceptances: List[ACLMessage] = []
-            rejections: List[ACLMessage] = []
-            self.handle_all_responses(self._responses, acceptances, rejections)
-            self._expected_result_notifications_count = len(acceptances)
-            await asyncio.wait([self.send(msg) for msg in acceptances + rejections])
-            self._state = ContractNetInitiatorState.WAITING_FOR_RESULT_NOTIFICATIONS
+        self._state = ContractNetInitiatorState.WAITING_FOR_RESPONSES
+        async for response in self.receive_replies(self._cfps_count, self._response_timeout):
+            await self._handle_single_message(response)
+            self._responses.append(response)
+            self._responses_count += 1
+        if self.is_killed():
             return
 
-        if self._state == ContractNetInitiatorState.WAITING_FOR_RESULT_NOTIFICATIONS:
-            result_notification: ACLMessage = await self.receive()
-            if result_notification is not None:
-                self._handle_single_message(result_notification)
-                self._result_notifications.append(result_notification)
-                self._result_notifications_count += 1
-                if self._result_notifications_count >= self._expected_result_notifications_count:
-                    self._state = ContractNetInitiatorState.ALL_RESULT_NOTIFICATIONS_RECEIVED
-            if self._result_notifications_count >= self._expected_result_notifications_count:
-                self._state = ContractNetInitiatorState.ALL_RESULT_NOTIFICATIONS_RECEIVED
-            return
+        self._state = ContractNetInitiatorState.ALL_RESPONSES_RECEIVED
+        acceptances: List[ACLMessage] = []
+        rejections: List[ACLMessage] = []
+        self.handle_all_responses(self._responses, acceptances, rejections)
+        self._expected_result_notifications_count = len(acceptances)
+        self._replies_count = len(acceptances) + len(rejections)
+        await asyncio.gather(*[self.send(msg) for msg in acceptances + rejections])
 
-        if self._state == ContractNetInitiatorState.ALL_RESULT_NOTIFICATIONS_RECEIVED:
-            self.handle_all_result_notifications(self._result_notifications)
-            self._state = ContractNetInitiatorState.FINALIZED
+        self._state = ContractNetInitiatorState.WAITING_FOR_RESULT_NOTIFICATIONS
+        async for result_notification in self.receive_replies(self._expected_result_notifications_count,
+                                                              self._result_notification_timeout):
+            await self._handle_single_message(result_notification)
+            self._result_notifications.append(result_notification)
+            self._result_notifications_count += 1
+        if self.is_killed():
             return
 
+        self._state = ContractNetInitiatorState.ALL_RESULT_NOTIFICATIONS_RECEIVED
+        self.handle_all_result_notifications(self._result_notifications)
+        self._state = ContractNetInitiatorState.FINALIZED
+        if span is not None:
+            span.set_attribute('responses', self._responses_count)
+            span.set_attribute('accepted', self._expected_result_notifications_count)
+        if cfps:
+            stopwatch.observe(MetricsRegistry.instance().contract_net_latency, cfps[0].action or '')
+
+    def _reset(self):
+        """
+        Lets the next `run()` negotiate again, the messages of the finished rounds stay counted
+        """
+        self._previous_messages_count = self.messages_count
+        self._state = ContractNetInitiatorState.PREPARE_CFPS
+        self._cfps_count = 0
+        self._responses_count = 0
+        self._responses = []
+        self._replies_count = 0
+        self._expected_result_notifications_count = 0
+        self._result_notifications_count = 0
+        self._result_notifications = []
+
+    @property
+    def messages_count(self) -> int:
+        return self._previous_messages_count + self._cfps_count + self._responses_count + self._replies_count + \
+            self._result_notifications_count
+
     def _done(self) -> bool:
         return self._state == ContractNetInitiatorState.FINALIZED
 
@@ -1,41 +1,34 @@
 from abc import ABCMeta, abstractmethod
-from enum import IntEnum
 
 from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
 from src.utils.acl_message import ACLMessage
 from src.utils.performative import Performative
-
-
-class ContractNetResponderState(IntEnum):
-    WAITING_FOR_CFP = 0
-    WAITING_FOR_PROPOSAL_RESPONSE = 1
+from src.utils.tracing import start_span, extract, SpanKind
 
 
 class ContractNetResponder(BaseCyclicBehaviour, metaclass=ABCMeta):
-    def __init__(self):
-        super().__init__()
-        self._state = ContractNetResponderState.WAITING_FOR_CFP
+    """
+    Handles every incoming message by its performative, so a CFP that arrives while a proposal awaits acceptance
+    is answered instead of being consumed as the proposal response.
+    """
 
     async def run(self):
-        if self._state == ContractNetResponderState.WAITING_FOR_CFP:
-            cfp: ACLMessage = await self.receive()
-            if cfp is not None:
-                response: ACLMessage = await self.handle_cfp(cfp)
-                if response.performative == Performative.PROPOSE:
-                    self._state = ContractNetResponderState.WAITING_FOR_PROPOSAL_RESPONSE
-                await self.send(response)
-            return
-
-        if self._state == ContractNetResponderState.WAITING_FOR_PROPOSAL_RESPONSE:
-            proposal_response: ACLMessage = await self.receive()
-            if proposal_response is not None:
-                if proposal_response.performative == Performative.ACCEPT_PROPOSAL:
-                    result_notification: ACLMessage = await self.handle_accept_proposal(proposal_response)
-                    await self.send(result_notification)
-                elif proposal_response.performative == Performative.REJECT_PROPOSAL:
-                    await self.handle_reject_proposal(proposal_response)
-                self._state = ContractNetResponderState.WAITING_FOR_CFP
+        msg: ACLMessage = await self.wait_for_message()
+        if msg is None:
             return
+        with start_span(type(self).__name__, self.agent.name, extract(msg), SpanKind.SERVER, action=msg.action,
+                        performative=msg.performative.name if msg.performative is not None else None):
+            await self._handle(msg)
+
+    async def _handle(self, msg: ACLMessage):
+        if msg.performative == Performative.CFP:
+            response: ACLMessage = await self.handle_cfp(msg)
+            await self.send(response)
+        elif msg.performative == Performative.ACCEPT_PROPOSAL:
+            result_notification: ACLMessage = await self.handle_accept_proposal(msg)
+            await self.send(result_notification)
+        elif msg.performative == Performative.REJECT_PROPOSAL:
+            await self.handle_reject_proposal(msg)
 
     @abstractmethod
     async def handle_cfp(self, cfp: ACLMessage) -> ACLMessage:
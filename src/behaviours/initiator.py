@@ -1,24 +1,43 @@
 from abc import ABCMeta
-from typing import Dict, Callable, Optional
+from inspect import iscoroutinefunction
+from typing import Dict, Callable, Tuple
 
 from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
 from src.utils.acl_message import ACLMessage
 from src.utils.performative import Performative
 
+Handler = Tuple[Callable, bool]
 
-class Initiator(BaseCyclicBehaviour, metaclass=ABCMeta):
-    def _handle_single_message(self, msg: ACLMessage) -> None:
-        handlers_dict: Dict[Performative, Callable[[ACLMessage], None]] = {
-            Performative.AGREE: self.handle_agree,
-            Performative.PROPOSE: self.handle_propose,
-            Performative.REFUSE: self.handle_refuse,
-            Performative.NOT_UNDERSTOOD: self.handle_not_understood,
-            Performative.INFORM: self.handle_inform,
-            Performative.FAILURE: self.handle_failure
-        }
-        handler: Optional[Callable[[ACLMessage], None]] = handlers_dict.get(msg.performative)
+
+def _build_handlers(cls) -> Dict[Performative, Handler]:
+    handlers: Dict[Performative, Handler] = {}
+    for performative in Performative:
+        handler = getattr(cls, f'handle_{performative.name.lower()}', None)
         if handler is not None:
-            handler(msg)
+            handlers[performative] = (handler, iscoroutinefunction(handler))
+    return handlers
+
+
+class Initiator(BaseCyclicBehaviour, metaclass=ABCMeta):
+    """
+    Dispatches replies to `handle_<performative>` methods, e.g. `handle_inform` or `handle_reject_proposal`,
+    which may be plain or async. The performative table is built once per class.
+    """
+    _handlers: Dict[Performative, Handler] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._handlers = _build_handlers(cls)
+
+    async def _handle_single_message(self, msg: ACLMessage) -> None:
+        handler = self._handlers.get(msg.performative)
+        if handler is None:
+            return
+        function, is_async = handler
+        if is_async:
+            await function(self, msg)
+        else:
+            function(self, msg)
 
     def handle_agree(self, response: ACLMessage):
         pass
@@ -37,3 +56,6 @@ class Initiator(BaseCyclicBehaviour, metaclass=ABCMeta):
 
     def handle_failure(self, response: ACLMessage):
         pass
+
+
+Initiator._handlers = _build_handlers(Initiator)
@@ -1,10 +1,12 @@
 import asyncio
 from abc import abstractmethod
 from enum import IntEnum
-from typing import Sequence
+from typing import Sequence, Optional
 
 from src.behaviours.initiator import Initiator
 from src.utils.acl_message import ACLMessage
+from src.utils.metrics import MetricsRegistry, Stopwatch
+from src.utils.tracing import start_span, SpanKind, Span
 from src.utils.performative import Performative
 
 
@@ -16,8 +18,14 @@ class RequestInitiatorState(IntEnum):
 
 
 class RequestInitiator(Initiator):
-    def __init__(self):
+    """
+    Runs the whole protocol in a single `run()`, suspending until the next reply arrives. Gives up on the missing
+    replies when none arrives for `reply_timeout` seconds (never when None).
+    """
+
+    def __init__(self, reply_timeout: Optional[float] = None):
         super().__init__()
+        self._reply_timeout = reply_timeout
         self._requests_count: int = 0
         self._responses_count: int = 0
         self._result_notifications_count: int = 0
@@ -27,37 +35,49 @@ class RequestInitiator(Initiator):
         self._result_notifications = []
 
     async def run(self):
-        if self._state == RequestInitiatorState.INITIALISED:
-            requests: Sequence[ACLMessage] = await self.prepare_requests()
-            self._requests_count = len(requests)
-            self._expected_result_notifications_count = len(requests)
-            await asyncio.wait([self.send(msg) for msg in requests])
-            self._state = RequestInitiatorState.WAITING_FOR_RESPONSES
-            return
+        with start_span(type(self).__name__, self.agent.name, self.trace_parent, SpanKind.CLIENT,
+                        protocol='Request') as span:
+            await self._request(span)
 
-        if self._state == RequestInitiatorState.WAITING_FOR_RESPONSES:
-            response: ACLMessage = await self.receive()
-            if response is not None:
-                if response.performative in [Performative.INFORM, Performative.FAILURE]:
-                    self._result_notifications.append(response)
-                    self._result_notifications_count += 1
-                elif response.performative in [Performative.AGREE, Performative.NOT_UNDERSTOOD, Performative.REFUSE]:
-                    self._responses.append(response)
-                    self._responses_count += 1
-                    if response.performative != Performative.AGREE:
-                        self._expected_result_notifications_count -= 1
-                    if self._responses_count >= self._requests_count:
-                        self.handle_all_responses(self._responses)
-                if self._result_notifications_count >= self._expected_result_notifications_count:
-                    self._state = RequestInitiatorState.ALL_RESULT_NOTIFICATIONS_RECEIVED
-                self._handle_single_message(response)
-            return
+    async def _request(self, span: Optional[Span]):
+        requests: Sequence[ACLMessage] = await self.prepare_requests()
+        self._requests_count = len(requests)
+        if span is not None and requests:
+            span.set_attribute('action', requests[0].action)
+            span.set_attribute('requests', self._requests_count)
+        self._expected_result_notifications_count = len(requests)
+        stopwatch = Stopwatch()
+        await asyncio.gather(*[self.send(msg) for msg in requests])
 
-        if self._state == RequestInitiatorState.ALL_RESULT_NOTIFICATIONS_RECEIVED:
-            self.handle_all_result_notifications(self._result_notifications)
-            self._state = RequestInitiatorState.FINALIZED
+        self._state = RequestInitiatorState.WAITING_FOR_RESPONSES
+        while self._result_notifications_count < self._expected_result_notifications_count:
+            response: ACLMessage = await self.wait_for_message(self._reply_timeout)
+            if response is None:
+                break
+            if response.performative in [Performative.INFORM, Performative.FAILURE]:
+                self._result_notifications.append(response)
+                self._result_notifications_count += 1
+            elif response.performative in [Performative.AGREE, Performative.NOT_UNDERSTOOD, Performative.REFUSE]:
+                self._responses.append(response)
+                self._responses_count += 1
+                if response.performative != Performative.AGREE:
+                    self._expected_result_notifications_count -= 1
+                if self._responses_count >= self._requests_count:
+                    self.handle_all_responses(self._responses)
+            await self._handle_single_message(response)
+        if self.is_killed():
             return
 
+        self._state = RequestInitiatorState.ALL_RESULT_NOTIFICATIONS_RECEIVED
+        self.handle_all_result_notifications(self._result_notifications)
+        self._state = RequestInitiatorState.FINALIZED
+        if requests:
+            stopwatch.observe(MetricsRegistry.instance().request_latency, requests[0].action or '')
+
+    @property
+    def messages_count(self) -> int:
+        return self._requests_count + self._responses_count + self._result_notifications_count
+
     def _done(self) -> bool:
         return self._state == RequestInitiatorState.FINALIZED
 
@@ -1,39 +1,26 @@
 from abc import ABCMeta, abstractmethod
-from enum import IntEnum
-from typing import Optional
 
 from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
 from src.utils.acl_message import ACLMessage
 from src.utils.performative import Performative
-
-
-class RequestResponderState(IntEnum):
-    WAITING_FOR_REQUEST = 0,
-    REQUEST_AGREED = 1,
-    FINALIZED = 2
+from src.utils.tracing import start_span, extract, SpanKind
 
 
 class RequestResponder(BaseCyclicBehaviour, metaclass=ABCMeta):
-    def __init__(self):
-        super().__init__()
-        self._state: RequestResponderState = RequestResponderState.WAITING_FOR_REQUEST
-        self._request: Optional[ACLMessage] = None
-
     async def run(self):
-        if self._state == RequestResponderState.WAITING_FOR_REQUEST:
-            request: ACLMessage = await self.receive()
-            if request is not None:
-                self._request = request
-                response: ACLMessage = await self.prepare_response(request)
-                if response.performative == Performative.AGREE:
-                    self._state = RequestResponderState.REQUEST_AGREED
-                await self.send(response)
-            return
-        if self._state == RequestResponderState.REQUEST_AGREED:
-            response: ACLMessage = await self.prepare_result_notification(self._request)
-            await self.send(response)
-            self._state = RequestResponderState.WAITING_FOR_REQUEST
+        request: ACLMessage = await self.wait_for_message()
+        if request is None:
             return
+        with start_span(type(self).__name__, self.agent.name, extract(request), SpanKind.SERVER,
+                        action=request.action):
+            await self._respond(request)
+
+    async def _respond(self, request: ACLMessage):
+        response: ACLMessage = await self.prepare_response(request)
+        await self.send(response)
+        if response.performative == Performative.AGREE:
+            result_notification: ACLMessage = await self.prepare_result_notification(request)
+            await self.send(result_notification)
 
     @abstractmethod
     async def prepare_response(self, request: ACLMessage) -> ACLMessage:
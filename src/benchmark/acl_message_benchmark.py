@@ -0,0 +1,78 @@
+import sys
+from timeit import timeit
+from typing import List, Sequence
+
+import click
+from spade.message import Message
+
+sys.path.extend(['.'])
+
+from src.ontology.content_manager import ContentManager
+from src.ontology.port_terminal_ontology import AllocationRequest, ContainerData
+from src.utils.acl_message import ACLMessage
+from src.utils.performative import Performative
+
+
+def create_message() -> ACLMessage:
+    msg = ACLMessage(to='slot_0@localhost', sender='container_0@localhost')
+    msg.performative = Performative.CFP
+    msg.ontology = 'port_terminal_ontology'
+    msg.protocol = 'ContractNet'
+    msg.action = 'allocation_request'
+    return msg
+
+
+def create_plain_message() -> Message:
+    msg = Message(to='container_0@localhost', sender='slot_0@localhost')
+    msg.set_metadata('performative', str(Performative.PROPOSE.value))
+    msg.set_metadata('ontology', 'port_terminal_ontology')
+    msg.set_metadata('protocol', 'ContractNet')
+    msg.set_metadata('action', 'allocation_request')
+    return msg
+
+
+def inspect_message(msg: ACLMessage):
+    return msg.performative == Performative.PROPOSE and msg.protocol == 'ContractNet' and \
+        msg.action == 'allocation_request' and msg.ontology == 'port_terminal_ontology'
+
+
+def create_cfps_per_recipient(content_manager: ContentManager, recipients: Sequence[str]) -> List[ACLMessage]:
+    cfps = []
+    for jid in recipients:
+        cfp = create_message()
+        cfp.to = jid
+        content_manager.fill_content(AllocationRequest(ContainerData('container_0', '2020-01-01 12:00:00')), cfp)
+        cfps.append(cfp)
+    return cfps
+
+
+def create_cfps_fan_out(content_manager: ContentManager, recipients: Sequence[str]) -> List[ACLMessage]:
+    content = AllocationRequest(ContainerData('container_0', '2020-01-01 12:00:00'))
+    return content_manager.fill_content_many(content, create_message(), recipients)
+
+
+@click.command()
+@click.option('--iterations', default=100000, type=int, help='Operations per measurement')
+@click.option('--recipients', default=20, type=int, help='Slot managers a CFP is sent to')
+def main(iterations: int, recipients: int):
+    msg = create_message()
+    content_manager = ContentManager()
+    slot_jids = [f'slot_{i}@localhost' for i in range(recipients)]
+    reply = msg.create_reply(Performative.PROPOSE)
+    received = create_plain_message()
+    measurements = {
+        'create': lambda: create_message(),
+        'create_reply': lambda: msg.create_reply(Performative.PROPOSE),
+        'inspect': lambda: inspect_message(reply),
+        'from_message': lambda: ACLMessage.from_message(received),
+        'copy_to': lambda: msg.copy_to('slot_1@localhost'),
+        f'cfps_per_recipient ({recipients})': lambda: create_cfps_per_recipient(content_manager, slot_jids),
+        f'cfps_fan_out ({recipients})': lambda: create_cfps_fan_out(content_manager, slot_jids)
+    }
+    for name, operation in measurements.items():
+        seconds = timeit(operation, number=iterations)
+        print(f'{name}: {seconds / iterations * 1e6:.3f} us/op')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import asyncio
+import sys
+from time import perf_counter
+from typing import Sequence
+
+import click
+
+sys.path.extend(['.'])
+
+from src.behaviours.initiator import Initiator
+from src.utils.acl_message import ACLMessage
+from src.utils.performative import Performative
+
+
+class CountingInitiator(Initiator):
+    def __init__(self):
+        super().__init__()
+        self.handled = 0
+
+    async def run(self):
+        pass
+
+    def handle_inform(self, response: ACLMessage):
+        self.handled += 1
+
+    def handle_propose(self, response: ACLMessage):
+        self.handled += 1
+
+    def handle_agree(self, response: ACLMessage):
+        self.handled += 1
+
+    def handle_per_message_dict(self, msg: ACLMessage):
+        handlers_dict = {
+            Performative.AGREE: self.handle_agree,
+            Performative.PROPOSE: self.handle_propose,
+            Performative.REFUSE: self.handle_refuse,
+            Performative.NOT_UNDERSTOOD: self.handle_not_understood,
+            Performative.INFORM: self.handle_inform,
+            Performative.FAILURE: self.handle_failure
+        }
+        handler = handlers_dict.get(msg.performative)
+        if handler is not None:
+            handler(msg)
+
+
+def create_messages(count: int) -> Sequence[ACLMessage]:
+    performatives = [Performative.PROPOSE, Performative.INFORM, Performative.REFUSE]
+    messages = []
+    for i in range(count):
+        msg = ACLMessage(to='container_0@localhost', sender=f'slot_{i % 16}@localhost')
+        msg.performative = performatives[i % len(performatives)]
+        messages.append(msg)
+    return messages
+
+
+async def measure_dispatch_table(initiator: CountingInitiator, messages: Sequence[ACLMessage]) -> float:
+    started_at = perf_counter()
+    for msg in messages:
+        await initiator._handle_single_message(msg)
+    return perf_counter() - started_at
+
+
+def measure_per_message_dict(initiator: CountingInitiator, messages: Sequence[ACLMessage]) -> float:
+    started_at = perf_counter()
+    for msg in messages:
+        initiator.handle_per_message_dict(msg)
+    return perf_counter() - started_at
+
+
+@click.command()
+@click.option('--messages', default=100000, type=int, help='Messages dispatched per measurement')
+def main(messages: int):
+    initiator = CountingInitiator()
+    inbound = create_messages(messages)
+    per_message_dict = measure_per_message_dict(initiator, inbound)
+    dispatch_table = asyncio.run(measure_dispatch_table(initiator, inbound))
+    print(f'per-message dict: {per_message_dict / messages * 1e6:.3f} us/msg')
+    print(f'dispatch table: {dispatch_table / messages * 1e6:.3f} us/msg')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import math
+from threading import Lock
+from time import perf_counter
+from typing import Dict, List, Sequence, NamedTuple, Tuple
+
+from src.utils.singleton import Singleton
+
+
+class BenchmarkSnapshot(NamedTuple):
+    allocations: int
+    deallocations: int
+    reallocations: int
+    moves: int
+    messages: int
+    reallocation_messages: int
+    allocation_busy_seconds: float
+    allocation_latencies: Sequence[float]
+    deallocation_latencies: Sequence[float]
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    if len(values) == 0:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def busy_time(intervals: Sequence[Tuple[float, float]]) -> float:
+    """
+    Time covered by at least one of the (start, end) intervals
+    """
+    total = 0.0
+    busy_until = -math.inf
+    for start, end in sorted(intervals):
+        if end > busy_until:
+            total += end - max(start, busy_until)
+            busy_until = end
+    return total
+
+
+@Singleton
+class BenchmarkRecorder:
+    def __init__(self):
+        self._lock = Lock()
+        self._enabled = False
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._allocation_starts: Dict[str, float] = {}
+            self._deallocation_starts: Dict[str, float] = {}
+            self._allocation_intervals: List[Tuple[float, float]] = []
+            self._deallocation_latencies: List[float] = []
+            self._reallocations = 0
+            self._moves = 0
+            self._messages = 0
+            self._reallocation_messages = 0
+
+    def allocation_started(self, container_id: str):
+        if not self._enabled:
+            return
+        with self._lock:
+            self._allocation_starts[container_id] = perf_counter()
+
+    def allocation_finished(self, container_id: str, messages_count: int):
+        if not self._enabled:
+            return
+        now = perf_counter()
+        with self._lock:
+            started_at = self._allocation_starts.pop(container_id, None)
+            if started_at is not None:
+                self._allocation_intervals.append((started_at, now))
+            self._messages += messages_count
+
+    def reallocation_finished(self, messages_count: int):
+        """
+        Relocations of placed containers, counted apart so they don't inflate the allocation metrics
+        """
+        if not self._enabled:
+            return
+        with self._lock:
+            self._reallocations += 1
+            self._reallocation_messages += messages_count
+
+    def deallocation_started(self, container_id: str):
+        if not self._enabled:
+            return
+        with self._lock:
+            self._deallocation_starts[container_id] = perf_counter()
+
+    def deallocation_finished(self, container_id: str):
+        if not self._enabled:
+            return
+        now = perf_counter()
+        with self._lock:
+            started_at = self._deallocation_starts.pop(container_id, None)
+            if started_at is not None:
+                self._deallocation_latencies.append(now - started_at)
+
+    def record_move(self):
+        if not self._enabled:
+            return
+        with self._lock:
+            self._moves += 1
+
+    def snapshot(self) -> BenchmarkSnapshot:
+        with self._lock:
+            return BenchmarkSnapshot(
+                allocations=len(self._allocation_intervals),
+                deallocations=len(self._deallocation_latencies),
+                reallocations=self._reallocations,
+                moves=self._moves,
+                messages=self._messages,
+                reallocation_messages=self._reallocation_messages,
+                allocation_busy_seconds=busy_time(self._allocation_intervals),
+                allocation_latencies=[end - start for start, end in self._allocation_intervals],
+                deallocation_latencies=list(self._deallocation_latencies)
+            )
@@ -0,0 +1,170 @@
+import asyncio
+from collections import Counter
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.agents.base_agent import BaseAgent
+from src.utils.acl_message import ACLMessage
+from src.utils.message_log import RECEIVED, SENT, to_message
+
+DEFAULT_IDLE_TIMEOUT = 1.0
+IDLE_CHECK_INTERVAL = 0.05
+
+RequestKey = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+
+def _bare(jid: Optional[str]) -> Optional[str]:
+    return jid.split('/', 1)[0] if jid is not None else None
+
+
+def _request_key(peer: Optional[str], metadata: Dict) -> RequestKey:
+    return _bare(peer), metadata.get('protocol'), metadata.get('action'), metadata.get('ontology')
+
+
+def _answers(reply: Dict, request: Dict) -> bool:
+    """
+    Whether the received record belongs to the conversation of the sent one: the same thread when the reply has one,
+    else the same protocol and action, else the same ontology (DF replies carry neither thread nor protocol)
+    """
+    if reply['th'] is not None:
+        return reply['th'] == request['th']
+    if reply['md'].get('protocol') is not None:
+        return all(reply['md'].get(key) == request['md'].get(key) for key in ['protocol', 'action'])
+    return reply['md'].get('ontology') == request['md'].get('ontology')
+
+
+def _answered_requests(records: Sequence[Dict]) -> List[Optional[Tuple[RequestKey, int]]]:
+    """
+    For every received record the request it answers, as the key of the request and how many requests with that
+    key the agent had sent up to it, None for messages which don't answer anything the agent sent
+    """
+    sent: Dict[str, List[Tuple[Dict, RequestKey, int]]] = {}
+    counts: Counter = Counter()
+    answered: List[Optional[Tuple[RequestKey, int]]] = []
+    for record in records:
+        if record['d'] == SENT:
+            key = _request_key(record['to'], record['md'])
+            counts[key] += 1
+            sent.setdefault(key[0], []).append((record, key, counts[key]))
+            continue
+        requests = sent.get(_bare(record['from']), [])
+        answered.append(next(((key, count) for request, key, count in reversed(requests)
+                              if _answers(record, request)), None))
+    return answered
+
+
+class OfflineClient:
+    """
+    Stands in for the XMPP client of a replayed agent and keeps what the agent sends
+    """
+
+    def __init__(self):
+        self.sent: List[ACLMessage] = []
+        self.sent_counts: Counter = Counter()
+        self.last_sent_at: Optional[float] = None
+        self._sent_event = asyncio.Event()
+
+    async def send(self, stanza):
+        msg = ACLMessage.from_node(stanza)
+        self.sent.append(msg)
+        self.sent_counts[_request_key(str(msg.to), msg.metadata)] += 1
+        self.last_sent_at = perf_counter()
+        self._sent_event.set()
+
+    async def wait_sent(self, key: RequestKey, count: int, idle_timeout: float) -> bool:
+        """
+        Waits until `count` messages with the key were sent, False once nothing was sent for `idle_timeout` seconds
+        """
+        waiting_since = perf_counter()
+        while self.sent_counts[key] < count:
+            idle = perf_counter() - max(waiting_since, self.last_sent_at or waiting_since)
+            if idle >= idle_timeout:
+                return False
+            self._sent_event.clear()
+            try:
+                await asyncio.wait_for(self._sent_event.wait(), idle_timeout - idle)
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    def stop(self):
+        pass
+
+
+class ReplayResult(NamedTuple):
+    """
+    `unmatched` messages found no behaviour of the agent, `orphaned` replies were dispatched although the agent never
+    sent the request they answer; either means the replay went off the recorded run
+    """
+    received: int
+    sent: int
+    recorded_sent: int
+    seconds: float
+    unmatched: int
+    orphaned: int
+
+    @property
+    def messages_per_second(self) -> float:
+        return self.received / self.seconds if self.seconds > 0 else 0.0
+
+
+async def _start_offline(agent: BaseAgent):
+    """
+    `Agent._async_start` without registering and connecting to the XMPP server
+    """
+    agent.client = OfflineClient()
+    await agent.setup()
+    agent._alive.set()
+    for behaviour in agent.behaviours:
+        if not behaviour.is_running:
+            behaviour.start()
+
+
+async def _stop_offline(agent: BaseAgent):
+    for behaviour in agent.behaviours:
+        behaviour.kill()
+    if agent.web.is_started():
+        await agent.web.runner.cleanup()
+    agent._alive.clear()
+
+
+async def _replay(agent: BaseAgent, records: Sequence[Dict], speed: float,
+                  idle_timeout: float) -> Tuple[float, int, int, int]:
+    await _start_offline(agent)
+    client: OfflineClient = agent.client
+    received = [record for record in records if record['d'] == RECEIVED]
+    answered_requests = _answered_requests(records)
+    unmatched = orphaned = 0
+    started_at = perf_counter()
+    first_time = received[0]['t'] if received else 0.0
+    for record, answered_request in zip(received, answered_requests):
+        if speed > 0:
+            delay = (record['t'] - first_time) / speed - (perf_counter() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if answered_request is not None and not await client.wait_sent(*answered_request, idle_timeout):
+            orphaned += 1
+        msg = to_message(record)
+        if not agent._match_behaviours(msg):
+            unmatched += 1
+        agent.dispatch(msg)
+    fed_at = perf_counter()
+    while perf_counter() - max(fed_at, client.last_sent_at or fed_at) < idle_timeout:
+        await asyncio.sleep(IDLE_CHECK_INTERVAL)
+    await _stop_offline(agent)
+    return max(fed_at, client.last_sent_at or fed_at) - started_at, len(received), unmatched, orphaned
+
+
+def replay(agent: BaseAgent, records: Sequence[Dict], speed: float = 0.0,
+           idle_timeout: float = DEFAULT_IDLE_TIMEOUT) -> ReplayResult:
+    """
+    Runs the agent offline and feeds it the messages it received in the recorded run, as fast as it takes them when
+    `speed` is 0, otherwise `speed` times as fast as they were recorded. A reply to a request of the agent is held
+    back until the agent sent that request again, for at most `idle_timeout` seconds without it sending anything.
+    Returns once the agent sent nothing for `idle_timeout` seconds; the time measured ends with its last message.
+    `records` are the ones of this agent, sent and received in the recorded order.
+    """
+    recorded_sent = sum(1 for record in records if record['d'] == SENT)
+    future = asyncio.run_coroutine_threadsafe(_replay(agent, records, speed, idle_timeout), agent.loop)
+    seconds, received, unmatched, orphaned = future.result()
+    return ReplayResult(received, len(agent.client.sent), recorded_sent, seconds, unmatched, orphaned)
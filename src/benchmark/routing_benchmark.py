@@ -0,0 +1,90 @@
+import sys
+import uuid
+from time import perf_counter
+from typing import List, Sequence
+
+import click
+from spade.behaviour import CyclicBehaviour
+from spade.template import Template
+
+sys.path.extend(['.'])
+
+from src.ontology.port_terminal_ontology import AllocationRequest, ReallocationRequest, DeallocationRequest
+from src.utils.acl_message import ACLMessage
+from src.utils.message_router import MessageRouter
+from src.utils.performative import Performative
+
+
+class IdleBehaviour(CyclicBehaviour):
+    async def run(self):
+        pass
+
+
+def create_template(protocol: str, action: str, thread: str = None) -> Template:
+    template = Template()
+    template.thread = thread
+    template.set_metadata('protocol', protocol)
+    template.set_metadata('action', action)
+    return template
+
+
+def create_behaviours(conversations: int) -> List[CyclicBehaviour]:
+    """
+    Mirrors the container allocator: a responder per request action plus an initiator per open conversation
+    """
+    behaviours = []
+    for action in [ReallocationRequest.__key__, DeallocationRequest.__key__]:
+        behaviour = IdleBehaviour()
+        behaviour.set_template(create_template('Request', action))
+        behaviours.append(behaviour)
+    for _ in range(conversations):
+        behaviour = IdleBehaviour()
+        behaviour.set_template(create_template('ContractNet', AllocationRequest.__key__, str(uuid.uuid4())))
+        behaviours.append(behaviour)
+    return behaviours
+
+
+def create_messages(behaviours: Sequence[CyclicBehaviour], count: int) -> List[ACLMessage]:
+    messages = []
+    for i in range(count):
+        template = behaviours[i % len(behaviours)].template
+        msg = ACLMessage(to='container_allocator@localhost', sender=f'slot_{i % 16}@localhost',
+                         thread=template.thread, metadata=dict(template.metadata))
+        msg.performative = Performative.PROPOSE
+        messages.append(msg)
+    return messages
+
+
+def measure_linear(behaviours: Sequence[CyclicBehaviour], messages: Sequence[ACLMessage]) -> float:
+    started_at = perf_counter()
+    for msg in messages:
+        [behaviour for behaviour in behaviours if behaviour.match(msg)]
+    return perf_counter() - started_at
+
+
+def measure_router(router: MessageRouter, messages: Sequence[ACLMessage]) -> float:
+    started_at = perf_counter()
+    for msg in messages:
+        router.match(msg)
+    return perf_counter() - started_at
+
+
+@click.command()
+@click.option('--conversations', default=[10, 100, 500], multiple=True, type=int,
+              help='Open conversations per agent (repeatable)')
+@click.option('--messages', default=20000, type=int, help='Messages routed per measurement')
+def main(conversations: Sequence[int], messages: int):
+    for count in conversations:
+        behaviours = create_behaviours(count)
+        router = MessageRouter()
+        for behaviour in behaviours:
+            router.add(behaviour, behaviour.template)
+        inbound = create_messages(behaviours, messages)
+        linear = measure_linear(behaviours, inbound)
+        indexed = measure_router(router, inbound)
+        print(f'{len(behaviours)} behaviours: linear {linear / messages * 1e6:.3f} us/msg, '
+              f'index {indexed / messages * 1e6:.3f} us/msg')
+
+
+if __name__ == "__main__":
+    main()
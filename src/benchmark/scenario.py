@@ -0,0 +1,116 @@
+from dataclasses import dataclass
+from datetime import datetime
+from time import sleep, perf_counter
+
+from src.agents.DFAgent import DFAgent
+from src.agents.container_agent import ContainerAgent
+from src.agents.port_manager_agent import PortManagerAgent
+from src.agents.slot_manager_agent import SlotManagerAgent
+from src.agents.truck_agent import TruckAgent
+from src.allocation.stacking_policy import DepartureOrderPolicy, create_stacking_policy
+from src.benchmark.recorder import BenchmarkRecorder, BenchmarkSnapshot, percentile
+from src.utils.agent_runner import AgentRunner
+from src.utils.test_environment import TestEnvironment
+
+
+@dataclass
+class ScenarioConfig:
+    slot_count: int
+    max_slot_height: int
+    container_count: int
+    stacking_policy: str = DepartureOrderPolicy.name
+
+
+@dataclass
+class ScenarioResult:
+    slot_count: int
+    max_slot_height: int
+    container_count: int
+    stacking_policy: str
+    completed: bool
+    allocations: int
+    deallocations: int
+    reallocations: int
+    allocations_per_second: float
+    allocation_busy_seconds: float
+    allocation_latency_p50: float
+    allocation_latency_p99: float
+    deallocation_latency_p50: float
+    deallocation_latency_p99: float
+    messages_per_allocation: float
+    messages_per_reallocation: float
+    total_moves: int
+    naive_moves: int
+    startup_seconds: float
+
+
+def _create_result(config: ScenarioConfig, snapshot: BenchmarkSnapshot, naive_moves: int,
+                   startup_seconds: float) -> ScenarioResult:
+    """
+    Throughput counts only the time some allocation was in progress, so the pauses between paced arrivals don't
+    lower it. Reallocations are reported apart from the first allocations.
+    """
+    busy_seconds = snapshot.allocation_busy_seconds
+    return ScenarioResult(
+        slot_count=config.slot_count,
+        max_slot_height=config.max_slot_height,
+        container_count=config.container_count,
+        stacking_policy=config.stacking_policy,
+        completed=snapshot.deallocations >= config.container_count,
+        allocations=snapshot.allocations,
+        deallocations=snapshot.deallocations,
+        reallocations=snapshot.reallocations,
+        allocations_per_second=snapshot.allocations / busy_seconds if busy_seconds > 0 else 0.0,
+        allocation_busy_seconds=busy_seconds,
+        allocation_latency_p50=percentile(snapshot.allocation_latencies, 50),
+        allocation_latency_p99=percentile(snapshot.allocation_latencies, 99),
+        deallocation_latency_p50=percentile(snapshot.deallocation_latencies, 50),
+        deallocation_latency_p99=percentile(snapshot.deallocation_latencies, 99),
+        messages_per_allocation=snapshot.messages / snapshot.allocations if snapshot.allocations > 0 else 0.0,
+        messages_per_reallocation=snapshot.reallocation_messages / snapshot.reallocations
+        if snapshot.reallocations > 0 else 0.0,
+        total_moves=snapshot.moves,
+        naive_moves=naive_moves,
+        startup_seconds=startup_seconds
+    )
+
+
+def run_scenario(domain: str, config: ScenarioConfig, max_containers_in_batch: int, timeout: float) -> ScenarioResult:
+    recorder = BenchmarkRecorder.instance()
+    recorder.reset()
+    recorder.enable()
+    runner = AgentRunner()
+    try:
+        runner.start(DFAgent(domain, 'password1234'))
+        runner.wait_ready()
+
+        port_manager_agent_jid = f'port_manager@{domain}'
+        runner.start(PortManagerAgent(port_manager_agent_jid, 'port_manager_password'))
+
+        test_environment = TestEnvironment.instance()
+        test_environment.setup(domain, config.max_slot_height, config.slot_count, config.container_count)
+        containers_data = test_environment.prepare_test(max_containers_in_batch)
+        naive_moves = test_environment.get_moves_count_for_naive_method(containers_data)
+        policy = create_stacking_policy(config.stacking_policy, [c.departure_time for c in containers_data])
+
+        for i in range(config.slot_count):
+            runner.start(SlotManagerAgent(f'slot_{i}@{domain}', 'slot_password', str(i), config.max_slot_height,
+                                          policy))
+        startup_seconds = runner.wait_ready()
+
+        for truck_id, container_data in enumerate(containers_data):
+            runner.start(TruckAgent(f'truck_{truck_id}@{domain}', 'truck_password', [container_data.jid],
+                                    container_data.departure_time, port_manager_agent_jid))
+            time_until_arrival = (container_data.arrival_time - datetime.now()).total_seconds()
+            if time_until_arrival > 0:
+                sleep(time_until_arrival)
+            runner.start(ContainerAgent(container_data.jid, 'container_password', container_data.departure_time))
+
+        deadline = perf_counter() + timeout
+        while recorder.snapshot().deallocations < config.container_count and perf_counter() < deadline:
+            sleep(0.1)
+
+        return _create_result(config, recorder.snapshot(), naive_moves, startup_seconds)
+    finally:
+        recorder.disable()
+        runner.stop_all()
@@ -1,5 +1,5 @@
 from dataclasses import asdict
-from typing import Dict, Optional
+from typing import Dict, Optional, Sequence, List
 
 from xmltodict import parse, unparse
 
@@ -20,6 +20,14 @@ class ContentManager:
             msg.set_metadata('action', content.__key__)
         msg.body = unparse({content.__key__: asdict(content)}, pretty=True)
 
+    def fill_content_many(self, content: ContentElement, msg: ACLMessage,
+                          recipients: Sequence[str]) -> List[ACLMessage]:
+        """
+        Encodes the content into `msg` once and returns a copy of it for every recipient, all sharing the body
+        """
+        self.fill_content(content, msg)
+        return [msg.copy_to(jid) for jid in recipients]
+
     def extract_content(self, msg: ACLMessage) -> ContentElement:
         def postprocessor(path: str, key: str, value: str):
             try:
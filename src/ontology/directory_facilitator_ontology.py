@@ -1,4 +1,4 @@
-from typing import Dict, Sequence
+from typing import Dict, Sequence, Optional
 
 from src.ontology.ontology import ContentElement, Ontology, Action
 from src.utils.nested_dataclass import nested_dataclass
@@ -24,18 +24,22 @@ class DFAgentDescription(ContentElement):
 @nested_dataclass
 class SearchServiceRequest(Action):
     request: DFAgentDescription
+    maxResults: Optional[int] = None
+    cursor: Optional[int] = None
     __key__ = 'search-service-request'
 
 
 @nested_dataclass
 class SearchServiceResponse(Action):
     list: Sequence[DFAgentDescription]
+    nextCursor: Optional[int] = None
     __key__ = 'search-service-response'
 
 
 @nested_dataclass
 class RegisterService(Action):
     request: DFAgentDescription
+    leaseDuration: Optional[int] = None
     __key__ = 'register-service-request'
 
 
@@ -45,6 +49,24 @@ class DeregisterService(Action):
     __key__ = 'deregister-service-request'
 
 
+@nested_dataclass
+class RenewLease(Action):
+    agentName: str
+    __key__ = 'renew-lease-request'
+
+
+@nested_dataclass
+class SubscribeExpirations(Action):
+    request: DFAgentDescription
+    __key__ = 'subscribe-expirations-request'
+
+
+@nested_dataclass
+class RegistrationExpired(Action):
+    request: DFAgentDescription
+    __key__ = 'registration-expired'
+
+
 @Singleton
 class DFOntology(Ontology):
     def __init__(self):
@@ -55,3 +77,6 @@ class DFOntology(Ontology):
         self.add(DeregisterService)
         self.add(SearchServiceResponse)
         self.add(SearchServiceRequest)
+        self.add(RenewLease)
+        self.add(SubscribeExpirations)
+        self.add(RegistrationExpired)
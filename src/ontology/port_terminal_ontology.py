@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Sequence, List
+from typing import Sequence, List, Optional
 
 from src.ontology.ontology import Ontology, ContentElement, Action
 from src.utils.nested_dataclass import nested_dataclass
@@ -47,6 +47,7 @@ class SelfDeallocationRequest(Action):
 @dataclass
 class ReallocationRequest(Action):
     slot_id: str
+    container_id: Optional[str] = None
     __key__ = 'reallocation_request'
 
 
@@ -62,6 +63,79 @@ class DeallocationRequest(Action):
     __key__ = 'deallocation_request'
 
 
+@nested_dataclass
+class BatchAllocationRequest(Action):
+    containers: List[ContainerData] = field(default_factory=list)
+    __key__ = 'batch_allocation_request'
+
+
+@dataclass
+class ContainerProposal(ContentElement):
+    container_id: str
+    seconds_from_forced_reallocation_to_departure: int
+    __key__ = 'container_proposal'
+
+
+@nested_dataclass
+class BatchAllocationProposal(ContentElement):
+    slot_id: str
+    free_height: int
+    departure_times: List[str] = field(default_factory=list)
+    proposals: List[ContainerProposal] = field(default_factory=list)
+    __key__ = 'batch_allocation_proposal'
+
+
+@nested_dataclass
+class BatchAllocationAcceptance(ContentElement):
+    containers: List[ContainerData] = field(default_factory=list)
+    __key__ = 'batch_allocation_acceptance'
+
+
+@nested_dataclass
+class BatchAllocationConfirmation(ContentElement):
+    slot_id: str
+    containers_ids: List[str] = field(default_factory=list)
+    __key__ = 'batch_allocation_confirmation'
+
+
+@dataclass
+class MoveReport(ContentElement):
+    slot_id: str
+    placements: int
+    reshuffles: int
+    departures: int
+    __key__ = 'move_report'
+
+
+@nested_dataclass
+class SlotStateChange(ContentElement):
+    slot_id: str
+    version: int
+    containers: List[str] = field(default_factory=list)
+    __key__ = 'slot_state_change'
+
+
+@dataclass
+class SlotCapacity(ContentElement):
+    slot_id: str
+    free_height: int
+    version: int
+    earliest_departure_time: Optional[str] = None
+    __key__ = 'slot_capacity'
+
+
+@dataclass
+class CandidateSlotsRequest(Action):
+    departure_time: str
+    __key__ = 'candidate_slots_request'
+
+
+@nested_dataclass
+class CandidateSlots(ContentElement):
+    slots_jids: List[str] = field(default_factory=list)
+    __key__ = 'candidate_slots'
+
+
 @Singleton
 class PortTerminalOntology(Ontology):
     def __init__(self):
@@ -76,3 +150,13 @@ class PortTerminalOntology(Ontology):
         self.add(ReallocationRequest)
         self.add(ContainersDeallocationRequest)
         self.add(DeallocationRequest)
+        self.add(BatchAllocationRequest)
+        self.add(ContainerProposal)
+        self.add(BatchAllocationProposal)
+        self.add(BatchAllocationAcceptance)
+        self.add(BatchAllocationConfirmation)
+        self.add(MoveReport)
+        self.add(SlotStateChange)
+        self.add(SlotCapacity)
+        self.add(CandidateSlotsRequest)
+        self.add(CandidateSlots)
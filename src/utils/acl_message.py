@@ -1,26 +1,96 @@
+from functools import lru_cache
+from typing import Optional
+
+from aioxmpp import JID
 from spade.message import Message
 
 from src.utils.performative import Performative
 
+_UNPARSED = object()
+
+
+@lru_cache(maxsize=4096)
+def _parse_jid(jid: str) -> JID:
+    return JID.fromstr(jid)
+
 
 class ACLMessage(Message):
+    __slots__ = ('_performative', '_ontology', '_protocol', '_action')
+
     PERFORMATIVE_KEY = 'performative'
     ONTOLOGY_KEY = 'ontology'
     LANGUAGE_KEY = 'language'
     PROTOCOL_KEY = 'protocol'
     ACTION_KEY = 'action'
 
+    def __init__(self, to=None, sender=None, body=None, thread=None, metadata=None):
+        self._performative = _UNPARSED
+        self._ontology = _UNPARSED
+        self._protocol = _UNPARSED
+        self._action = _UNPARSED
+        super().__init__(to, sender, body, thread, metadata)
+
+    @classmethod
+    def from_message(cls, msg: Message) -> 'ACLMessage':
+        if isinstance(msg, ACLMessage):
+            return msg
+        result = cls()
+        result._to = msg.to
+        result._sender = msg.sender
+        result._body = msg.body
+        result._thread = msg.thread
+        result.metadata = dict(msg.metadata)
+        result.sent = msg.sent
+        return result
+
     @property
-    def performative(self) -> Performative:
-        return Performative(int(self.get_metadata(self.PERFORMATIVE_KEY)))
+    def to(self) -> JID:
+        return self._to
+
+    @to.setter
+    def to(self, jid: str):
+        if jid is not None and not isinstance(jid, str):
+            raise TypeError("'to' MUST be a string")
+        self._to = _parse_jid(jid) if jid is not None else None
+
+    @property
+    def sender(self) -> JID:
+        return self._sender
+
+    @sender.setter
+    def sender(self, jid: str):
+        if jid is not None and not isinstance(jid, str):
+            raise TypeError("'sender' MUST be a string")
+        self._sender = _parse_jid(jid) if jid is not None else None
+
+    def set_metadata(self, key: str, value: str):
+        super().set_metadata(key, value)
+        if key == self.PERFORMATIVE_KEY:
+            self._performative = _UNPARSED
+        elif key == self.ONTOLOGY_KEY:
+            self._ontology = value
+        elif key == self.PROTOCOL_KEY:
+            self._protocol = value
+        elif key == self.ACTION_KEY:
+            self._action = value
+
+    @property
+    def performative(self) -> Optional[Performative]:
+        if self._performative is _UNPARSED:
+            value = self.metadata.get(self.PERFORMATIVE_KEY)
+            self._performative = Performative(int(value)) if value is not None else None
+        return self._performative
 
     @performative.setter
     def performative(self, value: Performative):
-        self.set_metadata(self.PERFORMATIVE_KEY, str(value.value))
+        self.metadata[self.PERFORMATIVE_KEY] = str(value.value)
+        self._performative = value
 
     @property
     def ontology(self) -> str:
-        return self.get_metadata(self.ONTOLOGY_KEY)
+        if self._ontology is _UNPARSED:
+            self._ontology = self.metadata.get(self.ONTOLOGY_KEY)
+        return self._ontology
 
     @ontology.setter
     def ontology(self, value: str):
@@ -36,7 +106,9 @@ class ACLMessage(Message):
 
     @property
     def protocol(self) -> str:
-        return self.get_metadata(self.PROTOCOL_KEY)
+        if self._protocol is _UNPARSED:
+            self._protocol = self.metadata.get(self.PROTOCOL_KEY)
+        return self._protocol
 
     @protocol.setter
     def protocol(self, value: str):
@@ -44,15 +116,41 @@ class ACLMessage(Message):
 
     @property
     def action(self) -> str:
-        return self.get_metadata(self.ACTION_KEY)
+        if self._action is _UNPARSED:
+            self._action = self.metadata.get(self.ACTION_KEY)
+        return self._action
 
     @action.setter
     def action(self, value: str):
         self.set_metadata(self.ACTION_KEY, value)
 
+    def copy_to(self, jid: str) -> 'ACLMessage':
+        """
+        Unsent copy of the envelope addressed to `jid`. The body is shared rather than encoded again and the
+        metadata is copied, so the copy can be stamped on its own.
+        """
+        copy = ACLMessage.__new__(ACLMessage)
+        copy.sent = False
+        copy._to = _parse_jid(jid)
+        copy._sender = self._sender
+        copy._body = self._body
+        copy._thread = self._thread
+        copy.metadata = dict(self.metadata)
+        copy._performative = self._performative
+        copy._ontology = self._ontology
+        copy._protocol = self._protocol
+        copy._action = self._action
+        return copy
+
+    def make_reply(self) -> 'ACLMessage':
+        reply = ACLMessage(body=self.body, thread=self.thread, metadata=dict(self.metadata))
+        reply._to = self.sender
+        reply._sender = self.to
+        return reply
+
     def create_reply(self, performative: Performative) -> 'ACLMessage':
-        reply = self.make_reply()
-        reply.__class__ = ACLMessage
+        reply = ACLMessage(thread=self.thread, metadata=dict(self.metadata))
+        reply._to = self.sender
+        reply._sender = self.to
         reply.performative = performative
-        reply.body = None
         return reply
@@ -0,0 +1,111 @@
+import atexit
+import json
+import logging
+import os
+import random
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Optional, Tuple
+
+AGENTS_LOGGER_NAME = 'agents'
+
+_listener: Optional[QueueListener] = None
+_logger: Optional[logging.Logger] = None
+_config: Tuple[Optional[str], int, float] = (None, logging.INFO, 1.0)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'agent': getattr(record, 'agent', None),
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes `sample_rate` of the records below `always_level` and every record at or above it
+    """
+
+    def __init__(self, sample_rate: float = 1.0, always_level: int = logging.WARNING):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.always_level = always_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.always_level or self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    Enqueues the record as it is, formatting happens on the listener thread
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(path: Optional[str] = None, level: int = logging.INFO,
+                      sample_rate: float = 1.0) -> logging.Logger:
+    """
+    Routes the agents logger through a queue to a background thread writing JSON lines to `path` (stdout when None).
+    Records below `level` are dropped by the logger and the rest are sampled before being enqueued.
+    """
+    global _listener, _logger, _config
+    shutdown_logging()
+    _config = (path, level, sample_rate)
+    target = logging.FileHandler(path) if path is not None else logging.StreamHandler(sys.stdout)
+    target.setFormatter(JsonFormatter())
+    queue = SimpleQueue()
+    handler = _RecordQueueHandler(queue)
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    logger = logging.getLogger(AGENTS_LOGGER_NAME)
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = QueueListener(queue, target)
+    _listener.start()
+    _logger = logger
+    return logger
+
+
+def shutdown_logging():
+    """
+    Flushes the queued records and stops the background thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def get_logger() -> logging.Logger:
+    if _listener is None:
+        configure_logging(*_config)
+    return _logger
+
+
+def _forget_listener():
+    """
+    The listener thread doesn't survive a fork, so a forked worker starts its own with the same settings on first use
+    """
+    global _listener
+    _listener = None
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_listener)
@@ -0,0 +1,87 @@
+import multiprocessing
+import signal
+import zlib
+from concurrent.futures import Future, wait
+from queue import Empty
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from spade.agent import Agent
+
+SHARD_POLL_INTERVAL = 0.5
+
+
+class AgentSpec(NamedTuple):
+    """Picklable recipe of an agent; `factory` has to be a module level function."""
+    jid: str
+    factory: Callable[..., Agent]
+    args: Tuple = ()
+
+
+def shard_index(jid: str, shards_count: int) -> int:
+    return zlib.crc32(jid.encode('utf-8')) % shards_count
+
+
+def _run_shard(commands: multiprocessing.Queue):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    agents: List[Agent] = []
+    starting: List[Future] = []
+    while True:
+        try:
+            spec: Optional[AgentSpec] = commands.get(timeout=SHARD_POLL_INTERVAL)
+        except Empty:
+            wait(starting)
+            starting.clear()
+            continue
+        if spec is None:
+            break
+        agent = spec.factory(*spec.args)
+        starting.append(agent.start())
+        agents.append(agent)
+    wait(starting)
+    wait([agent.stop() for agent in agents])
+
+
+class ShardedAgentPool:
+    """
+    Hosts many agents per worker process, all of them sharing the SPADE event loop of their worker.
+    Agents are assigned to workers by a stable hash of their jid. The pool has to be started
+    before any agent is created in the parent process, so workers do not inherit its event loop.
+    """
+
+    def __init__(self, workers_count: Optional[int] = None):
+        self._workers_count: int = workers_count or multiprocessing.cpu_count()
+        self._queues: List[multiprocessing.Queue] = []
+        self._workers: List[multiprocessing.Process] = []
+
+    @property
+    def workers_count(self) -> int:
+        return self._workers_count
+
+    def start(self):
+        for i in range(self._workers_count):
+            commands = multiprocessing.Queue()
+            worker = multiprocessing.Process(target=_run_shard, args=(commands,), name=f'agent_shard_{i}',
+                                             daemon=True)
+            worker.start()
+            self._queues.append(commands)
+            self._workers.append(worker)
+
+    def submit(self, spec: AgentSpec):
+        self._queues[shard_index(spec.jid, self._workers_count)].put(spec)
+
+    def shutdown(self, timeout: Optional[float] = None):
+        for commands in self._queues:
+            commands.put(None)
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+        self._queues.clear()
+        self._workers.clear()
+
+    def __enter__(self) -> 'ShardedAgentPool':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
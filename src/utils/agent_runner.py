@@ -0,0 +1,94 @@
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from time import perf_counter
+from typing import Dict, List, Optional, TypeVar
+
+from spade.agent import Agent
+
+DEFAULT_MAX_PARALLEL = 32
+DEFAULT_READY_TIMEOUT = 60.0
+
+A = TypeVar('A', bound=Agent)
+
+
+class AgentRunner:
+    """
+    Starts and stops the agents of a run from the main thread, up to `max_parallel` at a time instead of one after
+    another. `wait_ready` is the barrier between the stages of a run, e.g. slot managers registered with the DF
+    before containers search for them.
+    """
+
+    def __init__(self, max_parallel: int = DEFAULT_MAX_PARALLEL, timeout: Optional[float] = DEFAULT_READY_TIMEOUT):
+        self._max_parallel = max_parallel
+        self._timeout = timeout
+        self._agents: List[Agent] = []
+        self._unready: List[Agent] = []
+        self._starting: Dict[Future, Agent] = {}
+        self._started_at: Optional[float] = None
+        self._ready_at: Optional[float] = None
+
+    @property
+    def agents(self) -> List[Agent]:
+        return list(self._agents)
+
+    @property
+    def startup_seconds(self) -> float:
+        """
+        Time from the first start to the last barrier passed
+        """
+        if self._started_at is None or self._ready_at is None:
+            return 0.0
+        return self._ready_at - self._started_at
+
+    def start(self, agent: A) -> A:
+        """
+        Starts the agent without waiting for it, unless `max_parallel` agents are still starting
+        """
+        if self._started_at is None:
+            self._started_at = perf_counter()
+        while len(self._starting) >= self._max_parallel:
+            done, _ = wait(list(self._starting), self._timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError(f'No agent started within {self._timeout} seconds')
+            self._finish_starts(done)
+        self._starting[agent.start()] = agent
+        self._agents.append(agent)
+        self._unready.append(agent)
+        return agent
+
+    def wait_ready(self) -> float:
+        """
+        Blocks until every agent started since the previous barrier is ready and returns the startup time so far
+        """
+        done, not_done = wait(list(self._starting), self._timeout)
+        self._finish_starts(done)
+        if not_done:
+            raise TimeoutError(f'{len(not_done)} agents did not start within {self._timeout} seconds')
+        for agent in self._unready:
+            wait_ready = getattr(agent, 'wait_ready', None)
+            if wait_ready is not None and not wait_ready(self._timeout):
+                raise TimeoutError(f'Agent {agent.jid} was not ready within {self._timeout} seconds')
+        self._unready.clear()
+        self._ready_at = perf_counter()
+        return self.startup_seconds
+
+    def stop_all(self):
+        """
+        Stops the agents started so far, `max_parallel` at a time, the latest started first
+        """
+        wait(list(self._starting), self._timeout)
+        self._starting.clear()
+        stopping: List[Future] = []
+        for agent in reversed(self._agents):
+            if len(stopping) >= self._max_parallel:
+                _, not_done = wait(stopping, self._timeout, return_when=FIRST_COMPLETED)
+                stopping = list(not_done)
+            if agent.is_alive():
+                stopping.append(agent.stop())
+        wait(stopping, self._timeout)
+        self._agents.clear()
+        self._unready.clear()
+
+    def _finish_starts(self, futures):
+        for future in futures:
+            self._starting.pop(future)
+            future.result()
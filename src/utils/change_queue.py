@@ -0,0 +1,45 @@
+import asyncio
+from collections import deque
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class ChangeQueue(Generic[T]):
+    """
+    Bounded queue for the agent loop which never blocks the producer: once full, putting an item drops the oldest
+    one. Suits changes that carry a full state, where a newer change supersedes the dropped ones.
+    """
+
+    def __init__(self, maxsize: int):
+        self._items = deque(maxlen=maxsize)
+        self._dropped = 0
+        self._not_empty: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def put_nowait(self, item: T):
+        if len(self._items) == self._items.maxlen:
+            self._dropped += 1
+        self._items.append(item)
+        if self._not_empty is not None:
+            self._not_empty.set()
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[T]:
+        """
+        Returns the oldest item, or None when nothing arrives within `timeout` seconds
+        """
+        if self._not_empty is None:
+            self._not_empty = asyncio.Event()
+        if not self._items:
+            self._not_empty.clear()
+            try:
+                await asyncio.wait_for(self._not_empty.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        return self._items.popleft()
@@ -3,3 +3,7 @@ from aioxmpp import JID
 
 def jid_to_str(jid: JID) -> str:
     return f'{jid.localpart}@{jid.domain}{f"{jid.resource}" if jid.resource is not None else ""}'
+
+
+def jid_localpart(jid: str) -> str:
+    return jid.split('@', 1)[0]
@@ -0,0 +1,104 @@
+import atexit
+import json
+import os
+from queue import SimpleQueue
+from threading import Thread
+from time import perf_counter
+from typing import Dict, Iterator, Optional
+
+from src.utils.acl_message import ACLMessage
+from src.utils.singleton import Singleton
+
+RECEIVED = 'in'
+SENT = 'out'
+
+
+def _to_record(direction: str, agent: str, msg: ACLMessage, time: float) -> Dict:
+    return {
+        't': round(time, 6),
+        'd': direction,
+        'a': agent,
+        'to': str(msg.to) if msg.to is not None else None,
+        'from': str(msg.sender) if msg.sender is not None else None,
+        'th': msg.thread,
+        'md': dict(msg.metadata),
+        'b': msg.body
+    }
+
+
+def to_message(record: Dict) -> ACLMessage:
+    return ACLMessage(to=record['to'], sender=record['from'], body=record['b'], thread=record['th'],
+                      metadata=dict(record['md']))
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+@Singleton
+class MessageRecorder:
+    """
+    Appends the messages agents receive and their cyclic behaviours send to a JSON lines file, one compact record
+    per message with the seconds since recording started, from a background thread. Disabled by default. Logs can
+    be fed back into an agent with `src.benchmark.replay`.
+    """
+
+    def __init__(self):
+        self._path: Optional[str] = None
+        self._queue: Optional[SimpleQueue] = None
+        self._writer: Optional[Thread] = None
+        self._pid: Optional[int] = None
+        self._started_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._path is not None
+
+    def enable(self, path: str):
+        self.disable()
+        self._path = path
+        self._started_at = perf_counter()
+        self._start_writer()
+
+    def disable(self):
+        if self._writer is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join()
+        self._path = None
+        self._writer = None
+
+    def message_received(self, agent: str, msg: ACLMessage):
+        if self._path is not None:
+            self._record(RECEIVED, agent, msg)
+
+    def message_sent(self, agent: str, msg: ACLMessage):
+        if self._path is not None:
+            self._record(SENT, agent, msg)
+
+    def _record(self, direction: str, agent: str, msg: ACLMessage):
+        if self._pid != os.getpid():
+            self._start_writer()
+        self._queue.put(_to_record(direction, agent, msg, perf_counter() - self._started_at))
+
+    def _start_writer(self):
+        self._queue = SimpleQueue()
+        self._pid = os.getpid()
+        self._writer = Thread(target=self._write_records, args=(self._path, self._queue), daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _write_records(path: str, queue: SimpleQueue):
+        with open(path, 'a') as file:
+            while True:
+                record = queue.get()
+                if record is None:
+                    return
+                file.write(json.dumps(record, separators=(',', ':')) + '\n')
+                if queue.empty():
+                    file.flush()
+
+
+atexit.register(lambda: MessageRecorder.instance().disable())
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+from spade.behaviour import CyclicBehaviour
+from spade.template import Template
+
+from src.utils.acl_message import ACLMessage
+
+RouteKey = Tuple[Optional[str], Optional[str], Optional[str]]
+Route = Tuple[CyclicBehaviour, Tuple[Tuple[str, str], ...]]
+_KEYED_METADATA = (ACLMessage.PROTOCOL_KEY, ACLMessage.ACTION_KEY)
+
+
+def route_key(template: Template) -> Optional[RouteKey]:
+    """
+    Returns the (protocol, action, thread) key of a plain template, None is a wildcard. Composite templates,
+    templates matching on addresses or body and templates that constrain none of the keyed fields can't be indexed.
+    """
+    if type(template) is not Template or template.to or template.sender or template.body:
+        return None
+    key = (template.get_metadata(ACLMessage.PROTOCOL_KEY), template.get_metadata(ACLMessage.ACTION_KEY),
+           template.thread)
+    if key == (None, None, None):
+        return None
+    return key
+
+
+def _with_wildcard(value: Optional[str]) -> Tuple[Optional[str], ...]:
+    return (value, None) if value is not None else (None,)
+
+
+class MessageRouter:
+    """
+    Index of behaviours by the (protocol, action, thread) of their templates. An inbound message is checked against
+    the behaviours in the buckets of its own key and its wildcard variants only, plus the behaviours whose templates
+    can't be indexed.
+    """
+
+    def __init__(self):
+        self._routes: Dict[RouteKey, List[Route]] = defaultdict(list)
+        self._keys: Dict[CyclicBehaviour, RouteKey] = {}
+        self._unindexed: List[CyclicBehaviour] = []
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._unindexed)
+
+    def add(self, behaviour: CyclicBehaviour, template: Optional[Template]):
+        key = route_key(template) if template is not None else None
+        if key is None:
+            self._unindexed.append(behaviour)
+        else:
+            self._keys[behaviour] = key
+            remaining_metadata = tuple((k, v) for k, v in template.metadata.items() if k not in _KEYED_METADATA)
+            self._routes[key].append((behaviour, remaining_metadata))
+
+    def remove(self, behaviour: CyclicBehaviour):
+        key = self._keys.pop(behaviour, None)
+        if key is None:
+            if behaviour in self._unindexed:
+                self._unindexed.remove(behaviour)
+            return
+        bucket = [route for route in self._routes[key] if route[0] is not behaviour]
+        if bucket:
+            self._routes[key] = bucket
+        else:
+            del self._routes[key]
+
+    def match(self, msg: ACLMessage) -> List[CyclicBehaviour]:
+        matched = [behaviour for behaviour in self._unindexed if behaviour.match(msg)]
+        if not self._routes:
+            return matched
+        for key in product(_with_wildcard(msg.protocol), _with_wildcard(msg.action), _with_wildcard(msg.thread)):
+            bucket = self._routes.get(key)
+            if bucket is not None:
+                matched.extend(behaviour for behaviour, remaining_metadata in bucket
+                               if all(msg.get_metadata(k) == v for k, v in remaining_metadata))
+        return matched
@@ -0,0 +1,151 @@
+import bisect
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple, Optional
+
+from src.utils.acl_message import ACLMessage
+from src.utils.singleton import Singleton
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        for label_values, value in list(self._values.items()):
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *label_values: str):
+        counts = self._counts.get(label_values)
+        if counts is None:
+            counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[label_values] = self._sums.get(label_values, 0.0) + value
+
+    def count(self, *label_values: str) -> int:
+        return sum(self._counts.get(label_values, ()))
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for label_values, counts in list(self._counts.items()):
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if upper_bound == float('inf') else repr(upper_bound)
+                labels = _format_labels(self.label_names, label_values, f'le="{le}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {self._sums[label_values]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+@Singleton
+class MetricsRegistry:
+    """
+    Process wide metrics of the agents sharing the SPADE container loop. Recording is a single flag check while
+    disabled, which is the default.
+    """
+
+    def __init__(self):
+        self._enabled = False
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def enable(self):
+        self._enabled = True
+
+    def disable(self):
+        self._enabled = False
+
+    def reset(self):
+        self.messages_sent = Counter('agent_messages_sent_total', 'Messages sent by behaviours',
+                                     ['performative', 'action'])
+        self.messages_received = Counter('agent_messages_received_total', 'Messages dispatched to agents',
+                                         ['performative', 'action'])
+        self.contract_net_latency = Histogram('contract_net_round_seconds',
+                                              'Time from sending CFPs to the last result notification', ['action'])
+        self.request_latency = Histogram('request_round_seconds',
+                                         'Time from sending requests to the last result notification', ['action'])
+        self.lock_wait = Histogram('agent_lock_wait_seconds', 'Time spent waiting for the agent lock', ['agent'])
+        self.mailbox_wait = Histogram('behaviour_mailbox_wait_seconds',
+                                      'Time messages spent in behaviour mailboxes by priority class', ['priority'])
+        self.truck_service = Histogram('truck_service_seconds',
+                                       'Time from a truck requesting its containers to the last one delivered')
+
+    @property
+    def metrics(self) -> Sequence:
+        return [self.messages_sent, self.messages_received, self.contract_net_latency, self.request_latency,
+                self.lock_wait, self.mailbox_wait, self.truck_service]
+
+    def message_sent(self, msg: ACLMessage):
+        if self._enabled:
+            self.messages_sent.inc(_performative_name(msg), msg.action or '')
+
+    def message_received(self, msg: ACLMessage):
+        if self._enabled:
+            self.messages_received.inc(_performative_name(msg), msg.action or '')
+
+    def mailbox_waited(self, seconds: float, priority: str):
+        if self._enabled:
+            self.mailbox_wait.observe(seconds, priority)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _performative_name(msg: ACLMessage) -> str:
+    performative = msg.performative
+    return performative.name if performative is not None else ''
+
+
+class Stopwatch:
+    """
+    Measures the time elapsed since it was created, or nothing when the metrics are disabled
+    """
+    __slots__ = ('_started_at',)
+
+    def __init__(self):
+        self._started_at: Optional[float] = perf_counter() if MetricsRegistry.instance().enabled else None
+
+    def observe(self, histogram: Histogram, *label_values: str):
+        if self._started_at is not None:
+            histogram.observe(perf_counter() - self._started_at, *label_values)
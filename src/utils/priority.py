@@ -0,0 +1,145 @@
+import asyncio
+from collections import deque
+from enum import IntEnum
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Tuple
+
+from src.ontology.port_terminal_ontology import DeallocationRequest, SelfDeallocationRequest, \
+    ContainersDeallocationRequest, ReallocationRequest
+from src.utils.acl_message import ACLMessage
+from src.utils.metrics import MetricsRegistry
+
+PRIORITY_KEY = 'priority'
+DEFAULT_MAX_WAIT = 5.0
+
+
+class Priority(IntEnum):
+    """
+    Priority classes, lower goes first
+    """
+    DEALLOCATION = 0
+    REALLOCATION = 1
+    ALLOCATION = 2
+    BACKGROUND = 3
+
+
+class MessagePriorities:
+    """
+    Priority class of a message: the one it carries in its `priority` metadata, else the one configured for its
+    (protocol, action), then for its action with any protocol (None), else `default`
+    """
+
+    def __init__(self, classes: Dict[Tuple[Optional[str], str], int], default: int = Priority.ALLOCATION):
+        self._classes = classes
+        self._default = default
+
+    def of(self, msg: ACLMessage) -> int:
+        value = msg.get_metadata(PRIORITY_KEY)
+        if value is not None:
+            return int(value)
+        action = msg.action
+        priority = self._classes.get((msg.protocol, action))
+        if priority is None:
+            priority = self._classes.get((None, action), self._default)
+        return priority
+
+
+PORT_TERMINAL_PRIORITIES = MessagePriorities({
+    (None, ContainersDeallocationRequest.__key__): Priority.DEALLOCATION,
+    (None, DeallocationRequest.__key__): Priority.DEALLOCATION,
+    (None, SelfDeallocationRequest.__key__): Priority.DEALLOCATION,
+    (None, ReallocationRequest.__key__): Priority.REALLOCATION
+})
+
+
+def set_priority(msg: ACLMessage, priority: int):
+    msg.set_metadata(PRIORITY_KEY, str(int(priority)))
+
+
+class PriorityMailbox(asyncio.Queue):
+    """
+    Mailbox of a behaviour serving messages by priority class, in arrival order within a class. A message which
+    waited `max_wait` seconds is served before the higher classes, so a burst of those can't starve it.
+
+    Like asyncio.PriorityQueue it only changes how the queue stores and takes items, the other arguments go to
+    asyncio.Queue.
+    """
+
+    def __init__(self, priorities: MessagePriorities, max_wait: float = DEFAULT_MAX_WAIT, **kwargs):
+        self._priorities = priorities
+        self._max_wait = max_wait
+        super().__init__(**kwargs)
+
+    def _init(self, maxsize: int):
+        self._classes: Dict[int, Deque[Tuple[float, ACLMessage]]] = {}
+        self._size = 0
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def _put(self, msg: ACLMessage):
+        priority = self._priorities.of(ACLMessage.from_message(msg))
+        messages = self._classes.get(priority)
+        if messages is None:
+            messages = self._classes[priority] = deque()
+        messages.append((monotonic(), msg))
+        self._size += 1
+
+    def _get(self) -> ACLMessage:
+        now = monotonic()
+        waiting = [priority for priority in sorted(self._classes) if self._classes[priority]]
+        overdue = [priority for priority in waiting if now - self._classes[priority][0][0] >= self._max_wait]
+        chosen = min(overdue, key=lambda priority: self._classes[priority][0][0]) if overdue else waiting[0]
+        received_at, msg = self._classes[chosen].popleft()
+        self._size -= 1
+        MetricsRegistry.instance().mailbox_waited(now - received_at, _priority_name(chosen))
+        return msg
+
+
+def _priority_name(priority: int) -> str:
+    return Priority(priority).name if priority in Priority.__members__.values() else str(priority)
+
+
+class PriorityLock:
+    """
+    asyncio.Lock handed over on release to the waiter with the best priority class. Waiting `max_wait` seconds
+    promotes a waiter by one class, so low classes still get the lock under a steady stream of high ones.
+    """
+
+    def __init__(self, max_wait: float = DEFAULT_MAX_WAIT):
+        self._max_wait = max_wait
+        self._locked = False
+        self._waiters: List[Tuple[int, float, asyncio.Future]] = []
+
+    def locked(self) -> bool:
+        return self._locked
+
+    async def acquire(self, priority: int = Priority.ALLOCATION) -> bool:
+        if not self._locked and not self._waiters:
+            self._locked = True
+            return True
+        waiter = (priority, monotonic(), asyncio.get_event_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await waiter[2]
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif not waiter[2].cancelled():
+                self.release()
+            raise
+        return True
+
+    def release(self):
+        if not self._locked:
+            raise RuntimeError('Lock is not acquired.')
+        if not self._waiters:
+            self._locked = False
+            return
+        now = monotonic()
+        waiter = min(self._waiters, key=lambda w: (w[0] - (now - w[1]) / self._max_wait, w[1]))
+        self._waiters.remove(waiter)
+        waiter[2].set_result(True)
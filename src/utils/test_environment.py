@@ -1,9 +1,11 @@
 import random
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from threading import Lock
 from typing import List, Sequence
 
+from src.allocation.optimal_moves import SolverResult, prepare_scenario, solve_min_moves, moves_lower_bound, \
+    DEFAULT_NODE_LIMIT
+from src.allocation.stacking_policy import StackingPolicy
 from src.utils.singleton import Singleton
 
 
@@ -36,15 +38,12 @@ class TestEnvironment:
         self._max_slot_height = 0
         self._slot_count = 0
         self._container_count = 0
-        self._container_move_count = 0
-        self._lock = Lock()
 
     def setup(self, domain: str, max_slot_height: int, slot_count: int, container_count):
         self._domain = domain
         self._max_slot_height = max_slot_height
         self._slot_count = slot_count
         self._container_count = container_count
-        self._container_move_count = 0
 
     def prepare_test(self, max_containers_in_batch):
         containers = []
@@ -66,11 +65,21 @@ class TestEnvironment:
 
         return containers
 
-    def increment_moves_counter(self):
-        self._lock.acquire()
-        self._container_move_count += 1
-        print(f"Current moves count: {self._container_move_count}")
-        self._lock.release()
+    def prepare_trucks(self, containers_data: List[ContainerData], max_containers_per_truck: int) -> List[TruckData]:
+        """
+        Groups containers departing one after another into trucks of up to `max_containers_per_truck` containers.
+        Containers leave with their truck, so their departure time becomes the truck's, the latest of the group.
+        """
+        departing_containers = sorted(containers_data, key=_sort_by_departure)
+        trucks = []
+        while departing_containers:
+            truck_containers = departing_containers[:random.randint(1, max_containers_per_truck)]
+            departing_containers = departing_containers[len(truck_containers):]
+            departure_time = truck_containers[-1].departure_time
+            for container in truck_containers:
+                container.departure_time = departure_time
+            trucks.append(TruckData(len(trucks), departure_time, [container.jid for container in truck_containers]))
+        return trucks
 
     def get_moves_count_for_naive_method(self, containers_data: List[ContainerData]):
         slots: List[List[ContainerData]] = [[] for i in range(self._slot_count)]
@@ -107,6 +116,47 @@ class TestEnvironment:
 
         return moves
 
+    def get_moves_count_for_policy(self, containers_data: List[ContainerData], policy: StackingPolicy) -> int:
+        """
+        Moves of the slots placing every arriving and relocated container on the stack the policy scores best,
+        played in the order the optimal solver uses
+        """
+        scenario = prepare_scenario([c.arrival_time for c in containers_data],
+                                    [c.departure_time for c in containers_data])
+        slots: List[List[int]] = [[] for _ in range(self._slot_count)]
+
+        def place(rank: int, not_to_slot: int = -1):
+            candidates = [slot_id for slot_id in range(self._slot_count)
+                          if len(slots[slot_id]) < self._max_slot_height and slot_id != not_to_slot]
+            if not candidates:
+                raise ValueError('No slot has room for the container')
+            best_slot_id = min(candidates, key=lambda slot_id: policy.score(
+                [scenario.departures[other] for other in slots[slot_id]], scenario.departures[rank],
+                self._max_slot_height))
+            slots[best_slot_id].append(rank)
+
+        moves = 0
+        for event in scenario.events:
+            if event.arrival:
+                place(event.rank)
+                moves += 1
+                continue
+            slot_id = next(slot_id for slot_id, slot in enumerate(slots) if event.rank in slot)
+            while slots[slot_id][-1] != event.rank:
+                place(slots[slot_id].pop(), slot_id)
+                moves += 1
+            slots[slot_id].pop()
+            moves += 1
+        return moves
+
+    def get_min_moves(self, containers_data: List[ContainerData], node_limit: int = DEFAULT_NODE_LIMIT) -> SolverResult:
+        return solve_min_moves([c.arrival_time for c in containers_data], [c.departure_time for c in containers_data],
+                               self._slot_count, self._max_slot_height, node_limit)
+
+    def get_moves_lower_bound(self, containers_data: List[ContainerData]) -> int:
+        return moves_lower_bound([c.arrival_time for c in containers_data], [c.departure_time for c in containers_data],
+                                 self._slot_count)
+
     def _allocate_container(self, slots, container, not_to_slot=-1):
         new_slot_id = 0
         while len(slots[new_slot_id]) >= self._max_slot_height or new_slot_id == not_to_slot:
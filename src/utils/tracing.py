@@ -0,0 +1,174 @@
+import atexit
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from queue import SimpleQueue
+from threading import Thread
+from typing import Optional, NamedTuple, Dict, Any
+
+from src.utils.acl_message import ACLMessage
+from src.utils.singleton import Singleton
+
+TRACE_ID_KEY = 'trace_id'
+SPAN_ID_KEY = 'span_id'
+INSTRUMENTATION_SCOPE = 'port-terminal'
+
+
+class SpanKind(IntEnum):
+    """
+    OTLP span kinds
+    """
+    INTERNAL = 1
+    SERVER = 2
+    CLIENT = 3
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+
+
+class Span:
+    __slots__ = ('name', 'service', 'context', 'parent_span_id', 'kind', 'attributes', 'start_time', 'end_time')
+
+    def __init__(self, name: str, service: str, parent: Optional[SpanContext], kind: SpanKind,
+                 attributes: Dict[str, Any]):
+        self.name = name
+        self.service = service
+        trace_id = parent.trace_id if parent is not None else f'{random.getrandbits(128):032x}'
+        self.context = SpanContext(trace_id, f'{random.getrandbits(64):016x}')
+        self.parent_span_id = parent.span_id if parent is not None else None
+        self.kind = kind
+        self.attributes = attributes
+        self.start_time = time.time_ns()
+        self.end_time: Optional[int] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def end(self):
+        self.end_time = time.time_ns()
+        Tracer.instance().export(self)
+
+    def to_otlp(self) -> Dict:
+        span = {
+            'traceId': self.context.trace_id,
+            'spanId': self.context.span_id,
+            'name': self.name,
+            'kind': int(self.kind),
+            'startTimeUnixNano': str(self.start_time),
+            'endTimeUnixNano': str(self.end_time),
+            'attributes': [{'key': key, 'value': {'stringValue': str(value)}}
+                           for key, value in self.attributes.items()]
+        }
+        if self.parent_span_id is not None:
+            span['parentSpanId'] = self.parent_span_id
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service}}]},
+            'scopeSpans': [{'scope': {'name': INSTRUMENTATION_SCOPE}, 'spans': [span]}]
+        }]}
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+
+
+@Singleton
+class Tracer:
+    """
+    Writes finished spans as OTLP JSON lines, one span per line, from a background thread. The file can be loaded
+    by an OpenTelemetry collector with the otlpjsonfile receiver. Disabled by default.
+    """
+
+    def __init__(self):
+        self._path: Optional[str] = None
+        self._queue: Optional[SimpleQueue] = None
+        self._writer: Optional[Thread] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self._path is not None
+
+    def enable(self, path: str):
+        self.disable()
+        self._path = path
+        self._start_writer()
+
+    def disable(self):
+        if self._writer is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._writer.join()
+        self._path = None
+        self._writer = None
+
+    def export(self, span: Span):
+        if self._path is None:
+            return
+        if self._pid != os.getpid():
+            self._start_writer()
+        self._queue.put(span)
+
+    def _start_writer(self):
+        self._queue = SimpleQueue()
+        self._pid = os.getpid()
+        self._writer = Thread(target=self._write_spans, args=(self._path, self._queue), daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _write_spans(path: str, queue: SimpleQueue):
+        with open(path, 'a') as file:
+            while True:
+                span = queue.get()
+                if span is None:
+                    return
+                file.write(json.dumps(span.to_otlp()) + '\n')
+                if queue.empty():
+                    file.flush()
+
+
+def current_span_context() -> Optional[SpanContext]:
+    span = _current_span.get()
+    return span.context if span is not None else None
+
+
+def extract(msg: ACLMessage) -> Optional[SpanContext]:
+    trace_id = msg.get_metadata(TRACE_ID_KEY)
+    span_id = msg.get_metadata(SPAN_ID_KEY)
+    if trace_id is None or span_id is None:
+        return None
+    return SpanContext(trace_id, span_id)
+
+
+def inject(msg: ACLMessage):
+    """
+    Stamps the message with the current span, replacing the one a reply copied from the request
+    """
+    span = _current_span.get()
+    if span is not None:
+        msg.set_metadata(TRACE_ID_KEY, span.context.trace_id)
+        msg.set_metadata(SPAN_ID_KEY, span.context.span_id)
+
+
+@contextmanager
+def start_span(name: str, service: str, parent: Optional[SpanContext] = None, kind: SpanKind = SpanKind.INTERNAL,
+               **attributes):
+    """
+    Makes a new span the current one for the block and exports it at the end. Yields None when tracing is disabled.
+    """
+    if not Tracer.instance().enabled:
+        yield None
+        return
+    span = Span(name, service, parent, kind, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+atexit.register(lambda: Tracer.instance().disable())
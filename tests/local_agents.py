@@ -0,0 +1,119 @@
+"""
+Runs agents on the SPADE container loop without an XMPP server, messages between them are delivered by the container
+"""
+import asyncio
+from datetime import datetime
+from typing import Coroutine, Any, List, Optional, Sequence
+
+from spade.container import Container
+from spade.template import Template
+
+from src.agents.container_agent import ContainerAgent, DeallocationResponder, ReallocationResponder, SlotJid
+from src.agents.slot_manager_agent import SlotManagerAgent, AllocationResponder, SelfDeallocationResponder
+from src.agents.yard_state_agent import YardStateAgent, CandidateSlotsResponder
+from src.ontology.port_terminal_ontology import AllocationRequest, CandidateSlotsRequest, DeallocationRequest, \
+    ReallocationRequest, SelfDeallocationRequest
+from src.utils.priority import PriorityLock
+
+DEFAULT_TIMEOUT = 10.0
+
+
+class OfflineClient:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, stanza):
+        self.sent.append(stanza)
+
+    def stop(self):
+        pass
+
+
+def run(coro: Coroutine, timeout: float = DEFAULT_TIMEOUT) -> Any:
+    return asyncio.run_coroutine_threadsafe(coro, Container().loop).result(timeout)
+
+
+async def start(agent):
+    agent.client = OfflineClient()
+    await agent.setup()
+    agent._alive.set()
+    for behaviour in agent.behaviours:
+        if not behaviour.is_running:
+            behaviour.start()
+    return agent
+
+
+async def stop(*agents):
+    for agent in agents:
+        for behaviour in list(agent.behaviours):
+            behaviour.kill()
+        agent._alive.clear()
+        agent.container.unregister(agent.jid)
+
+
+class LocalYardState(YardStateAgent):
+    """
+    Offers the given slots as candidates, whatever room they have
+    """
+
+    def __init__(self, jid: str, candidates: Sequence[str]):
+        super().__init__(jid, 'x')
+        self._candidates = candidates
+
+    async def setup(self):
+        candidate_slots_mt = Template()
+        candidate_slots_mt.set_metadata('protocol', 'Request')
+        candidate_slots_mt.set_metadata('action', CandidateSlotsRequest.__key__)
+        self.add_behaviour(CandidateSlotsResponder(), candidate_slots_mt)
+
+    def candidate_slots(self, departure_time: datetime) -> List[str]:
+        return list(self._candidates)
+
+
+class LocalSlot(SlotManagerAgent):
+    """
+    A slot manager serving allocations and departures without registering with the DF, placing a container takes
+    `placement_delay` seconds
+    """
+
+    def __init__(self, jid: str, slot_id: str, max_height: int, placement_delay: float = 0.0,
+                 yard_state_jid: Optional[str] = None):
+        super().__init__(jid, 'x', slot_id, max_height, yard_state_jid=yard_state_jid)
+        self._placement_delay = placement_delay
+
+    async def setup(self):
+        self._lock = PriorityLock()
+        allocation_mt = Template()
+        allocation_mt.set_metadata('protocol', 'ContractNet')
+        allocation_mt.set_metadata('action', AllocationRequest.__key__)
+        self_deallocation_mt = Template()
+        self_deallocation_mt.set_metadata('protocol', 'Request')
+        self_deallocation_mt.set_metadata('action', SelfDeallocationRequest.__key__)
+        self.add_behaviour(AllocationResponder(), allocation_mt)
+        self.add_behaviour(SelfDeallocationResponder(), self_deallocation_mt)
+
+    async def add_container(self, container_id: str, departure_time: str, container_agent_jid: str):
+        await asyncio.sleep(self._placement_delay)
+        await super().add_container(container_id, departure_time, container_agent_jid)
+
+
+class LocalContainer(ContainerAgent):
+    """
+    A container placed in `slot_id` which knows the given slots without asking the DF
+    """
+
+    def __init__(self, jid: str, departure_time: datetime, slot_id: str, slots: Sequence[SlotJid]):
+        super().__init__(jid, 'x', departure_time)
+        self.slot_id = slot_id
+        self.add_slot_managers(slots)
+
+    async def setup(self):
+        self._lock = PriorityLock()
+        reallocation_mt = Template()
+        reallocation_mt.set_metadata('protocol', 'Request')
+        reallocation_mt.set_metadata('action', ReallocationRequest.__key__)
+        deallocation_mt = Template()
+        deallocation_mt.set_metadata('protocol', 'Request')
+        deallocation_mt.set_metadata('action', DeallocationRequest.__key__)
+        self.add_behaviour(DeallocationResponder(), deallocation_mt)
+        self.add_behaviour(ReallocationResponder(), reallocation_mt)
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+try:
+    from src.agents.container_agent import SlotJid
+    from src.agents.container_allocator_agent import ContainerAllocatorAgent, ContainerRecord
+    from tests.local_agents import run, start, stop, LocalSlot, LocalYardState
+except Exception as e:
+    pytest.skip(f'agents cannot run here: {e}', allow_module_level=True)
+
+PLACEMENT_DELAY = 0.3
+
+
+def test_join_waits_for_the_retry_of_skipped_slots():
+    async def scenario():
+        full_slot = await start(LocalSlot('retry_full@localhost', '0', 0))
+        free_slot = await start(LocalSlot('retry_free@localhost', '1', 1, PLACEMENT_DELAY))
+        yard_state = await start(LocalYardState('retry_yard@localhost', ['retry_full@localhost']))
+        allocator = await start(ContainerAllocatorAgent('retry_allocator@localhost', 'x',
+                                                        yard_state_jid='retry_yard@localhost'))
+        allocator.set_slot_managers([SlotJid('0', 'retry_full@localhost'), SlotJid('1', 'retry_free@localhost')])
+        record = ContainerRecord('c0', datetime.now() + timedelta(hours=1))
+        try:
+            await allocator.run_allocation(record, False)
+            return record.slot_id, free_slot.containers
+        finally:
+            await stop(full_slot, free_slot, yard_state, allocator)
+
+    slot_id, containers = run(scenario())
+    assert str(slot_id) == '1'
+    assert containers == ['c0']
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+try:
+    from src.agents.base_agent import BaseAgent
+    from src.behaviours.base_cyclic_behaviour import BaseCyclicBehaviour
+    from src.utils.acl_message import ACLMessage
+    from tests.local_agents import run, start, stop
+except Exception as e:
+    pytest.skip(f'agents cannot run here: {e}', allow_module_level=True)
+
+
+class Steps(BaseCyclicBehaviour):
+    def __init__(self, steps: int, error: Exception = None):
+        super().__init__()
+        self.steps = steps
+        self.runs = 0
+        self.error = error
+
+    async def run(self):
+        self.runs += 1
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+
+    def _done(self) -> bool:
+        return self.runs >= self.steps
+
+
+class Receiver(BaseCyclicBehaviour):
+    def __init__(self, timeout=None):
+        super().__init__()
+        self.timeout = timeout
+        self.received = []
+
+    async def run(self):
+        self.received.append(await self.wait_for_message(self.timeout))
+
+
+def agent(name: str) -> BaseAgent:
+    return BaseAgent(f'{name}@localhost', 'x')
+
+
+def test_join_waits_for_every_step():
+    async def scenario():
+        owner = await start(agent('join_steps'))
+        behaviour = Steps(3)
+        owner.add_behaviour(behaviour)
+        await behaviour.join(5)
+        await stop(owner)
+        return behaviour.runs
+
+    assert run(scenario()) == 3
+
+
+def test_join_raises_the_error_of_run():
+    async def scenario():
+        owner = await start(agent('join_error'))
+        behaviour = Steps(3, ValueError('Container is not allocated'))
+        owner.add_behaviour(behaviour)
+        try:
+            await behaviour.join(5)
+        finally:
+            await stop(owner)
+
+    with pytest.raises(ValueError, match='not allocated'):
+        run(scenario())
+
+
+def test_join_after_finish_returns_at_once():
+    async def scenario():
+        owner = await start(agent('join_late'))
+        behaviour = Steps(1)
+        owner.add_behaviour(behaviour)
+        await behaviour.join(5)
+        await behaviour.join(0.1)
+        await stop(owner)
+
+    run(scenario())
+
+
+def test_kill_wakes_a_waiting_behaviour():
+    async def scenario():
+        owner = await start(agent('kill_wait'))
+        behaviour = Receiver()
+        owner.add_behaviour(behaviour)
+        await asyncio.sleep(0.05)
+        loop = asyncio.get_event_loop()
+        started = loop.time()
+        behaviour.kill()
+        await behaviour.join(5)
+        await stop(owner)
+        return loop.time() - started, behaviour.received
+
+    elapsed, received = run(scenario())
+    assert elapsed < 0.5
+    assert received == [None]
+
+
+def test_wait_for_message_returns_the_message_or_none_after_timeout():
+    async def scenario():
+        owner = await start(agent('wait_message'))
+        behaviour = Receiver(0.2)
+        owner.add_behaviour(behaviour)
+        await asyncio.sleep(0.05)
+        msg = ACLMessage(to='wait_message@localhost', body='hello')
+        owner.dispatch(msg)
+        await asyncio.sleep(0.4)
+        await stop(owner)
+        return behaviour.received
+
+    received = run(scenario())
+    assert received[0].body == 'hello'
+    assert None in received[1:]
@@ -0,0 +1,94 @@
+import math
+import random
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import pytest
+
+from src.allocation.optimal_moves import Scenario, Stacks, prepare_scenario, solve_min_moves, moves_lower_bound
+
+INSTANCES = 300
+
+
+def random_instance(rng: random.Random) -> Tuple[List[datetime], List[datetime], int, int]:
+    """
+    A yard of 4 to 6 places nearly filled by containers with times drawn from a short range, so some of them arrive
+    or leave together and some have to be relocated
+    """
+    start = datetime(2020, 1, 1)
+    slot_count = rng.randint(2, 3)
+    max_height = 5 - slot_count
+    count = rng.randint(slot_count * max_height - 2, slot_count * max_height)
+    arrivals = [start + timedelta(minutes=rng.randint(0, 4)) for _ in range(count)]
+    departures = [arrival + timedelta(minutes=rng.randint(1, 8)) for arrival in arrivals]
+    return arrivals, departures, slot_count, max_height
+
+
+def brute_force_relocations(scenario: Scenario, slot_count: int, max_height: int) -> Optional[int]:
+    """
+    Fewest relocations over every placement of arriving and relocated containers and every retrieval order of
+    containers leaving together, None when the scenario doesn't fit in the yard
+    """
+
+    def play(index: int, stacks: Stacks) -> float:
+        if index == len(scenario.events):
+            return 0
+        event = scenario.events[index]
+        best = math.inf
+        if event.arrival:
+            for stack in stacks:
+                if len(stack) < max_height:
+                    stack.append(event.rank)
+                    best = min(best, play(index + 1, stacks))
+                    stack.pop()
+            return best
+        present = [rank for stack in stacks for rank in stack]
+        earliest_group = min(scenario.groups[rank] for rank in present)
+        for rank in present:
+            if scenario.groups[rank] == earliest_group:
+                best = min(best, retrieve(index, stacks, rank))
+        return best
+
+    def retrieve(index: int, stacks: Stacks, rank: int) -> float:
+        source = next(stack for stack in stacks if rank in stack)
+        if source[-1] == rank:
+            source.pop()
+            result = play(index + 1, stacks)
+            source.append(rank)
+            return result
+        best = math.inf
+        blocker = source.pop()
+        for target in stacks:
+            if target is not source and len(target) < max_height:
+                target.append(blocker)
+                best = min(best, 1 + retrieve(index, stacks, rank))
+                target.pop()
+        source.append(blocker)
+        return best
+
+    relocations = play(0, [[] for _ in range(slot_count)])
+    return relocations if relocations < math.inf else None
+
+
+@pytest.mark.parametrize('seed', range(INSTANCES))
+def test_solver_matches_brute_force(seed: int):
+    arrivals, departures, slot_count, max_height = random_instance(random.Random(seed))
+    relocations = brute_force_relocations(prepare_scenario(arrivals, departures), slot_count, max_height)
+
+    result = solve_min_moves(arrivals, departures, slot_count, max_height)
+
+    if relocations is None:
+        assert result.moves is None
+    else:
+        assert result.optimal
+        assert result.moves == 2 * len(arrivals) + relocations
+
+
+@pytest.mark.parametrize('seed', range(INSTANCES))
+def test_lower_bound_does_not_exceed_optimum(seed: int):
+    arrivals, departures, slot_count, max_height = random_instance(random.Random(seed))
+
+    result = solve_min_moves(arrivals, departures, slot_count, max_height)
+
+    if result.moves is not None:
+        assert moves_lower_bound(arrivals, departures, slot_count) <= result.moves
@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+try:
+    from src.agents.container_agent import SlotJid
+    from src.agents.slot_manager_agent import RemarshallingBehaviour
+    from src.allocation.remarshalling import RemarshallingSettings
+    from src.ontology.port_terminal_ontology import DeallocationRequest
+    from src.utils.acl_message import ACLMessage
+    from src.utils.performative import Performative
+    from src.utils.priority import Priority
+    from tests.local_agents import run, start, stop, LocalContainer, LocalSlot, LocalYardState
+except Exception as e:
+    pytest.skip(f'agents cannot run here: {e}', allow_module_level=True)
+
+
+async def until(condition, timeout: float = 5.0):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline
+        await asyncio.sleep(0.01)
+
+
+def deallocation_request(container) -> ACLMessage:
+    request = ACLMessage(to=str(container.jid), sender='truck@localhost')
+    request.performative = Performative.REQUEST
+    request.protocol = 'Request'
+    request.ontology = container.ontology.name
+    container.content_manager.fill_content(DeallocationRequest(container.container_id), request)
+    return request
+
+
+def test_container_leaving_during_its_relocation_is_not_placed_again():
+    async def scenario():
+        now = datetime.now()
+        slots = [SlotJid('0', 'transit_0@localhost'), SlotJid('1', 'transit_1@localhost')]
+        yard_state = await start(LocalYardState('transit_yard@localhost', ['transit_1@localhost']))
+        source = await start(LocalSlot('transit_0@localhost', '0', 2, yard_state_jid='transit_yard@localhost'))
+        target = await start(LocalSlot('transit_1@localhost', '1', 2))
+        container = await start(LocalContainer('transit_c1@localhost', now + timedelta(hours=4), '0', slots))
+        await source.add_container('transit_c0', (now + timedelta(minutes=1)).isoformat(), 'transit_c0@localhost')
+        await source.add_container('transit_c1', container.departure_time.isoformat(), 'transit_c1@localhost')
+        agents = [yard_state, source, target, container]
+        try:
+            # the reallocation request waits for the container while the truck's request is queued behind it
+            await container.acquire_lock(Priority.BACKGROUND)
+            source.add_behaviour(RemarshallingBehaviour(RemarshallingSettings(
+                timedelta(hours=1), period=60, idle_time=0, min_free_slots=0)))
+            await until(lambda: source.is_in_transit('transit_c1'))
+            await asyncio.sleep(0.1)
+            container.dispatch(deallocation_request(container))
+            await asyncio.sleep(0.1)
+            container.release_lock()
+            await until(lambda: not source.is_in_transit('transit_c1'))
+            await asyncio.sleep(0.1)
+            return container.slot_id, source.containers, target.containers
+        finally:
+            await stop(*agents)
+
+    slot_id, source_containers, target_containers = run(scenario())
+    assert slot_id is None
+    assert source_containers == ['transit_c0']
+    assert target_containers == []